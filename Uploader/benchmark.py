@@ -0,0 +1,516 @@
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from watchdog.events import FileSystemEventHandler, FileSystemEvent, EVENT_TYPE_MOVED
+from watchdog.observers import Observer
+from watchdog.observers.api import EventQueue, ObservedWatch
+from watchdog.utils.dirsnapshot import DirectorySnapshot, DirectorySnapshotDiff
+from components.coalescer import EventCoalescer
+from components.handler import MyHandler
+from components.metrics import REGISTRY
+from components.pipeline import DispatchPipeline
+from components.scan_observer import ScanEmitter
+from components.logger_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+_ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+_GENERATOR_MAIN = os.path.join(_ROOT_DIR, '..', 'data_generator', 'main.py')
+_DRAIN_POLL_SECONDS = 0.05
+_DRAIN_TIMEOUT_SECONDS = 300
+_APPEND_CHUNK_BYTES = 128 * 1024
+
+# Metrics compared by --compare, and whether a higher value is better.
+_COMPARED_METRICS = {
+    'events_per_second': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'cpu_seconds': False,
+    'peak_rss_mb': False,
+    'index_bytes': False,
+}
+
+
+class Corpus:
+    """CSV exports written by data_generator, sliced into realistic file contents."""
+
+    def __init__(self, data_dir: str):
+        self.tables = {}
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(data_dir)):
+            if not name.endswith('.csv'):
+                continue
+            with open(os.path.join(data_dir, name), 'rb') as f:
+                raw = f.read()
+            digest.update(raw)
+            header, *rows = raw.splitlines(keepends=True)
+            self.tables[name[:-4]] = (header, rows)
+        if not self.tables:
+            raise ValueError(f"No CSV files found in {data_dir}")
+        self.digest = digest.hexdigest()[:16]
+
+    def file(self, rng: random.Random, rows: int, table: str | None = None) -> tuple[str, bytes]:
+        """Returns (table, header plus `rows` consecutive records from a random position)."""
+        table = table or rng.choice(sorted(self.tables))
+        header, records = self.tables[table]
+        start = rng.randrange(max(len(records) - rows, 1))
+        return table, header + b''.join(records[start:start + rows])
+
+    def records(self, table: str, rng: random.Random, nbytes: int) -> bytes:
+        """Returns consecutive records of `table` adding up to roughly `nbytes`."""
+        _, records = self.tables[table]
+        out, size, i = [], 0, rng.randrange(len(records))
+        while size < nbytes:
+            out.append(records[i])
+            size += len(records[i])
+            i = (i + 1) % len(records)
+        return b''.join(out)
+
+
+def ensure_corpus(corpus_dir: str) -> str:
+    """Runs data_generator into `corpus_dir`/data unless it already holds a dataset."""
+    data_dir = os.path.join(corpus_dir, 'data')
+    if os.path.isdir(data_dir) and any(name.endswith('.csv') for name in os.listdir(data_dir)):
+        return data_dir
+    os.makedirs(corpus_dir, exist_ok=True)
+    logger.info(f"Generating benchmark corpus in {data_dir} with data_generator...")
+    subprocess.run([sys.executable, os.path.abspath(_GENERATOR_MAIN)], cwd=corpus_dir, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return data_dir
+
+
+# -- Workloads ------------------------------------------------------------------
+# Each workload is (setup, run); both take (root, corpus, rng, scale). Only `run` is measured.
+
+def _write(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _table_of(path: str) -> str:
+    return os.path.basename(path).rsplit('-', 1)[0]
+
+
+def _populate(root: str, corpus: Corpus, rng: random.Random, count: int, rows: int = 50) -> list[str]:
+    paths = []
+    for i in range(count):
+        table, data = corpus.file(rng, rows)
+        path = os.path.join(root, f'{table}-{i:06d}.csv')
+        _write(path, data)
+        paths.append(path)
+    return paths
+
+
+def _mass_create(root, corpus, rng, scale):
+    _populate(root, corpus, rng, int(2000 * scale))
+
+
+def _rewrite_setup(root, corpus, rng, scale):
+    _populate(root, corpus, rng, 10)
+
+
+def _rewrite(root, corpus, rng, scale):
+    paths = sorted(os.path.join(root, name) for name in os.listdir(root))
+    for i in range(int(200 * scale)):
+        for path in paths:
+            _, data = corpus.file(rng, rng.randint(20, 80), table=_table_of(path))
+            _write(path, data)
+
+
+def _append_setup(root, corpus, rng, scale):
+    _populate(root, corpus, rng, 4, rows=10)
+
+
+def _append(root, corpus, rng, scale):
+    paths = sorted(os.path.join(root, name) for name in os.listdir(root))
+    for i in range(int(100 * scale)):
+        for path in paths:
+            with open(path, 'ab') as f:
+                f.write(corpus.records(_table_of(path), rng, _APPEND_CHUNK_BYTES))
+
+
+def _rename_setup(root, corpus, rng, scale):
+    os.makedirs(os.path.join(root, 'incoming'))
+    os.makedirs(os.path.join(root, 'archive'))
+    _populate(os.path.join(root, 'incoming'), corpus, rng, int(500 * scale))
+
+
+def _rename(root, corpus, rng, scale):
+    incoming = os.path.join(root, 'incoming')
+    for name in sorted(os.listdir(incoming)):
+        os.rename(os.path.join(incoming, name), os.path.join(root, 'archive', name))
+
+
+def _delete_setup(root, corpus, rng, scale):
+    _populate(root, corpus, rng, int(1000 * scale))
+
+
+def _delete(root, corpus, rng, scale):
+    for name in sorted(os.listdir(root)):
+        os.remove(os.path.join(root, name))
+
+
+def _deep_tree(root, corpus, rng, scale, depth: int = 6, fanout: int = 3):
+    files_per_leaf = max(int(2 * scale), 1)
+    level = [root]
+    for d in range(depth):
+        level = [os.path.join(parent, f'd{d}-{i}') for parent in level for i in range(fanout)]
+        for path in level:
+            os.mkdir(path)
+    for leaf in level:
+        _populate(leaf, corpus, rng, files_per_leaf, rows=20)
+
+
+WORKLOADS = {
+    'mass_create': (None, _mass_create),
+    'rewrite': (_rewrite_setup, _rewrite),
+    'append': (_append_setup, _append),
+    'rename': (_rename_setup, _rename),
+    'delete': (_delete_setup, _delete),
+    'deep_tree': (None, _deep_tree),
+}
+
+
+# -- Measurement ----------------------------------------------------------------
+
+def _event_key(event: FileSystemEvent) -> str:
+    return event.dest_path if event.event_type == EVENT_TYPE_MOVED else event.src_path
+
+
+class _IntakeProbe(FileSystemEventHandler):
+    """Sits between the observer and the coalescer; remembers when each path first raised an event."""
+
+    def __init__(self, downstream: FileSystemEventHandler):
+        super().__init__()
+        self.downstream = downstream
+        self.first_seen: dict[str, float] = {}
+        self.raw_events = 0
+        self.last_event = time.perf_counter()
+
+    def dispatch(self, event: FileSystemEvent):
+        now = time.perf_counter()
+        self.raw_events += 1
+        self.last_event = now
+        if not event.is_directory:
+            self.first_seen.setdefault(event.src_path, now)
+            if event.event_type == EVENT_TYPE_MOVED:
+                self.first_seen.setdefault(event.dest_path, self.first_seen[event.src_path])
+        self.downstream.dispatch(event)
+
+
+class _DispatchProbe(FileSystemEventHandler):
+    """Wraps MyHandler; records event-to-dispatch latency once the handler has finished."""
+
+    def __init__(self, downstream: FileSystemEventHandler, intake: _IntakeProbe):
+        super().__init__()
+        self.downstream = downstream
+        self.intake = intake
+        self.latencies: list[float] = []
+        self.dispatched = 0
+        self.last_done = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def dispatch(self, event: FileSystemEvent):
+        self.downstream.dispatch(event)
+        now = time.perf_counter()
+        with self._lock:
+            self.dispatched += 1
+            self.last_done = now
+            if not event.is_directory:
+                first = self.intake.first_seen.pop(_event_key(event), None)
+                if event.event_type == EVENT_TYPE_MOVED:
+                    self.intake.first_seen.pop(event.src_path, None)
+                if first is not None:
+                    self.latencies.append(now - first)
+
+    def reset(self):
+        with self._lock:
+            self.latencies.clear()
+            self.dispatched = 0
+        self.intake.first_seen.clear()
+        self.intake.raw_events = 0
+
+
+def _wait_for_drain(probe: _IntakeProbe, coalescer: EventCoalescer, pipeline: DispatchPipeline,
+                    quiet_seconds: float):
+    """Blocks until no events arrived for a quiet window and nothing is pending anywhere."""
+    deadline = time.perf_counter() + _DRAIN_TIMEOUT_SECONDS
+    settle = quiet_seconds + 0.25
+    while time.perf_counter() < deadline:
+        time.sleep(_DRAIN_POLL_SECONDS)
+        idle = time.perf_counter() - probe.last_event >= settle
+        if idle and coalescer.pending_count == 0 and pipeline.queue_depth == 0 and pipeline.in_flight == 0:
+            return
+    raise TimeoutError("Pipeline did not drain within the benchmark timeout")
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_workload(name: str, data_dir: str, seed: int, scale: float, quiet_seconds: float,
+                 workers: int) -> dict:
+    """Runs one workload against a fresh directory and index; meant to run in its own process."""
+    setup, run = WORKLOADS[name]
+    corpus = Corpus(data_dir)
+    rng = random.Random(f'{seed}:{name}')
+    workdir = tempfile.mkdtemp(prefix=f'uploader-bench-{name}-')
+    root = os.path.join(workdir, 'watched')
+    os.mkdir(root)
+    index_path = os.path.join(workdir, 'file_index.db')
+    try:
+        handler = MyHandler(index_path=index_path)
+        pipeline = DispatchPipeline(None, workers=workers)
+        coalescer = EventCoalescer(pipeline, quiet_seconds=quiet_seconds)
+        intake = _IntakeProbe(coalescer)
+        dispatch_probe = _DispatchProbe(handler, intake)
+        pipeline.downstream = dispatch_probe
+        pipeline.start()
+        coalescer.start()
+        observer = Observer()
+        observer.schedule(intake, path=root, recursive=True)
+        observer.start()
+
+        if setup is not None:
+            setup(root, corpus, rng, scale)
+            _wait_for_drain(intake, coalescer, pipeline, quiet_seconds)
+        dispatch_probe.reset()
+
+        cpu_started = _cpu_seconds()
+        started = time.perf_counter()
+        run(root, corpus, rng, scale)
+        write_seconds = time.perf_counter() - started
+        _wait_for_drain(intake, coalescer, pipeline, quiet_seconds)
+        elapsed = max(dispatch_probe.last_done - started, write_seconds)
+        cpu = _cpu_seconds() - cpu_started
+
+        observer.stop()
+        observer.join()
+        coalescer.stop()
+        pipeline.stop(drain=True)
+        handler.index.close()
+        index_bytes = sum(os.path.getsize(index_path + suffix)
+                          for suffix in ('', '-wal', '-shm') if os.path.exists(index_path + suffix))
+
+        latencies = dispatch_probe.latencies
+        return {
+            'raw_events': intake.raw_events,
+            'dispatched_events': dispatch_probe.dispatched,
+            'write_seconds': round(write_seconds, 4),
+            'elapsed_seconds': round(elapsed, 4),
+            'events_per_second': round(intake.raw_events / elapsed, 1) if elapsed else 0.0,
+            'latency_p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+            'latency_p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+            'cpu_seconds': round(cpu, 3),
+            'cpu_utilization': round(cpu / elapsed, 3) if elapsed else 0.0,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KB on Linux
+            'index_bytes': index_bytes,
+            'stages': REGISTRY.snapshot(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _scan_tree_setup(root: str, files: int, files_per_dir: int = 100, fanout: int = 32):
+    """Writes `files` small files, `files_per_dir` per directory, under two levels of `fanout` directories."""
+    for i in range(0, files, files_per_dir):
+        d = i // files_per_dir
+        path = os.path.join(root, f'a{d // fanout % fanout:02d}', f'b{d % fanout:02d}', f'c{d // fanout ** 2:04d}')
+        os.makedirs(path, exist_ok=True)
+        for j in range(i, min(i + files_per_dir, files)):
+            _write(os.path.join(path, f'part-{j - i:04d}.csv'), b'id\n%d\n' % j)
+    # Age the directories so scans trust their mtime, as they would on a settled share
+    aged = time.time() - 3600
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (aged, aged))
+
+
+def run_scan_benchmark(files: int, workers: int, seed: int) -> dict:
+    """
+    Measures the scan observer backend against a tree of `files` files: snapshot
+    memory per tracked file (tracemalloc) and pass times per 100k files for the
+    baseline, an unchanged tree and a tree with 1% of its files modified, next to
+    watchdog's DirectorySnapshot, which its polling observer takes on every pass.
+    """
+    rng = random.Random(f'{seed}:scan')
+    workdir = tempfile.mkdtemp(prefix='uploader-bench-scan-')
+    root = os.path.join(workdir, 'watched')
+    try:
+        _scan_tree_setup(root, files)
+        per_100k = 100_000 / files
+
+        def pass_seconds(fn) -> float:
+            started = time.perf_counter()
+            fn()
+            return round((time.perf_counter() - started) * per_100k, 3)
+
+        def traced_bytes(fn) -> tuple[object, int]:
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            result = fn()
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            return result, used
+
+        queue = EventQueue()
+        emitter = ScanEmitter(queue, ObservedWatch(root, recursive=True), workers=workers)
+        baseline = pass_seconds(lambda: emitter.scan(emit=False))
+        unchanged = pass_seconds(emitter.scan)
+        paths = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(root) for name in names]
+        for path in rng.sample(paths, max(files // 100, 1)):
+            with open(path, 'ab') as f:
+                f.write(b'1\n')
+        modified = pass_seconds(emitter.scan)
+        events = queue.qsize()
+        emitter.close()
+        fresh = ScanEmitter(EventQueue(), ObservedWatch(root, recursive=True), workers=workers)
+        _, scan_bytes = traced_bytes(lambda: fresh.scan(emit=False))
+        fresh.close()
+
+        snapshot = DirectorySnapshot(root)
+        watchdog_pass = pass_seconds(lambda: DirectorySnapshotDiff(snapshot, DirectorySnapshot(root)))
+        _, watchdog_bytes = traced_bytes(lambda: DirectorySnapshot(root))
+        return {
+            'files': files,
+            'scan_bytes_per_file': round(scan_bytes / files, 1),
+            'scan_baseline_seconds_per_100k': baseline,
+            'scan_unchanged_seconds_per_100k': unchanged,
+            'scan_modified_seconds_per_100k': modified,
+            'scan_modified_events': events,
+            'polling_bytes_per_file': round(watchdog_bytes / files, 1),
+            'polling_pass_seconds_per_100k': watchdog_pass,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KB on Linux
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _child(conn, fn, *args):
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        conn.send(('ok', fn(*args)))
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+def _run_isolated(fn, *args) -> dict:
+    """Runs a workload in a fresh interpreter so CPU time and peak RSS are its own."""
+    ctx = multiprocessing.get_context('spawn')
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(child, fn, *args))
+    process.start()
+    child.close()
+    status, result = parent.recv()
+    process.join()
+    if status != 'ok':
+        raise RuntimeError(result)
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_ROOT_DIR, check=True,
+                                  capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=_ROOT_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """Formats per-workload changes against a baseline results file."""
+    lines = [f"{'workload':<12} {'metric':<18} {'baseline':>12} {'current':>12} {'change':>9}"]
+    for name, result in current['workloads'].items():
+        before = baseline['workloads'].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in _COMPARED_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change < 0 if higher_is_better else change > 0
+            flag = ' !' if worse and abs(change) >= 10 else ''
+            lines.append(f"{name:<12} {metric:<18} {old:>12} {new:>12} {change:>+8.1f}%{flag}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays scripted file-system event storms against the Uploader.")
+    parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplier for the size of every workload")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quiet-seconds', type=float, default=0.5, help="Coalescer quiet window")
+    parser.add_argument('--workers', type=int, default=4, help="Dispatch pipeline workers")
+    parser.add_argument('--scan-files', type=int, default=0,
+                        help="Also measure the scan observer backend on a tree of this many files (0 skips it)")
+    parser.add_argument('--scan-workers', type=int, default=8, help="Scan threads for --scan-files")
+    parser.add_argument('--corpus-dir', default='.bench-corpus', help="Where data_generator output is cached")
+    parser.add_argument('--output', help="Results JSON (default: bench-results/<revision>-<time>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results JSON to compare against")
+    args = parser.parse_args()
+
+    setup_logging()
+    data_dir = ensure_corpus(args.corpus_dir)
+    revision = _git_revision()
+    results = {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {'scale': args.scale, 'seed': args.seed, 'quiet_seconds': args.quiet_seconds,
+                   'workers': args.workers, 'corpus': Corpus(data_dir).digest},
+        'workloads': {},
+    }
+    for name in args.workloads:
+        logger.info(f"Running workload {name}...")
+        result = _run_isolated(run_workload, name, data_dir, args.seed, args.scale, args.quiet_seconds, args.workers)
+        results['workloads'][name] = result
+        logger.info(f"{name}: {result['raw_events']} events in {result['elapsed_seconds']}s "
+                    f"({result['events_per_second']} events/s), p50 {result['latency_p50_ms']} ms, "
+                    f"p99 {result['latency_p99_ms']} ms, cpu {result['cpu_seconds']}s, "
+                    f"peak rss {result['peak_rss_mb']} MB, index {result['index_bytes']} bytes")
+    if args.scan_files > 0:
+        logger.info(f"Running scan benchmark on {args.scan_files} files...")
+        scan = results['scan'] = _run_isolated(run_scan_benchmark, args.scan_files, args.scan_workers, args.seed)
+        logger.info(f"scan: {scan['scan_bytes_per_file']} bytes per file (polling snapshot "
+                    f"{scan['polling_bytes_per_file']}), per 100k files: baseline "
+                    f"{scan['scan_baseline_seconds_per_100k']}s, unchanged {scan['scan_unchanged_seconds_per_100k']}s, "
+                    f"1% modified {scan['scan_modified_seconds_per_100k']}s "
+                    f"(polling pass {scan['polling_pass_seconds_per_100k']}s)")
+
+    output = args.output or os.path.join('bench-results', f"{revision or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), results):
+                print(line)
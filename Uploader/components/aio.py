@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor
+from watchdog.events import FileSystemEventHandler, FileSystemEvent, EVENT_TYPE_MOVED, EVENT_TYPE_DELETED
+from watchdog.observers.api import BaseObserver
+from components.coalescer import EventCoalescer
+from components.config import WatchRoot
+from components.handler import MyHandler, UPLOAD_MODE_ROWS
+from components.metrics import REGISTRY
+from components.path_filter import FilteringHandler, PathFilter
+from components.reconcile import reconcile
+from components.retention import RetentionSweeper
+from components.sinks import Sink
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CONCURRENCY = 64
+_DEFAULT_MAX_PENDING = 1024
+
+
+class AsyncEventBridge(FileSystemEventHandler):
+    """
+    Hands events from watchdog's threads to a handler running on an event loop.
+    Must not be called from the loop's own thread.
+    """
+
+    def __init__(self, downstream: FileSystemEventHandler, loop: asyncio.AbstractEventLoop | None = None):
+        super().__init__()
+        self.downstream = downstream
+        self.loop = loop
+
+    def dispatch(self, event: FileSystemEvent):
+        self.loop.call_soon_threadsafe(self.downstream.dispatch, event)
+
+
+class AsyncEventCoalescer(EventCoalescer):
+    """
+    EventCoalescer whose release side is a coroutine on the event loop instead of a
+    thread. Merge rules are unchanged; intake must happen on the loop thread (see
+    AsyncEventBridge). Released events are awaited into an AsyncDispatchPipeline,
+    so a saturated pipeline holds events back here, where they keep coalescing.
+    """
+
+    def __init__(self, downstream: 'AsyncDispatchPipeline', quiet_seconds: float = 0.5,
+                 max_delay_seconds: float = 5.0):
+        super().__init__(downstream, quiet_seconds, max_delay_seconds)
+        self._outbox: deque[FileSystemEvent] = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run_async(), name='AsyncEventCoalescer')
+
+    async def stop(self, flush: bool = True):
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        if flush:
+            self.flush()
+            await self._drain_outbox()
+        logger.info(f"AsyncEventCoalescer stopped: {self.stats()}")
+
+    def on_any_event(self, event: FileSystemEvent):
+        super().on_any_event(event)
+        self._wakeup.set()
+
+    def _release_event(self, event: FileSystemEvent):
+        with self._cond:
+            self.dispatched_events += 1
+        self._released_metric.inc()
+        self._outbox.append(event)
+
+    async def _drain_outbox(self):
+        while self._outbox:
+            event = self._outbox.popleft()
+            try:
+                await self.downstream.submit(event)
+            except Exception as e:
+                logger.error(f"Error dispatching {event.event_type} event for {event.src_path}: {e}")
+
+    async def _run_async(self):
+        while True:
+            self._wakeup.clear()
+            with self._cond:
+                ready, next_deadline = self._collect_ready(time.monotonic())
+            self._release(ready)
+            await self._drain_outbox()
+            if self._stopping:
+                return
+            if ready:
+                continue
+            timeout = None if next_deadline is None else max(next_deadline - time.monotonic(), 0.0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+
+class AsyncDispatchPipeline:
+    """
+    Runs MyHandler as tasks on the event loop, at most `concurrency` at a time.
+
+    Events for the same path run in arrival order: each task first waits for the
+    previous task on each of its paths (both ends of a move). Directory moves and
+    deletes wait for every outstanding task and run alone. At most `max_pending`
+    tasks may be outstanding; beyond that `submit` waits, which holds events back
+    in the coalescer. SQLite and hashing run on `executor` (the loop's default
+    executor if None).
+    """
+
+    def __init__(self, handler: MyHandler, concurrency: int = _DEFAULT_CONCURRENCY,
+                 max_pending: int = _DEFAULT_MAX_PENDING, executor: Executor | None = None):
+        self.handler = handler
+        self.executor = executor
+        self._concurrency = asyncio.Semaphore(max(concurrency, 1))
+        self._slots = asyncio.Semaphore(max(max_pending, 1))
+        self._tails: dict[str, asyncio.Future] = {}  # path -> completion of its latest task
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._queue_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='queue')
+        self._dispatch_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='dispatch')
+        self._failed_metric = REGISTRY.counter('uploader_events_total', "Events per pipeline stage", stage='failed')
+        REGISTRY.gauge('uploader_pipeline_queue_depth', "Events queued on the dispatch lanes",
+                       fn=lambda: self.queue_depth)
+        REGISTRY.gauge('uploader_pipeline_in_flight', "Events being handled by dispatch workers",
+                       fn=lambda: self.in_flight)
+        logger.info(f"AsyncDispatchPipeline initialized (concurrency={concurrency}, max_pending={max_pending})")
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._tasks) - self.in_flight
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+        }
+
+    async def submit(self, event: FileSystemEvent):
+        if self._closed:
+            logger.warning(f"AsyncDispatchPipeline is stopped; dropping {event.event_type} event for {event.src_path}")
+            return
+        self.submitted += 1
+        if event.is_directory and event.event_type in (EVENT_TYPE_MOVED, EVENT_TYPE_DELETED):
+            # Files below the directory may be in any task.
+            await self._wait_idle()
+            await self._run(event, time.perf_counter())
+            return
+
+        await self._slots.acquire()
+        paths = (event.src_path, event.dest_path) if event.event_type == EVENT_TYPE_MOVED else (event.src_path,)
+        predecessors = [self._tails[path] for path in paths if path in self._tails]
+        done = asyncio.get_running_loop().create_future()
+        for path in paths:
+            self._tails[path] = done
+        task = asyncio.create_task(self._run_ordered(event, paths, predecessors, done, time.perf_counter()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_ordered(self, event: FileSystemEvent, paths: tuple[str, ...],
+                           predecessors: list[asyncio.Future], done: asyncio.Future, submitted: float):
+        try:
+            for predecessor in predecessors:
+                await asyncio.shield(predecessor)  # Cancelling this task must not cancel its predecessor
+            async with self._concurrency:
+                await self._run(event, submitted)
+        finally:
+            done.set_result(None)
+            for path in paths:
+                if self._tails.get(path) is done:
+                    del self._tails[path]
+            self._slots.release()
+
+    async def _run(self, event: FileSystemEvent, submitted: float):
+        started = time.perf_counter()
+        self._queue_seconds.observe(started - submitted)
+        self.in_flight += 1
+        try:
+            await self.handler.on_any_event_async(event, self.executor)
+        except Exception as e:
+            self.failed += 1
+            self._failed_metric.inc()
+            logger.error(f"Error handling {event.event_type} event for {event.src_path}: {e}")
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._dispatch_seconds.observe(time.perf_counter() - started)
+
+    async def _wait_idle(self):
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    async def stop(self, drain: bool = True):
+        """Stops accepting events; waits for outstanding tasks with `drain`, cancels them otherwise."""
+        self._closed = True
+        if not drain:
+            for task in list(self._tasks):
+                task.cancel()
+        await self._wait_idle()
+        logger.info(f"AsyncDispatchPipeline stopped: {self.stats()}")
+
+
+class AsyncRootWatcher:
+    """
+    asyncio counterpart of RootWatcher: filter -> bridge -> AsyncEventCoalescer ->
+    AsyncDispatchPipeline -> MyHandler, with the root's own FileIndex shard.
+    Construct, start and stop it on the event loop.
+    """
+
+    def __init__(self, root: WatchRoot, sink: Sink | None = None, upload_mode: str = UPLOAD_MODE_ROWS,
+                 concurrency: int = _DEFAULT_CONCURRENCY, max_pending: int = _DEFAULT_MAX_PENDING,
+                 executor: Executor | None = None, quiet_seconds: float = 0.5, max_delay_seconds: float = 5.0,
+                 retention_interval_seconds: float = 300, retention_max_age_minutes: int = 1440):
+        self.root = root
+        self.executor = executor
+        os.makedirs(os.path.dirname(root.index_path) or '.', exist_ok=True)
+        self.handler = MyHandler(sink=sink, upload_mode=upload_mode, index_path=root.index_path,
+                                 hash_mode=root.hash_mode)
+        self.index = self.handler.index
+        self.sweeper = RetentionSweeper(self.index, interval_seconds=retention_interval_seconds,
+                                        max_age_minutes=retention_max_age_minutes)
+        self.pipeline = AsyncDispatchPipeline(self.handler, concurrency=concurrency,
+                                              max_pending=max_pending, executor=executor)
+        self.coalescer = AsyncEventCoalescer(self.pipeline, quiet_seconds=quiet_seconds,
+                                             max_delay_seconds=max_delay_seconds)
+        self.path_filter = PathFilter(root.path, root.include, root.exclude, root.recursive)
+        self.entry = FilteringHandler(AsyncEventBridge(self.coalescer), self.path_filter)
+
+    def start(self, observer: BaseObserver):
+        self.entry.downstream.loop = asyncio.get_running_loop()
+        self.sweeper.start()
+        self.coalescer.start()
+        observer.schedule(self.entry, path=self.root.path, recursive=self.root.recursive)
+        logger.info(f"Watching '{self.root.path}' as root '{self.root.name}' (index: {self.root.index_path}, asyncio)")
+
+    async def reconcile(self, workers: int) -> dict:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: reconcile(self.root.path, self.index, self.entry, workers=workers,
+                                             path_filter=self.path_filter))
+
+    async def stop(self):
+        """Drains pending events; the observer must already be stopped."""
+        await self.coalescer.stop()
+        await self.pipeline.stop(drain=True)
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.sweeper.stop)
+
+    def close(self):
+        self.index.close()
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generator
+from urllib.parse import urlsplit
+from components.chunked import ResumableUpload
+from components.file_index import FileIndex
+from components.ingest import RecordBatch
+from components.manifest import ManifestDelta
+from components.sinks import HttpSink, UploadError, PendingRequest
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CONCURRENCY = 64
+_DEFAULT_MAX_IN_FLIGHT = 256
+_DEFAULT_IO_THREADS = 8
+
+
+def _advance(steps: Generator, reply: tuple[int, dict] | None) -> tuple | None:
+    """Sends `reply` into an upload generator; None once it has finished (StopIteration cannot cross a Future)."""
+    try:
+        return steps.send(reply)
+    except StopIteration:
+        return None
+
+
+class _AsyncConnection:
+    """A keep-alive HTTP/1.1 connection over asyncio streams; enough for the receiver's JSON replies."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method: str, target: str, host: str, body: bytes | None,
+                      headers: dict) -> tuple[int, bytes, bool]:
+        """Returns (status, body, keep_alive)."""
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {host}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        if body is None and method in ('POST', 'PUT'):
+            lines.append('Content-Length: 0')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            self.writer.write(body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by receiver")
+        version, status = status_line.split(None, 2)[:2]
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await self._read_chunked()
+        else:
+            data = await self.reader.read()
+            return int(status), data, False
+        keep_alive = version == b'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        return int(status), data, keep_alive
+
+    async def _read_chunked(self) -> bytes:
+        parts = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        self.writer.close()
+
+
+class _AsyncConnectionPool:
+    """Keep-alive connections to one host, reused LIFO like the threaded pool."""
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.host_header = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.size = size
+        self.timeout = timeout
+        self._idle: list[_AsyncConnection] = []
+
+    async def acquire(self) -> _AsyncConnection:
+        if self._idle:
+            return self._idle.pop()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+        return _AsyncConnection(reader, writer)
+
+    def release(self, conn: _AsyncConnection):
+        if len(self._idle) < self.size:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+class AsyncHttpSink(HttpSink):
+    """
+    HttpSink whose requests are coroutines on an event loop rather than worker
+    threads, so hundreds of uploads can be in flight on a handful of threads.
+
+    Batching, the wire protocol, retries and stats are those of HttpSink.
+    `concurrency` bounds simultaneous requests and `max_in_flight` bounds queued
+    plus running jobs. `send_batch` and `send_blob` stay synchronous and
+    thread-safe: the handle_* functions call them from executor threads, and they
+    block only until the job is admitted. Async handlers should await
+    `submit_batch` / `submit_blob` instead. Call `start()` on the loop before use.
+
+    File uploads read and compress their chunks on `io_threads` threads of their
+    own. Admission may block every thread of the loop's default executor, so
+    admitted uploads must not need one of those to finish and free a slot.
+    """
+
+    def __init__(self, url: str, concurrency: int = _DEFAULT_CONCURRENCY,
+                 max_in_flight: int = _DEFAULT_MAX_IN_FLIGHT, io_threads: int = _DEFAULT_IO_THREADS, **kwargs):
+        super().__init__(url, concurrency=concurrency, max_in_flight=max_in_flight, **kwargs)
+        self._apool = _AsyncConnectionPool(url, self.concurrency, self._pool.timeout)
+        self._io = ThreadPoolExecutor(max_workers=max(io_threads, 1), thread_name_prefix='AsyncHttpSinkIO')
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._requests_limit: asyncio.Semaphore | None = None
+        self._admission: asyncio.Semaphore | None = None
+        self._drained: asyncio.Event | None = None
+        self._jobs: set[asyncio.Task] = set()
+
+    def _start_workers(self):
+        pass  # Requests run as tasks; see start()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._requests_limit = asyncio.Semaphore(self.concurrency)
+        self._admission = asyncio.Semaphore(self.max_in_flight)
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._timer = self._loop.create_task(self._run_timer_async(), name='AsyncHttpSinkTimer')
+
+    # -- Producer side --------------------------------------------------------
+
+    def _submit(self, job: PendingRequest | ResumableUpload):
+        """Thread-safe admission from executor threads; blocks while max_in_flight jobs are outstanding."""
+        asyncio.run_coroutine_threadsafe(self._admit(job), self._loop).result()
+
+    async def submit_batch(self, batch: RecordBatch, on_done: Callable[[bool], None] | None = None):
+        full = self._buffer_batch(batch, on_done)
+        if full is not None:
+            await self._admit(self._records_request(*full))
+
+    async def submit_blob(self, path: str, checkpoints: FileIndex | None = None, digest: str | None = None,
+                          delta: ManifestDelta | None = None):
+        await self._admit(ResumableUpload(self, path, checkpoints, self.chunk_bytes, self.encoding, digest, delta))
+
+    async def _admit(self, job: PendingRequest | ResumableUpload):
+        await self._admission.acquire()
+        with self._idle:
+            self._outstanding += 1
+        self._drained.clear()
+        task = self._loop.create_task(self._run_job(job))
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+
+    async def _run_timer_async(self):
+        interval = max(self.max_batch_delay_seconds / 4, 0.01)
+        while not self._closed.is_set():
+            await asyncio.sleep(interval)
+            for key, buffer in self._take_expired():
+                await self._admit(self._records_request(key, buffer))
+
+    async def aflush(self):
+        """Sends all buffered batches and waits until every job has completed."""
+        with self._buffer_lock:
+            buffers, self._buffers = self._buffers, {}
+        for key, buffer in buffers.items():
+            await self._admit(self._records_request(key, buffer))
+        await self._drained.wait()
+
+    async def aclose(self):
+        await self.aflush()
+        self._closed.set()
+        self._timer.cancel()
+        self._apool.close()
+        self._io.shutdown(wait=False)
+        logger.info(f"AsyncHttpSink closed: {self.stats()}")
+
+    def flush(self):
+        asyncio.run_coroutine_threadsafe(self.aflush(), self._loop).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result()
+
+    # -- Jobs -----------------------------------------------------------------
+
+    async def _run_job(self, job: PendingRequest | ResumableUpload):
+        started = time.perf_counter()
+        try:
+            if isinstance(job, ResumableUpload):
+                await self._run_upload(job)
+            else:
+                await self.acall(job.method, job.path, job.body, job.headers)
+                with self._stats_lock:
+                    self.rows_sent += job.rows
+                job.finish(True)
+        except (UploadError, OSError, ValueError) as e:
+            self._record_failed(job, e)
+        except Exception as e:
+            logger.exception(f"Unexpected error uploading {job.description}")
+            self._record_failed(job, e)
+        finally:
+            self._job_seconds.observe(time.perf_counter() - started)
+            self._admission.release()
+            with self._idle:
+                self._outstanding -= 1
+                if self._outstanding == 0:
+                    self._drained.set()
+
+    async def _run_upload(self, job: ResumableUpload):
+        # File reads and compression happen while advancing the generator, so do that off the loop,
+        # on the sink's own threads: the default executor's may all be blocked in _submit.
+        steps = job.steps()
+        request = await self._loop.run_in_executor(self._io, _advance, steps, None)
+        while request is not None:
+            request = await self._loop.run_in_executor(self._io, _advance, steps, await self.acall(*request))
+
+    async def acall(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None,
+                    accept: tuple[int, ...] = ()) -> tuple[int, dict]:
+        """Coroutine version of HttpSink.call, with the same retry policy."""
+        headers = dict(headers or {})
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._requests_limit:
+                    status, reply = await self._asend(method, path, body, headers)
+                self._check_status(method, path, status, reply, accept)
+            except UploadError as e:
+                await asyncio.sleep(self._retry_delay(method, path, e, attempt))
+                continue
+            self._record_sent(body)
+            return status, reply
+        raise UploadError(f"{method} {path} failed")  # Not reached; max_retries >= 0
+
+    async def _asend(self, method: str, path: str, body: bytes | None, headers: dict) -> tuple[int, dict]:
+        started = time.perf_counter()
+        try:
+            conn = await self._apool.acquire()
+            try:
+                status, data, keep_alive = await asyncio.wait_for(
+                    conn.request(method, self._apool.base_path + path, self._apool.host_header, body, headers),
+                    self._apool.timeout)
+            except BaseException:
+                conn.close()
+                raise
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            raise UploadError(str(e) or type(e).__name__) from e
+        finally:
+            self._request_seconds.observe(time.perf_counter() - started)
+
+        if keep_alive:
+            self._apool.release(conn)
+        else:
+            conn.close()
+        try:
+            reply = json.loads(data) if data else {}
+        except ValueError:
+            reply = {}
+        if not isinstance(reply, dict):
+            reply = {}
+        return status, reply
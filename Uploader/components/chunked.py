@@ -0,0 +1,288 @@
+import hashlib
+import json
+import logging
+import os
+import zlib
+from typing import TYPE_CHECKING, Generator
+
+try:
+    import zstandard
+except ImportError:  # Optional; gzip is always available
+    zstandard = None
+
+if TYPE_CHECKING:
+    from components.file_index import FileIndex
+    from components.manifest import ManifestDelta
+    from components.sinks import HttpSink
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024  # 8 MB of uncompressed file content
+_GZIP_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+ENCODING_GZIP = 'gzip'
+ENCODING_ZSTD = 'zstd'
+ENCODING_IDENTITY = 'identity'
+
+# Running digest of an upload: chain = sha256(chain || sha256(chunk)) per chunk, starting from zeros.
+EMPTY_CHAIN = '0' * 64
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _reply_field(reply: dict, key: str, kind: type, request: str):
+    """Returns reply[key], raising a final UploadError if the receiver left it out or sent the wrong type."""
+    value = reply.get(key)
+    if not isinstance(value, kind):
+        raise UploadError(f"malformed reply to {request}: expected {kind.__name__} '{key}', got {reply!r:.200}",
+                          retryable=False)
+    return value
+
+
+def default_encoding() -> str:
+    return ENCODING_ZSTD if zstandard is not None else ENCODING_GZIP
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == ENCODING_GZIP:
+        compressor = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        return compressor.compress(data) + compressor.flush()
+    if encoding == ENCODING_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd encoding requested but the zstandard package is not installed")
+        return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    if encoding == ENCODING_IDENTITY:
+        return data
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == ENCODING_GZIP:
+        return zlib.decompress(data, 31)
+    if encoding == ENCODING_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd encoding received but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == ENCODING_IDENTITY:
+        return data
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+def extend_chain(chain: str, chunk_digest: str) -> str:
+    return hashlib.sha256(bytes.fromhex(chain) + bytes.fromhex(chunk_digest)).hexdigest()
+
+
+class ResumableUpload:
+    """
+    Uploads one file as a sequence of compressed chunks using the receiver's
+    resumable protocol:
+
+        POST /uploads                      {"path"} -> {"upload_id", "offset"}
+        GET  /uploads/<id>                 -> {"offset", "chain", "complete"}
+        PUT  /uploads/<id>?offset=<n>      compressed chunk -> {"offset", "chain"}
+        POST /uploads/<id>/complete        {"size", "chain"} -> {"path", "digest"}
+        POST /blobs/<digest>/links         {"path"} -> {"path"}, or 404 for unknown content
+        POST /patches                      compressed JSON line + new bytes -> {"path", "digest"}
+
+    Every acknowledged chunk is checkpointed in the FileIndex. After a crash or
+    restart the upload resumes after the last checkpoint, provided the file is
+    the same inode, the checkpointed chunk still reads back with the same digest
+    and the receiver agrees on the offset. Otherwise a new upload is started.
+    Files that grew since the checkpoint are resumed and sent up to their new end.
+
+    The receiver replies to a completed upload with the content digest of what it
+    stored (see hashing.chained_hash), which is recorded in the FileIndex's blob
+    table. Given the `digest` of content already uploaded, the file is first
+    linked to the stored copy and only uploaded if the receiver no longer has it.
+
+    Given the `delta` of a changed file (see FileIndex.take_delta), at most
+    `chunk_bytes` of changed chunks are sent as one patch instead: a JSON line
+    {"path", "digest", "operations": [[length, base_offset or null], ...]}
+    followed by the new bytes. The receiver rebuilds the file from its stored
+    copy and the new bytes, and rejects the patch (404, 409) unless the result
+    has the expected digest, in which case the file is uploaded in full.
+
+    Replies missing a field the protocol needs raise UploadError, which fails
+    this upload only.
+    """
+
+    def __init__(self, sink: 'HttpSink', path: str, checkpoints: 'FileIndex | None',
+                 chunk_bytes: int = _DEFAULT_CHUNK_BYTES, encoding: str | None = None, digest: str | None = None,
+                 delta: 'ManifestDelta | None' = None):
+        self.sink = sink
+        self.path = path
+        self.checkpoints = checkpoints
+        self.chunk_bytes = chunk_bytes
+        self.encoding = encoding or default_encoding()
+        self.digest = digest
+        self.delta = delta
+        self.description = f"file {path}"
+
+    def run(self):
+        """Performs the upload with blocking calls on the sink."""
+        steps = self.steps()
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(self.sink.call(*request))
+        except StopIteration:
+            pass
+
+    def steps(self) -> Generator[tuple, tuple[int, dict], None]:
+        """
+        The upload as a sans-IO generator: yields (method, path, body, headers, accept)
+        requests and expects each (status, reply) to be sent back in. File reads and
+        compression happen inside the generator, so async callers should advance it
+        on an executor.
+        """
+        if self.digest is not None:
+            status, _ = yield 'POST', f'/blobs/{self.digest}/links', self._json({'path': self.path}), None, (404,)
+            if status != 404:
+                if self.checkpoints is not None:
+                    self.checkpoints.clear_upload_checkpoint(self.path)
+                self.sink.record_linked()
+                logger.debug("Linked %s to uploaded content %s", self.path, self.digest)
+                return
+            logger.debug("Receiver no longer has content %s of %s. Uploading it.", self.digest, self.path)
+        if self.delta is not None and (yield from self._patch()):
+            return
+
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            upload_id, offset, chain = yield from self._resume(f, st)
+            if upload_id is None:
+                _, reply = yield 'POST', '/uploads', self._json({'path': self.path}), None, ()
+                upload_id, offset, chain = _reply_field(reply, 'upload_id', str, 'POST /uploads'), 0, EMPTY_CHAIN
+            else:
+                self.sink.record_resumed()
+                logger.debug("Resuming upload of %s at byte %d", self.path, offset)
+
+            f.seek(offset)
+            while True:
+                raw = f.read(self.chunk_bytes)
+                if not raw:
+                    break
+                chunk_digest = hashlib.sha256(raw).hexdigest()
+                body = compress(raw, self.encoding)
+                status, reply = yield (
+                    'PUT', f'/uploads/{upload_id}?offset={offset}', body,
+                    {'Content-Type': 'application/octet-stream', 'Content-Encoding': self.encoding,
+                     'X-Chunk-Digest': chunk_digest},
+                    (409,)
+                )
+                if status == 409:
+                    # Typically a chunk the receiver stored but whose reply was lost; catch up with it
+                    agreed = yield from self._catch_up(f, upload_id, offset, chain, os.fstat(f.fileno()).st_size)
+                    if agreed is None or agreed[0] == offset:
+                        raise OSError(f"receiver expected offset {reply.get('offset')}, not {offset}")
+                    offset, chain = agreed
+                    logger.debug("Resynchronized upload of %s at byte %d", self.path, offset)
+                    continue
+                offset += len(raw)
+                chain = extend_chain(chain, chunk_digest)
+                if _reply_field(reply, 'chain', str, f'PUT /uploads/{upload_id}') != chain:
+                    raise OSError(f"receiver digest diverged at offset {offset}")
+                self.sink.record_chunk(len(raw), len(body))
+                if self.checkpoints is not None:
+                    self.checkpoints.set_upload_checkpoint(self.path, upload_id, offset, len(raw),
+                                                           chunk_digest, chain, st.st_ino)
+
+            _, reply = yield (
+                'POST', f'/uploads/{upload_id}/complete', self._json({'size': offset, 'chain': chain}), None, ()
+            )
+        if self.checkpoints is not None:
+            self.checkpoints.clear_upload_checkpoint(self.path)
+            if 'digest' in reply:  # Receivers predating content digests leave it out
+                digest = _reply_field(reply, 'digest', str, f'POST /uploads/{upload_id}/complete')
+                self.checkpoints.set_blob_uploaded(digest, self.path)
+        self.sink.record_completed()
+        logger.debug("Uploaded %s (%d bytes, %s)", self.path, offset, self.encoding)
+
+    def _patch(self) -> Generator[tuple, tuple[int, dict], bool]:
+        """Sends only the changed chunks if they are few enough; returns False if the file must be sent in full."""
+        delta = self.delta
+        changed = delta.changed_bytes
+        if delta.digest is None or changed > self.chunk_bytes or changed == delta.size:
+            return False
+        operations = delta.operations()
+        literals = []
+        with open(self.path, 'rb') as f:
+            for offset, length, base_offset in operations:
+                if base_offset is None:
+                    f.seek(offset)
+                    literals.append(f.read(length))
+        header = {
+            'path': self.path,
+            'digest': delta.digest,
+            'operations': [[length, base_offset] for _, length, base_offset in operations],
+        }
+        body = compress(self._json(header) + b'\n' + b''.join(literals), self.encoding)
+        status, reply = yield (
+            'POST', '/patches', body,
+            {'Content-Type': 'application/octet-stream', 'Content-Encoding': self.encoding},
+            (404, 409)
+        )
+        if status in (404, 409):
+            logger.debug("Receiver cannot patch %s (%s). Uploading it in full.", self.path, reply.get('error'))
+            return False
+        if self.checkpoints is not None:
+            self.checkpoints.clear_upload_checkpoint(self.path)
+            self.checkpoints.set_blob_uploaded(_reply_field(reply, 'digest', str, 'POST /patches'), self.path)
+        self.sink.record_patched(delta.size - changed)
+        logger.debug("Patched %s: sent %d of %d bytes in %d changed ranges", self.path, changed, delta.size,
+                     len(literals))
+        return True
+
+    def _resume(self, f, st: os.stat_result) -> Generator[tuple, tuple[int, dict], tuple[str | None, int, str]]:
+        """Returns (upload_id, offset, chain) to continue from, or (None, 0, EMPTY_CHAIN)."""
+        checkpoint = self.checkpoints.get_upload_checkpoint(self.path) if self.checkpoints is not None else None
+        if checkpoint is None:
+            return None, 0, EMPTY_CHAIN
+
+        upload_id, offset, chunk_length, chunk_digest, chain, inode = checkpoint
+        if inode != st.st_ino or st.st_size < offset:
+            return None, 0, EMPTY_CHAIN
+        f.seek(offset - chunk_length)
+        if hashlib.sha256(f.read(chunk_length)).hexdigest() != chunk_digest:
+            logger.debug("%s changed below its upload checkpoint. Starting over.", self.path)
+            return None, 0, EMPTY_CHAIN
+
+        agreed = yield from self._catch_up(f, upload_id, offset, chain, st.st_size)
+        if agreed is None:
+            logger.debug("Starting upload of %s over.", self.path)
+            return None, 0, EMPTY_CHAIN
+        return upload_id, *agreed
+
+    def _catch_up(self, f, upload_id: str, offset: int, chain: str,
+                  size: int) -> Generator[tuple, tuple[int, dict], tuple[int, str] | None]:
+        """
+        Asks the receiver how far upload `upload_id` got and replays the digests of the
+        chunks it holds past `offset`. Returns the (offset, chain) both sides agree on,
+        with `f` positioned there, or None if the upload cannot be continued.
+        """
+        status, reply = yield 'GET', f'/uploads/{upload_id}', None, None, (404,)
+        if status == 404 or reply.get('complete'):
+            logger.debug("Receiver no longer has upload %s of %s.", upload_id, self.path)
+            return None
+        request = f'GET /uploads/{upload_id}'
+        received, received_chain = _reply_field(reply, 'offset', int, request), _reply_field(reply, 'chain', str, request)
+        # The receiver may have acknowledged chunks we did not get to checkpoint; replay their digests
+        f.seek(offset)
+        while offset < received <= size:
+            raw = f.read(self.chunk_bytes)
+            if not raw:
+                break
+            chain = extend_chain(chain, hashlib.sha256(raw).hexdigest())
+            offset += len(raw)
+        if received != offset or received_chain != chain:
+            logger.debug("Receiver cannot continue upload %s of %s at %d.", upload_id, self.path, offset)
+            return None
+        return offset, chain
+
+    def _json(self, payload: dict) -> bytes:
+        return json.dumps(payload).encode('utf-8')
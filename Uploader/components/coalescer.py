@@ -0,0 +1,307 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from watchdog.events import (
+    FileSystemEventHandler, FileSystemEvent,
+    FileCreatedEvent, FileModifiedEvent, FileDeletedEvent, FileMovedEvent,
+    EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED, EVENT_TYPE_DELETED, EVENT_TYPE_MOVED,
+    EVENT_TYPE_CLOSED
+)
+from components.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_QUIET_SECONDS = 0.5
+_DEFAULT_MAX_DELAY_SECONDS = 5.0
+
+# Net effect of two consecutive events on the same path: (earlier, later) -> result.
+# None means the two cancel out (e.g. a temp file created and deleted again).
+_COMBINED_KIND = {
+    (EVENT_TYPE_CREATED, EVENT_TYPE_CREATED): EVENT_TYPE_CREATED,
+    (EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED): EVENT_TYPE_CREATED,
+    (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED): None,
+    (EVENT_TYPE_MODIFIED, EVENT_TYPE_CREATED): EVENT_TYPE_MODIFIED,
+    (EVENT_TYPE_MODIFIED, EVENT_TYPE_MODIFIED): EVENT_TYPE_MODIFIED,
+    (EVENT_TYPE_MODIFIED, EVENT_TYPE_DELETED): EVENT_TYPE_DELETED,
+    (EVENT_TYPE_DELETED, EVENT_TYPE_CREATED): EVENT_TYPE_MODIFIED,
+    (EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED): EVENT_TYPE_MODIFIED,
+    (EVENT_TYPE_DELETED, EVENT_TYPE_DELETED): EVENT_TYPE_DELETED,
+}
+
+
+class _PendingEvent:
+    """Net effect of all raw events seen for one path since it was last released."""
+
+    __slots__ = ('kind', 'path', 'origin', 'first_seen', 'last_seen', 'raw_count', 'seq')
+
+    def __init__(self, kind: str, path: str, origin: str | None, now: float, seq: int):
+        self.kind = kind
+        self.path = path
+        self.origin = origin  # Original src_path for a pending move
+        self.first_seen = now
+        self.last_seen = now
+        self.raw_count = 1
+        self.seq = seq
+
+    def to_event(self) -> FileSystemEvent:
+        if self.kind == EVENT_TYPE_MOVED:
+            return FileMovedEvent(self.origin, self.path)
+        if self.kind == EVENT_TYPE_CREATED:
+            return FileCreatedEvent(self.path)
+        if self.kind == EVENT_TYPE_DELETED:
+            return FileDeletedEvent(self.path)
+        return FileModifiedEvent(self.path)
+
+
+class EventCoalescer(FileSystemEventHandler):
+    """
+    Debounces raw watchdog events before they reach the downstream handler.
+
+    Events are merged per path into a single net event (create+modify -> create,
+    modify+delete -> delete, A->B->C -> A->C, ...) and released once the path has
+    been quiet for `quiet_seconds`, or `max_delay_seconds` after its first event
+    so that a file which never stops changing is still processed periodically.
+    A CLOSED (close-after-write) event releases the path immediately.
+
+    Directory events are not debounced; they are forwarded straight away after
+    pending events below a moved or deleted directory have been adjusted.
+    """
+
+    def __init__(self, downstream: FileSystemEventHandler,
+                 quiet_seconds: float = _DEFAULT_QUIET_SECONDS,
+                 max_delay_seconds: float = _DEFAULT_MAX_DELAY_SECONDS):
+        super().__init__()
+        self.downstream = downstream
+        self.quiet_seconds = quiet_seconds
+        self.max_delay_seconds = max(max_delay_seconds, quiet_seconds)
+
+        # Ordered by last activity, so quiet paths are always at the front.
+        self._pending: OrderedDict[str, _PendingEvent] = OrderedDict()
+        # (deadline, seq, path) for max-delay expiry; stale entries are skipped lazily.
+        self._deadlines: list[tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='EventCoalescer', daemon=True)
+
+        self.raw_events = 0
+        self.ignored_events = 0
+        self.dispatched_events = 0
+        self._received_metric = REGISTRY.counter('uploader_events_total', "Events per pipeline stage", stage='received')
+        self._released_metric = REGISTRY.counter('uploader_events_total', "Events per pipeline stage", stage='coalesced')
+        self._coalesce_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='coalesce')
+        REGISTRY.gauge('uploader_coalescer_pending', "Paths waiting out their quiet window",
+                       fn=lambda: len(self._pending))
+        logger.info(f"EventCoalescer initialized (quiet={quiet_seconds}s, max_delay={self.max_delay_seconds}s)")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, flush: bool = True):
+        """Stops the release thread, dispatching everything still pending if `flush` is set."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+        if flush:
+            self.flush()
+        logger.info(f"EventCoalescer stopped: {self.stats()}")
+
+    def flush(self):
+        """Releases every pending event now, regardless of its quiet window."""
+        with self._cond:
+            ready = list(self._pending.values())
+            self._pending.clear()
+            self._deadlines.clear()
+        self._release(ready)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        ratio = self.raw_events / self.dispatched_events if self.dispatched_events else 0.0
+        return {
+            'raw_events': self.raw_events,
+            'ignored_events': self.ignored_events,
+            'dispatched_events': self.dispatched_events,
+            'pending': len(self._pending),
+            'reduction_ratio': round(ratio, 2),
+        }
+
+    # -- Intake (observer thread) ---------------------------------------------
+
+    def on_any_event(self, event: FileSystemEvent):
+        self._received_metric.inc()
+        with self._cond:
+            self.raw_events += 1
+            if event.is_directory:
+                self._adjust_for_directory(event)
+            elif event.event_type == EVENT_TYPE_CLOSED:
+                self._mark_ready(event.src_path)
+                return
+            elif event.event_type == EVENT_TYPE_MOVED:
+                self._add_move(event.src_path, event.dest_path)
+                self._cond.notify()
+                return
+            elif event.event_type in (EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED, EVENT_TYPE_DELETED):
+                self._add(event.event_type, event.src_path)
+                self._cond.notify()
+                return
+            else:
+                self.ignored_events += 1
+                return
+
+        # Directory events bypass the debounce window.
+        self._release_event(event)
+
+    def _add(self, kind: str, path: str, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        entry = self._pending.get(path)
+        if entry is None:
+            self._insert(_PendingEvent(kind, path, None, now, next(self._seq)))
+            return
+
+        entry.raw_count += 1
+        entry.last_seen = now
+        self._pending.move_to_end(path)
+        if entry.kind == EVENT_TYPE_MOVED:
+            if kind == EVENT_TYPE_DELETED:
+                # Moved here and then deleted: net effect is the source disappearing.
+                del self._pending[path]
+                self._rekey_as_deleted(entry, now)
+            # A modify after a move is covered by the content check on the destination.
+            return
+
+        combined = _COMBINED_KIND[(entry.kind, kind)]
+        if combined is None:
+            del self._pending[path]
+        else:
+            entry.kind = combined
+
+    def _add_move(self, src: str, dest: str):
+        now = time.monotonic()
+        entry = self._pending.pop(src, None)
+        if entry is None:
+            entry = _PendingEvent(EVENT_TYPE_MOVED, dest, src, now, next(self._seq))
+        else:
+            entry.raw_count += 1
+            entry.last_seen = now
+            if entry.kind == EVENT_TYPE_MOVED:
+                if entry.origin == dest:
+                    # Moved back to where it started: only the content may differ.
+                    entry.kind, entry.origin = EVENT_TYPE_MODIFIED, None
+            elif entry.kind == EVENT_TYPE_DELETED:
+                # Nothing left to move; keep the delete and track the new file on its own.
+                self._insert(entry)
+                entry = _PendingEvent(EVENT_TYPE_MOVED, dest, src, now, next(self._seq))
+            elif entry.kind == EVENT_TYPE_MODIFIED:
+                entry.kind, entry.origin = EVENT_TYPE_MOVED, src
+            # A pending create simply follows the file to its new name.
+            entry.path = dest
+
+        displaced = self._pending.pop(dest, None)
+        if displaced is not None and displaced.kind == EVENT_TYPE_MOVED:
+            # The file that had been moved to `dest` was overwritten by this move.
+            self._rekey_as_deleted(displaced, now)
+        self._insert(entry)
+
+    def _rekey_as_deleted(self, entry: _PendingEvent, now: float):
+        later = self._pending.pop(entry.origin, None)
+        entry.kind, entry.path, entry.origin = EVENT_TYPE_DELETED, entry.origin, None
+        if later is not None:
+            combined = _COMBINED_KIND.get((EVENT_TYPE_DELETED, later.kind), later.kind)
+            later.kind = combined
+            later.raw_count += entry.raw_count
+            later.first_seen = min(later.first_seen, entry.first_seen)
+            entry = later
+        entry.last_seen = now
+        self._insert(entry)
+
+    def _insert(self, entry: _PendingEvent):
+        self._pending[entry.path] = entry
+        self._pending.move_to_end(entry.path)
+        heapq.heappush(self._deadlines, (entry.first_seen + self.max_delay_seconds, entry.seq, entry.path))
+
+    def _mark_ready(self, path: str):
+        entry = self._pending.get(path)
+        if entry is not None:
+            heapq.heappush(self._deadlines, (0.0, entry.seq, path))
+            self._cond.notify()
+
+    def _adjust_for_directory(self, event: FileSystemEvent):
+        """Keeps pending file events consistent with a moved or deleted parent directory."""
+        if event.event_type not in (EVENT_TYPE_MOVED, EVENT_TYPE_DELETED):
+            return
+        prefix = event.src_path.rstrip(os.sep) + os.sep
+        affected = [path for path, entry in self._pending.items()
+                    if path.startswith(prefix) and entry.kind != EVENT_TYPE_DELETED]
+        now = time.monotonic()
+        for path in affected:
+            if event.event_type == EVENT_TYPE_MOVED:
+                self._add_move(path, event.dest_path.rstrip(os.sep) + os.sep + path[len(prefix):])
+            else:
+                self._add(EVENT_TYPE_DELETED, path, now)
+
+    # -- Release (coalescer thread) -------------------------------------------
+
+    def _collect_ready(self, now: float) -> tuple[list[_PendingEvent], float | None]:
+        ready = []
+        while self._pending:
+            path, entry = next(iter(self._pending.items()))
+            if now - entry.last_seen < self.quiet_seconds:
+                break
+            del self._pending[path]
+            ready.append(entry)
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, seq, path = heapq.heappop(self._deadlines)
+            entry = self._pending.get(path)
+            if entry is not None and entry.seq == seq:
+                del self._pending[path]
+                ready.append(entry)
+
+        next_deadline = None
+        if self._pending:
+            next_deadline = next(iter(self._pending.values())).last_seen + self.quiet_seconds
+        while self._deadlines:
+            deadline, seq, path = self._deadlines[0]
+            entry = self._pending.get(path)
+            if entry is not None and entry.seq == seq:
+                next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+                break
+            heapq.heappop(self._deadlines)
+        return ready, next_deadline
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                ready, next_deadline = self._collect_ready(time.monotonic())
+                if not ready:
+                    timeout = None if next_deadline is None else max(next_deadline - time.monotonic(), 0.0)
+                    self._cond.wait(timeout)
+                    continue
+            self._release(ready)
+
+    def _release(self, ready: list[_PendingEvent]):
+        now = time.monotonic()
+        for entry in sorted(ready, key=lambda e: e.seq):
+            self._coalesce_seconds.observe(now - entry.first_seen)
+            self._release_event(entry.to_event())
+
+    def _release_event(self, event: FileSystemEvent):
+        with self._cond:
+            self.dispatched_events += 1
+        self._released_metric.inc()
+        try:
+            self.downstream.dispatch(event)
+        except Exception as e:
+            logger.error(f"Error dispatching {event.event_type} event for {event.src_path}: {e}")
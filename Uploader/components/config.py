@@ -0,0 +1,90 @@
+import logging
+import os
+import re
+import tomllib
+from dataclasses import dataclass, field
+from components.file_index import HASH_MODE_INCREMENTAL
+
+logger = logging.getLogger(__name__)
+
+# Editor swap files, office lock files, partial downloads and the like.
+DEFAULT_EXCLUDE = ['*.tmp', '*.swp', '*.swx', '*~', '~$*', '.~lock.*', '*.lock', '*.part', '*.crdownload']
+
+
+@dataclass
+class WatchRoot:
+    """One watched directory tree and the FileIndex shard that tracks it."""
+    path: str
+    name: str
+    index_path: str
+    include: list[str] = field(default_factory=list)
+    exclude: list[str] = field(default_factory=lambda: list(DEFAULT_EXCLUDE))
+    recursive: bool = True
+    hash_mode: str = HASH_MODE_INCREMENTAL
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', text).strip('-') or 'root'
+
+
+def default_roots() -> list[WatchRoot]:
+    """The single 'demo' root used when no config file is given."""
+    return [WatchRoot(path='demo', name='demo', index_path='file_index.db')]
+
+
+def load_config(config_path: str) -> list[WatchRoot]:
+    """
+    Reads watch roots from a TOML file:
+
+        [[roots]]
+        path = "exports/erp"          # required
+        name = "erp"                  # optional, defaults to the directory name
+        index = "index/erp.db"        # optional, defaults to file_index-<name>.db
+        include = ["*.csv"]           # optional, default: every file
+        exclude = ["*.tmp", ".git"]   # optional, default: DEFAULT_EXCLUDE
+        recursive = true              # optional
+        hash = "manifest"             # optional, default: "incremental" (see FileIndex)
+
+    Relative paths are resolved against the config file's directory. Raises
+    ValueError for missing roots, duplicate names or index files, and roots
+    nested inside a recursively watched root.
+    """
+    with open(config_path, 'rb') as f:
+        config = tomllib.load(f)
+    base = os.path.dirname(os.path.abspath(config_path))
+
+    roots = []
+    for entry in config.get('roots', []):
+        if 'path' not in entry:
+            raise ValueError(f"{config_path}: every [[roots]] entry needs a path")
+        path = os.path.normpath(os.path.join(base, entry['path']))
+        name = entry.get('name') or _slug(os.path.basename(path))
+        index_path = os.path.join(base, entry.get('index', f'file_index-{_slug(name)}.db'))
+        roots.append(WatchRoot(
+            path=path,
+            name=name,
+            index_path=os.path.normpath(index_path),
+            include=list(entry.get('include', [])),
+            exclude=list(entry.get('exclude', DEFAULT_EXCLUDE)),
+            recursive=bool(entry.get('recursive', True)),
+            hash_mode=entry.get('hash', HASH_MODE_INCREMENTAL),
+        ))
+    if not roots:
+        raise ValueError(f"{config_path} does not declare any [[roots]]")
+    _validate(roots)
+    logger.info(f"Loaded {len(roots)} watch roots from {config_path}")
+    return roots
+
+
+def _validate(roots: list[WatchRoot]):
+    for attr in ('name', 'index_path', 'path'):
+        values = [getattr(root, attr) for root in roots]
+        duplicates = {value for value in values if values.count(value) > 1}
+        if duplicates:
+            raise ValueError(f"Watch roots must have distinct {attr}s: {sorted(duplicates)}")
+    for outer in roots:
+        if not outer.recursive:
+            continue
+        for inner in roots:
+            if inner is not outer and inner.path.startswith(outer.path.rstrip(os.sep) + os.sep):
+                raise ValueError(f"Watch root {inner.path} is inside recursively watched {outer.path}")
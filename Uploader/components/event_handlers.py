@@ -1,20 +1,42 @@
 import logging
 from watchdog.events import FileSystemEvent
+from components.file_index import FileIndex
+from components.ingest import CsvIngestor, table_for_path
+from components.sinks import Sink
 
 logger = logging.getLogger(__name__)
 
-def handle_created(event: FileSystemEvent):
-    logger.info(f"Detected CREATED event: {event.src_path}")
-    # Add your file creation logic here
+def _upload(path: str, ingestor: CsvIngestor | None, sink: Sink | None, index: FileIndex | None, from_start: bool):
+    # CSV exports are streamed as record batches when an ingestor is configured;
+    # anything else is sent as a resumable chunked file upload, linked to an
+    # identical file that was already uploaded, or patched with its changed chunks
+    if ingestor is not None and table_for_path(path) is not None:
+        ingestor.ingest(path, from_start=from_start)
+    elif sink is not None:
+        digest = index.uploaded_blob(path) if index is not None else None
+        delta = index.take_delta(path) if index is not None else None
+        sink.send_blob(path, checkpoints=index, digest=digest, delta=delta)
 
-def handle_modified(event: FileSystemEvent):
-    logger.info(f"Detected MODIFIED event: {event.src_path}")
-    # Add your file modification logic here
+def handle_created(event: FileSystemEvent, ingestor: CsvIngestor | None = None, sink: Sink | None = None,
+                   index: FileIndex | None = None):
+    logger.debug("Detected CREATED event: %s", event.src_path)
+    _upload(event.src_path, ingestor, sink, index, from_start=True)
 
-def handle_deleted(event: FileSystemEvent):
-    logger.info(f"Detected DELETED event: {event.src_path}")
-    # Add your file deletion logic here
+def handle_modified(event: FileSystemEvent, ingestor: CsvIngestor | None = None, sink: Sink | None = None,
+                    index: FileIndex | None = None):
+    logger.debug("Detected MODIFIED event: %s", event.src_path)
+    # Append-only exports resume from the last committed offset
+    _upload(event.src_path, ingestor, sink, index, from_start=False)
 
-def handle_moved(event: FileSystemEvent):
-    logger.info(f"Detected MOVED event: From {event.src_path} to {event.dest_path}")
-    # Add your file movement logic here
\ No newline at end of file
+def handle_deleted(event: FileSystemEvent, ingestor: CsvIngestor | None = None, sink: Sink | None = None,
+                   index: FileIndex | None = None):
+    # MyHandler has already dropped the file's index rows
+    logger.debug("Detected DELETED event: %s", event.src_path)
+
+def handle_moved(event: FileSystemEvent, ingestor: CsvIngestor | None = None, sink: Sink | None = None,
+                 index: FileIndex | None = None):
+    # MyHandler has already carried the index rows and ingestion checkpoint over to
+    # dest_path, so ingestion resumes where it was and an upload of unchanged content
+    # is linked to the copy the receiver already holds
+    logger.debug("Detected MOVED event: From %s to %s", event.src_path, event.dest_path)
+    _upload(event.dest_path, ingestor, sink, index, from_start=False)
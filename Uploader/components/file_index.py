@@ -3,26 +3,315 @@ import sqlite3
 import hashlib
 import os
 import logging
+import threading
+import time
+from components.hashing import HashState, chained_hash
+from components.manifest import ManifestDelta, build_manifest, diff
+from components.metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
 _HASH_READ_LIMIT_BYTES = 1024 * 1024  # 1 MB
+# Files modified this recently may still change within the same mtime tick, so
+# their stat fingerprint is not trusted for the hash-skipping fast path.
+_RACY_MTIME_WINDOW_NS = 2 * 1_000_000_000
+
+# Exact chained hash that only reads appended bytes on modification (see hashing.py)
+HASH_MODE_INCREMENTAL = 'incremental'
+# Legacy sampled hash of the first and last 1 MB
+HASH_MODE_SAMPLED = 'sampled'
+# Exact chained hash plus a manifest of content-defined chunks, both from one full read
+# on every change; changed files come with the chunk ranges that differ (see manifest.py)
+HASH_MODE_MANIFEST = 'manifest'
+
+
+def _migrate_to_v1(conn: sqlite3.Connection):
+    """Keys file_events by path and adds the stat fingerprint columns."""
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_events'"
+    ).fetchone()
+    if legacy:
+        conn.execute('ALTER TABLE file_events RENAME TO file_events_legacy')
+    conn.execute('''
+        CREATE TABLE file_events (
+            path TEXT PRIMARY KEY,
+            last_hash TEXT,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            device INTEGER,
+            last_processed_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if legacy:
+        # Keep only the most recent row per path; SQLite takes the bare
+        # column (last_hash) from the row holding the MAX().
+        conn.execute('''
+            INSERT INTO file_events (path, last_hash, last_processed_timestamp)
+            SELECT path, last_hash, MAX(last_processed_timestamp)
+            FROM file_events_legacy
+            WHERE path IS NOT NULL
+            GROUP BY path
+        ''')
+        conn.execute('DROP TABLE file_events_legacy')
+
+
+def _migrate_to_v2(conn: sqlite3.Connection):
+    """Indexes the retention timestamp so expired rows can be found without a table scan."""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_events_processed
+        ON file_events (last_processed_timestamp)
+    ''')
+
+
+def _migrate_to_v3(conn: sqlite3.Connection):
+    """Adds the resumable state of the incremental content hash."""
+    for column in ('hash_offset INTEGER', 'hash_chain BLOB', 'head_digest BLOB', 'last_block_digest BLOB'):
+        conn.execute(f'ALTER TABLE file_events ADD COLUMN {column}')
+
+
+def _migrate_to_v4(conn: sqlite3.Connection):
+    """Adds the last committed position of CSV ingestion per file."""
+    conn.execute('''
+        CREATE TABLE ingest_offsets (
+            path TEXT PRIMARY KEY,
+            byte_offset INTEGER NOT NULL,
+            row_number INTEGER NOT NULL,
+            header TEXT,
+            inode INTEGER
+        )
+    ''')
+
+
+def _migrate_to_v5(conn: sqlite3.Connection):
+    """Adds the last acknowledged chunk of resumable uploads per file."""
+    conn.execute('''
+        CREATE TABLE upload_checkpoints (
+            path TEXT PRIMARY KEY,
+            upload_id TEXT NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            chunk_length INTEGER NOT NULL,
+            chunk_digest TEXT NOT NULL,
+            chain_digest TEXT NOT NULL,
+            inode INTEGER
+        )
+    ''')
+
+
+def _migrate_to_v6(conn: sqlite3.Connection):
+    """
+    Adds the content-addressed blob table: one row per distinct content digest,
+    counting the file_events rows that reference it. Triggers keep the counts in
+    step with every insert, hash change and delete of file_events (including
+    prefix deletes and retention sweeps) and drop blobs nothing references.
+    """
+    conn.execute('''
+        CREATE TABLE blobs (
+            digest TEXT PRIMARY KEY,
+            size INTEGER,
+            refcount INTEGER NOT NULL,
+            uploaded_path TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO blobs (digest, size, refcount)
+        SELECT last_hash, MAX(size), COUNT(*) FROM file_events WHERE last_hash IS NOT NULL GROUP BY last_hash
+    ''')
+    add_ref = '''
+        INSERT INTO blobs (digest, size, refcount) VALUES (new.last_hash, new.size, 1)
+        ON CONFLICT(digest) DO UPDATE SET refcount = refcount + 1;
+    '''
+    drop_ref = '''
+        UPDATE blobs SET refcount = refcount - 1 WHERE digest = old.last_hash;
+        DELETE FROM blobs WHERE digest = old.last_hash AND refcount <= 0;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER blobs_file_inserted AFTER INSERT ON file_events
+        WHEN new.last_hash IS NOT NULL
+        BEGIN {add_ref} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER blobs_file_deleted AFTER DELETE ON file_events
+        WHEN old.last_hash IS NOT NULL
+        BEGIN {drop_ref} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER blobs_file_rehashed_from AFTER UPDATE OF last_hash ON file_events
+        WHEN old.last_hash IS NOT new.last_hash AND old.last_hash IS NOT NULL
+        BEGIN {drop_ref} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER blobs_file_rehashed_to AFTER UPDATE OF last_hash ON file_events
+        WHEN old.last_hash IS NOT new.last_hash AND new.last_hash IS NOT NULL
+        BEGIN {add_ref} END
+    ''')
+
+
+def _migrate_to_v7(conn: sqlite3.Connection):
+    """Adds the packed chunk manifest of the indexed content (manifest hash mode only)."""
+    conn.execute('ALTER TABLE file_events ADD COLUMN manifest BLOB')
+
+
+# Schema migrations, applied in order; PRAGMA user_version records how many have run.
+_MIGRATIONS = [
+    _migrate_to_v1,
+    _migrate_to_v2,
+    _migrate_to_v3,
+    _migrate_to_v4,
+    _migrate_to_v5,
+    _migrate_to_v6,
+    _migrate_to_v7,
+]
+
+
+_UPSERT_SQL = '''
+    INSERT INTO file_events (path, last_hash, size, mtime_ns, inode, device,
+                             hash_offset, hash_chain, head_digest, last_block_digest, manifest)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        last_hash = excluded.last_hash,
+        size = excluded.size,
+        mtime_ns = excluded.mtime_ns,
+        inode = excluded.inode,
+        device = excluded.device,
+        hash_offset = excluded.hash_offset,
+        hash_chain = excluded.hash_chain,
+        head_digest = excluded.head_digest,
+        last_block_digest = excluded.last_block_digest,
+        manifest = excluded.manifest
+'''
+# Same, but also marks the file as processed now (new or changed content).
+_UPSERT_TOUCH_SQL = _UPSERT_SQL + ', last_processed_timestamp = CURRENT_TIMESTAMP'
+
+_SELECT_ROW_SQL = '''
+    SELECT last_hash, size, mtime_ns, inode, device,
+           hash_offset, hash_chain, head_digest, last_block_digest, manifest
+    FROM file_events WHERE path = ?
+'''
+
+_DEFAULT_COMMIT_BATCH_SIZE = 256
+_DEFAULT_COMMIT_INTERVAL_SECONDS = 0.1
+
+
+# Tables keyed by file path; file_events first.
+_KEYED_TABLES = ('file_events', 'ingest_offsets', 'upload_checkpoints')
+
+
+def _stat_fingerprint(st: os.stat_result) -> tuple[int, int, int, int]:
+    return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+
+def _prefix_range(directory: str) -> tuple[str, str]:
+    """Bounds [lower, upper) of the path keys below `directory`, for range queries on the primary key."""
+    lower = directory.rstrip(os.sep) + os.sep
+    return lower, lower[:-1] + chr(ord(os.sep) + 1)
+
 
 class FileIndex:
-    def __init__(self, db_path: str ='file_index.db'):
+    """
+    SQLite-backed record of which files have been processed and with what content.
+
+    The database runs in WAL mode and index mutations are group-committed: they are
+    buffered in memory and written in one transaction once `commit_batch_size`
+    changes are pending or `commit_interval_seconds` has elapsed. Reads consult the
+    buffer first, so callers always see their own writes. A crash can lose at most
+    the uncommitted window, which only causes those files to be processed again.
+    A `commit_interval_seconds` of 0 commits every mutation immediately.
+    """
+
+    def __init__(self, db_path: str ='file_index.db', hash_mode: str = HASH_MODE_INCREMENTAL,
+                 commit_batch_size: int = _DEFAULT_COMMIT_BATCH_SIZE,
+                 commit_interval_seconds: float = _DEFAULT_COMMIT_INTERVAL_SECONDS):
+        if hash_mode not in (HASH_MODE_INCREMENTAL, HASH_MODE_SAMPLED, HASH_MODE_MANIFEST):
+            raise ValueError(f"Unknown hash_mode: {hash_mode}")
+        self.hash_mode = hash_mode
+        self.commit_batch_size = max(commit_batch_size, 1)
+        self.commit_interval_seconds = commit_interval_seconds
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # The connection is shared by the dispatch workers; serialize access to it.
+        self._lock = threading.RLock()
+        self._configure_connection()
         self._create_table()
+
+        # path -> (row values, touch) for pending upserts, or None for a pending delete
+        self._pending: dict[str, tuple[tuple, bool] | None] = {}
+        # path -> chunks changed by the last content change, until its handler takes them
+        self._deltas: dict[str, ManifestDelta] = {}
+        self.commits = 0
+        self.rows_committed = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        self.total_commit_seconds = 0.0
+        self._init_metrics()
+
+        self._closed = threading.Event()
+        self._flusher = None
+        if commit_interval_seconds > 0:
+            self._flusher = threading.Thread(target=self._run_flusher, name='FileIndexFlusher', daemon=True)
+            self._flusher.start()
         logger.info(f"FileIndex initialized with database: {db_path}")
 
+    def _init_metrics(self):
+        stage_help = "Time spent per pipeline stage"
+        self._lookup_seconds = REGISTRY.histogram('uploader_stage_seconds', stage_help, stage='index_lookup')
+        self._hash_seconds = REGISTRY.histogram('uploader_stage_seconds', stage_help, stage='hash')
+        self._commit_seconds = REGISTRY.histogram('uploader_stage_seconds', stage_help, stage='index_commit')
+        self._rows_committed_metric = REGISTRY.counter('uploader_index_rows_committed_total',
+                                                       "Index mutations committed to SQLite")
+        decisions_help = "should_process outcomes: unchanged by stat or by hash, changed, or new"
+        self._decisions = {
+            result: REGISTRY.counter('uploader_index_decisions_total', decisions_help, result=result)
+            for result in ('stat_unchanged', 'hash_unchanged', 'changed', 'new')
+        }
+        lookups_help = "Blob uploads whose content was already uploaded (duplicate) or not (unique)"
+        self._blob_lookups = {
+            result: REGISTRY.counter('uploader_blob_lookups_total', lookups_help, result=result)
+            for result in ('duplicate', 'unique')
+        }
+        REGISTRY.gauge('uploader_index_pending_writes', "Index mutations waiting for the next group commit",
+                       fn=lambda: len(self._pending))
+
+    def _configure_connection(self):
+        # WAL lets readers proceed during commits; with synchronous=NORMAL a commit
+        # no longer fsyncs, only checkpoints do.
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('PRAGMA cache_size = -16000')  # 16 MB
+        self.conn.execute('PRAGMA temp_store = MEMORY')
+
     def _create_table(self):
-        with self.conn:
-            self.conn.execute('''
-                CREATE TABLE IF NOT EXISTS file_events (
-                    path TEXT,
-                    last_hash TEXT,
-                    last_processed_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        for target, migrate in enumerate(_MIGRATIONS[version:], start=version + 1):
+            with self.conn:
+                self.conn.execute('BEGIN')
+                migrate(self.conn)
+                self.conn.execute(f'PRAGMA user_version = {target}')
+            logger.info(f"Migrated file index schema to version {target}")
+
+    def close(self):
+        """Commits pending mutations and closes the database."""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self.flush()
+            self.conn.close()
+        logger.info(f"FileIndex closed: {self.commit_stats()}")
+
+    def commit_stats(self) -> dict:
+        return {
+            'commits': self.commits,
+            'rows_committed': self.rows_committed,
+            'pending': len(self._pending),
+            'last_batch_size': self.last_batch_size,
+            'max_batch_size': self.max_batch_size,
+            'avg_batch_size': round(self.rows_committed / self.commits, 1) if self.commits else 0.0,
+            'last_commit_ms': round(self.last_commit_seconds * 1000, 3),
+            'max_commit_ms': round(self.max_commit_seconds * 1000, 3),
+            'avg_commit_ms': round(self.total_commit_seconds * 1000 / self.commits, 3) if self.commits else 0.0,
+        }
 
     def _calculate_hash(self, filepath: str) -> str | None:
         """
@@ -57,48 +346,373 @@ class FileIndex:
         return hasher.hexdigest()
 
     def should_process(self, path: str) -> bool:
-        if not os.path.exists(path):
+        """
+        Returns True if the file is new or its content changed since it was last processed.
+
+        If size, mtime, inode and device all match the stored fingerprint the file is
+        considered unchanged without being read; otherwise it is hashed and compared.
+        In incremental mode a file that has grown is hashed from where the previous
+        hash left off, on the assumption that it was appended to (see
+        hashing.chained_hash); any other change is hashed in full. In manifest mode the changed chunks of a file
+        that was indexed before are kept for take_delta().
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
             return True # Always process if file doesn't exist (e.g., deleted event)
 
-        current_hash = self._calculate_hash(path)
-        cur = self.conn.cursor()
-        cur.execute('''
-            SELECT last_hash FROM file_events WHERE path = ?
-        ''', (path,))
-        result = cur.fetchone()
+        fingerprint = _stat_fingerprint(st)
+        started = time.perf_counter()
+        row = self._get_row(path)
+        hashing = time.perf_counter()
+        self._lookup_seconds.observe(hashing - started)
+        if row is not None and row[1:5] == fingerprint:
+            self._decisions['stat_unchanged'].inc()
+            logger.debug("File %s stat unchanged. Skipping.", path)
+            return False
+
+        current_hash, state, manifest = self._hash_file(path, st, row)
+        self._hash_seconds.observe(time.perf_counter() - hashing)
+        if time.time_ns() - st.st_mtime_ns < _RACY_MTIME_WINDOW_NS:
+            fingerprint = (st.st_size, None, st.st_ino, st.st_dev)
+        with self._lock:
+            self._upsert(path, current_hash, fingerprint, state, manifest,
+                         touch=row is None or row[0] != current_hash)
+            if manifest is not None and row is not None and row[9] is not None and row[0] != current_hash:
+                self._deltas[path] = diff(row[9], manifest, current_hash)
 
+        if row is None:
+            self._decisions['new'].inc()
+            logger.debug("New file detected: %s. Processing.", path)
+            return True
+        if row[0] == current_hash:
+            # Hash hasn't changed (e.g. touched); the refreshed fingerprint avoids rehashing next time
+            self._decisions['hash_unchanged'].inc()
+            logger.debug("File %s hash unchanged. Skipping.", path)
+            return False
+        self._decisions['changed'].inc()
+        logger.debug("File %s hash changed. Processing.", path)
+        return True
+
+    def _hash_file(self, path: str, st: os.stat_result,
+                   row: tuple | None) -> tuple[str | None, HashState | None, bytes | None]:
+        if self.hash_mode == HASH_MODE_SAMPLED:
+            return self._calculate_hash(path), None, None
+        if self.hash_mode == HASH_MODE_MANIFEST:
+            return build_manifest(path) or (None, None, None)
+
+        previous = None
+        # Only a file that grew can be an append; a same-size or shrunk file is rehashed
+        if (row is not None and row[5] is not None and row[3:5] == (st.st_ino, st.st_dev)
+                and row[1] is not None and st.st_size > row[1]):
+            previous = HashState(*row[5:9])
+        result = chained_hash(path, previous)
         if result is None:
-            # First time seeing this file, record and process
+            return None, None, None
+        return *result, None
+
+    def load_fingerprints(self, root: str) -> dict[str, tuple]:
+        """
+        Returns {path: (size, mtime_ns, inode, device)} for every indexed file below
+        `root`, read with a single range query on the path key.
+        """
+        lower, upper = _prefix_range(root)
+        with self._lock:
+            self.flush()
+            rows = self.conn.execute('''
+                SELECT path, size, mtime_ns, inode, device FROM file_events
+                WHERE path >= ? AND path < ?
+            ''', (lower, upper)).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def get_ingest_offset(self, path: str) -> tuple[int, int, str | None, int | None] | None:
+        """Returns (byte_offset, row_number, header, inode) of the last committed ingestion batch."""
+        with self._lock:
+            return self.conn.execute('''
+                SELECT byte_offset, row_number, header, inode FROM ingest_offsets WHERE path = ?
+            ''', (path,)).fetchone()
+
+    def set_ingest_offset(self, path: str, byte_offset: int, row_number: int,
+                          header: str | None, inode: int | None):
+        """
+        Checkpoints ingestion progress. The CsvIngestor only calls this once the sink
+        has acknowledged the rows up to `byte_offset`; it is committed immediately so
+        acknowledged rows are not sent again after a crash.
+        """
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO ingest_offsets (path, byte_offset, row_number, header, inode)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (path, byte_offset, row_number, header, inode))
+
+    def get_upload_checkpoint(self, path: str) -> tuple[str, int, int, str, str, int | None] | None:
+        """Returns (upload_id, byte_offset, chunk_length, chunk_digest, chain_digest, inode)."""
+        with self._lock:
+            return self.conn.execute('''
+                SELECT upload_id, byte_offset, chunk_length, chunk_digest, chain_digest, inode
+                FROM upload_checkpoints WHERE path = ?
+            ''', (path,)).fetchone()
+
+    def set_upload_checkpoint(self, path: str, upload_id: str, byte_offset: int, chunk_length: int,
+                              chunk_digest: str, chain_digest: str, inode: int | None):
+        """Records an acknowledged chunk; committed immediately so a restart resumes after it."""
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO upload_checkpoints
+                    (path, upload_id, byte_offset, chunk_length, chunk_digest, chain_digest, inode)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (path, upload_id, byte_offset, chunk_length, chunk_digest, chain_digest, inode))
+
+    def clear_upload_checkpoint(self, path: str):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM upload_checkpoints WHERE path = ?', (path,))
+
+    def unfinished_uploads(self, root: str) -> list[str]:
+        """Returns the paths below `root` whose upload stopped after a checkpoint without completing."""
+        lower, upper = _prefix_range(root)
+        with self._lock:
+            rows = self.conn.execute('''
+                SELECT path FROM upload_checkpoints WHERE path >= ? AND path < ?
+            ''', (lower, upper)).fetchall()
+        return [row[0] for row in rows]
+
+    def invalidate(self, path: str):
+        """
+        Forgets that `path` was processed, keeping its ingestion offset and upload
+        checkpoint, so its next event or the next startup reconciliation processes
+        it again and picks up where it left off.
+        """
+        with self._lock:
+            self._pending[path] = None
+            self._deltas.pop(path, None)
+            self._maybe_flush()
+        logger.debug("Invalidated index entry for %s.", path)
+
+    def take_delta(self, path: str) -> ManifestDelta | None:
+        """
+        Returns, once, how the content of `path` changed in its last processed
+        change: its chunks matched against the previous manifest. None unless the
+        index runs in manifest mode and the file was indexed before the change.
+        """
+        with self._lock:
+            return self._deltas.pop(path, None)
+
+    def uploaded_blob(self, path: str) -> str | None:
+        """
+        Returns the content digest of `path` if that content has already been
+        uploaded, through this or any other indexed path, so the file can be linked
+        to it instead of sent again. Only incremental and manifest mode hashes cover
+        the whole content; sampled ones never match.
+        """
+        if self.hash_mode == HASH_MODE_SAMPLED:
+            return None
+        row = self._get_row(path)
+        if row is None or row[0] is None:
+            return None
+        with self._lock:
+            uploaded = self.conn.execute(
+                'SELECT uploaded_path FROM blobs WHERE digest = ? AND uploaded_path IS NOT NULL', (row[0],)
+            ).fetchone()
+        self._blob_lookups['duplicate' if uploaded else 'unique'].inc()
+        return row[0] if uploaded else None
+
+    def set_blob_uploaded(self, digest: str, path: str):
+        """
+        Records that the receiver holds the content with `digest`, as uploaded from
+        `path`. Ignored if no indexed file has that content (any more).
+        """
+        with self._lock:
+            self.flush()  # The blob row appears when the file's pending row is committed
             with self.conn:
-                self.conn.execute('''
-                    INSERT INTO file_events (path, last_hash) VALUES (?, ?)
-                ''', (path, current_hash))
-            logger.debug(f"New file detected: {path}. Processing.")
-            return True
-        else:
-            last_hash = result[0]
-            if last_hash == current_hash:
-                # Hash hasn't changed, skip processing
-                logger.debug(f"File {path} hash unchanged. Skipping.")
-                return False
-            else:
-                # Hash changed, update and process
+                self.conn.execute('UPDATE blobs SET uploaded_path = ? WHERE digest = ?', (path, digest))
+
+    def blob_stats(self) -> dict:
+        """Distinct contents, the files referencing them, and how many of those contents are uploaded."""
+        with self._lock:
+            self.flush()
+            blobs, references, uploaded = self.conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(refcount), 0), COUNT(uploaded_path) FROM blobs
+            ''').fetchone()
+        return {'blobs': blobs, 'references': references, 'uploaded': uploaded}
+
+    def _get_row(self, path: str) -> tuple | None:
+        with self._lock:
+            if path in self._pending:
+                pending = self._pending[path]
+                return None if pending is None else pending[0]
+            return self.conn.execute(_SELECT_ROW_SQL, (path,)).fetchone()
+
+    def _upsert(self, path: str, current_hash: str | None, fingerprint: tuple,
+                state: HashState | None, manifest: bytes | None, touch: bool):
+        """
+        Records the hash, its resumable state, the chunk manifest and the stat
+        fingerprint; `touch` also marks the file as processed now.
+        """
+        values = (current_hash, *fingerprint, *(state or (None, None, None, None)), manifest)
+        previous = self._pending.get(path)
+        if previous is not None:
+            touch = touch or previous[1]
+        self._pending[path] = (values, touch)
+        self._maybe_flush()
+
+    def remove_entry(self, path: str, is_directory: bool = False):
+        """Forgets a deleted file, or with `is_directory` everything below a deleted directory."""
+        with self._lock:
+            if not is_directory:
+                self._pending[path] = None
+                self._deltas.pop(path, None)
+                self._maybe_flush()
                 with self.conn:
-                    self.conn.execute('''
-                        UPDATE file_events SET last_hash = ?, last_processed_timestamp = CURRENT_TIMESTAMP WHERE path = ?
-                    ''', (current_hash, path))
-                logger.debug(f"File {path} hash changed. Processing.")
-                return True
-
-    def remove_entry(self, path: str):
-        with self.conn:
-            self.conn.execute('DELETE FROM file_events WHERE path = ?', (path,))
-            logger.debug(f"Removed entry for {path} from index.")
-
-    def cleanup_old_entries(self, max_age_minutes: int = 1440): # Default to 24 hours
-        with self.conn:
+                    for table in _KEYED_TABLES[1:]:
+                        self.conn.execute(f'DELETE FROM {table} WHERE path = ?', (path,))
+                logger.debug("Removed entry for %s from index.", path)
+                return
+            self.flush()
+            lower, upper = _prefix_range(path)
+            self._deltas = {key: delta for key, delta in self._deltas.items() if not lower <= key < upper}
+            with self.conn:
+                removed = sum(
+                    self.conn.execute(f'DELETE FROM {table} WHERE path >= ? AND path < ?', (lower, upper)).rowcount
+                    for table in _KEYED_TABLES
+                )
+            logger.debug("Removed %d entries below %s from index.", removed, path)
+
+    def rename(self, src_path: str, dest_path: str, is_directory: bool = False) -> int:
+        """
+        Re-keys the rows of a moved file, or with `is_directory` of everything below a
+        moved directory (a single prefix rewrite per table), without reading any file.
+        The stat fingerprint travels with the row, so the next should_process on the
+        new path only re-verifies content if the move changed it. Rows already at the
+        destination are replaced, but only if the source has rows, so the per-file
+        events watchdog emits after a directory move do not undo the prefix rewrite.
+        Upload checkpoints are dropped: the receiver's session belongs to the old path.
+        Returns the number of index entries moved.
+        """
+        with self._lock:
+            self.flush()
+            self._deltas.pop(src_path, None)
+            with self.conn:
+                if is_directory:
+                    moved = self._rename_prefix(src_path, dest_path)
+                else:
+                    moved = self._rename_path(src_path, dest_path)
+        logger.debug("Moved %d index entries from %s to %s.", moved, src_path, dest_path)
+        return moved
+
+    def _rename_path(self, src_path: str, dest_path: str) -> int:
+        moved = 0
+        for table in _KEYED_TABLES:
+            if table == 'upload_checkpoints':
+                self.conn.execute('DELETE FROM upload_checkpoints WHERE path IN (?, ?)', (src_path, dest_path))
+                continue
             self.conn.execute(f'''
-                DELETE FROM file_events
-                WHERE last_processed_timestamp < datetime('now', '-{max_age_minutes} minutes')
-            ''')
-            logger.debug(f"Cleaned up entries older than {max_age_minutes} minutes.")
+                DELETE FROM {table} WHERE path = ? AND EXISTS (SELECT 1 FROM {table} WHERE path = ?)
+            ''', (dest_path, src_path))
+            cur = self.conn.execute(f'UPDATE {table} SET path = ? WHERE path = ?', (dest_path, src_path))
+            if table == 'file_events':
+                moved = cur.rowcount
+        return moved
+
+    def _rename_prefix(self, src_path: str, dest_path: str) -> int:
+        src_lower, src_upper = _prefix_range(src_path)
+        dest_lower, dest_upper = _prefix_range(dest_path)
+        moved = 0
+        for table in _KEYED_TABLES:
+            if table == 'upload_checkpoints':
+                self.conn.execute('''
+                    DELETE FROM upload_checkpoints WHERE (path >= ? AND path < ?) OR (path >= ? AND path < ?)
+                ''', (src_lower, src_upper, dest_lower, dest_upper))
+                continue
+            self.conn.execute(f'''
+                DELETE FROM {table} WHERE path >= ? AND path < ?
+                  AND EXISTS (SELECT 1 FROM {table} WHERE path >= ? AND path < ?)
+            ''', (dest_lower, dest_upper, src_lower, src_upper))
+            cur = self.conn.execute(f'''
+                UPDATE {table} SET path = ? || substr(path, ?) WHERE path >= ? AND path < ?
+            ''', (dest_lower, len(src_lower) + 1, src_lower, src_upper))
+            if table == 'file_events':
+                moved = cur.rowcount
+        return moved
+
+    def _maybe_flush(self):
+        if self.commit_interval_seconds <= 0 or len(self._pending) >= self.commit_batch_size:
+            self.flush()
+
+    def flush(self):
+        """Commits all pending index mutations in a single transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            deletes, upserts, touched = [], [], []
+            for path, entry in batch.items():
+                if entry is None:
+                    deletes.append((path,))
+                elif entry[1]:
+                    touched.append((path, *entry[0]))
+                else:
+                    upserts.append((path, *entry[0]))
+
+            started = time.perf_counter()
+            try:
+                with self.conn:
+                    if deletes:
+                        self.conn.executemany('DELETE FROM file_events WHERE path = ?', deletes)
+                    if upserts:
+                        self.conn.executemany(_UPSERT_SQL, upserts)
+                    if touched:
+                        self.conn.executemany(_UPSERT_TOUCH_SQL, touched)
+            except sqlite3.Error as e:
+                logger.error(f"Error committing {len(batch)} index mutations: {e}")
+                # Keep them for the next attempt, without overwriting anything newer.
+                for path, entry in batch.items():
+                    self._pending.setdefault(path, entry)
+                return
+            elapsed = time.perf_counter() - started
+
+            self.commits += 1
+            self.rows_committed += len(batch)
+            self.last_batch_size = len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_commit_seconds = elapsed
+            self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+            self.total_commit_seconds += elapsed
+            self._commit_seconds.observe(elapsed)
+            self._rows_committed_metric.inc(len(batch))
+
+    def _run_flusher(self):
+        while not self._closed.wait(self.commit_interval_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"FileIndex background commit failed: {e}")
+
+    def sweep_expired(self, max_age_minutes: int = 1440, batch_size: int = 500) -> int:
+        """
+        Deletes entries of files that no longer exist and were not processed within
+        `max_age_minutes`, `batch_size` rows per transaction so the write lock is only
+        held briefly. The ingestion offsets and upload checkpoints of those paths go in
+        the same transaction. A stale entry whose file is still on disk only has its
+        timestamp refreshed, so an unchanged file keeps its progress and is not
+        ingested again. Returns the number of entries removed.
+        """
+        cutoff = f'-{int(max_age_minutes)} minutes'
+        removed = 0
+        self.flush()
+        while True:
+            with self._lock, self.conn:
+                expired = self.conn.execute('''
+                    SELECT path FROM file_events
+                    WHERE last_processed_timestamp < datetime('now', ?)
+                    LIMIT ?
+                ''', (cutoff, batch_size)).fetchall()
+                present = [row for row in expired if os.path.exists(row[0])]
+                gone = [row for row in expired if row not in present]
+                self.conn.executemany('''
+                    UPDATE file_events SET last_processed_timestamp = CURRENT_TIMESTAMP WHERE path = ?
+                ''', present)
+                for table in _KEYED_TABLES:
+                    self.conn.executemany(f'DELETE FROM {table} WHERE path = ?', gone)
+            removed += len(gone)
+            if len(expired) < batch_size:
+                return removed
@@ -1,39 +1,144 @@
+import asyncio
+import inspect
 import logging
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable
 from watchdog.events import FileSystemEventHandler, FileSystemEvent, EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED, EVENT_TYPE_DELETED, EVENT_TYPE_MOVED
 from components.event_handlers import handle_created, handle_modified, handle_deleted, handle_moved
-from components.file_index import FileIndex
+from components.file_index import FileIndex, HASH_MODE_INCREMENTAL
+from components.ingest import CsvIngestor
+from components.metrics import REGISTRY
+from components.sinks import Sink
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_MODE_ROWS = 'rows'    # CSV exports as record batches, other files as chunked uploads
+UPLOAD_MODE_FILES = 'files'  # Every file as a chunked upload
+
+def _is_async(handler: Callable) -> bool:
+    while isinstance(handler, partial):
+        handler = handler.func
+    return inspect.iscoroutinefunction(handler)
+
 class MyHandler(FileSystemEventHandler):
-    def __init__(self):
+    """
+    Checks events against the FileIndex and runs the handler for their type.
+
+    Moves and deletes first update the index (see FileIndex.rename and
+    remove_entry). A moved file then goes through the same check as a modified one,
+    which refreshes its hash if the move came with a content change, but its
+    handler always runs so the sink learns the new path; unchanged content is
+    then linked on the receiver rather than sent again.
+
+    Entries in `handlers` replace the default handle_* functions per event type and
+    receive the same keyword context (ingestor, sink, index). They may be plain or
+    async functions: the threaded pipeline runs async ones to completion on the
+    worker thread, while `on_any_event_async` awaits them on the event loop and
+    moves sync ones (and the index check) to an executor.
+
+    With the index in manifest hash mode, a handler can get the chunks changed by
+    the event's content change from `index.take_delta(path)`; deltas not taken
+    are dropped once the handler returns.
+    """
+
+    def __init__(self, sink: Sink | None = None, upload_mode: str = UPLOAD_MODE_ROWS,
+                 index_path: str = 'file_index.db', handlers: dict[str, Callable] | None = None,
+                 hash_mode: str = HASH_MODE_INCREMENTAL):
         super().__init__()
-        self.index = FileIndex()
-        self._handlers = {
+        if upload_mode not in (UPLOAD_MODE_ROWS, UPLOAD_MODE_FILES):
+            raise ValueError(f"Unknown upload mode: {upload_mode}")
+        self.index = FileIndex(index_path, hash_mode=hash_mode)
+        self.sink = sink
+        self.ingestor = None
+        if upload_mode == UPLOAD_MODE_ROWS:
+            self.ingestor = CsvIngestor(self.index, consumer=sink.send_batch if sink is not None else None)
+        context = {'ingestor': self.ingestor, 'sink': sink, 'index': self.index}
+        table = {
             EVENT_TYPE_CREATED: handle_created,
             EVENT_TYPE_MODIFIED: handle_modified,
             EVENT_TYPE_DELETED: handle_deleted,
-            EVENT_TYPE_MOVED: handle_moved
+            EVENT_TYPE_MOVED: handle_moved,
+            **(handlers or {})
         }
+        self._handlers = {event_type: partial(fn, **context) for event_type, fn in table.items()}
+        self._async_handlers = {event_type for event_type, fn in table.items() if _is_async(fn)}
+        self._handle_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='handle')
+        self._handled = REGISTRY.counter('uploader_events_total', "Events per pipeline stage", stage='handled')
+        self._skipped = REGISTRY.counter('uploader_events_total', "Events per pipeline stage", stage='skipped')
         logger.info("MyHandler initialized with SQLite-based hash tracking")
 
-    def on_any_event(self, event: FileSystemEvent):
-        if event.is_directory:
-            return
+    def _update_index(self, event: FileSystemEvent):
+        """
+        Carries index rows over a move or drops them on a delete, for files and whole
+        directories alike, before any handler runs; neither reads file content.
+        """
+        if event.event_type == EVENT_TYPE_MOVED:
+            self.index.rename(event.src_path, event.dest_path, is_directory=event.is_directory)
+        elif event.event_type == EVENT_TYPE_DELETED:
+            self.index.remove_entry(event.src_path, is_directory=event.is_directory)
 
+    def _route(self, event: FileSystemEvent) -> tuple[Callable, str] | None:
+        if event.is_directory:
+            return None
         handler = self._handlers.get(event.event_type)
         if not handler:
-            return
-
+            return None
         path = getattr(event, 'dest_path', event.src_path) if event.event_type == EVENT_TYPE_MOVED else event.src_path
+        return handler, path
 
-        # Cleanup old events
-        self.index.cleanup_old_entries()
-
+    def _should_handle(self, event: FileSystemEvent, path: str) -> bool:
         if event.event_type == EVENT_TYPE_DELETED:
+            return True
+        changed = self.index.should_process(path)
+        return changed or event.event_type == EVENT_TYPE_MOVED
+
+    def _skip(self, path: str):
+        self._skipped.inc()
+        logger.debug("Skipped duplicate event for: %s", path)
+
+    def on_any_event(self, event: FileSystemEvent):
+        self._update_index(event)
+        route = self._route(event)
+        if route is None:
+            return
+        handler, path = route
+
+        if not self._should_handle(event, path):
+            self._skip(path)
+            return
+
+        started = time.perf_counter()
+        if event.event_type in self._async_handlers:
+            asyncio.run(handler(event))
+        else:
             handler(event)
+        self.index.take_delta(path)
+        self._handle_seconds.observe(time.perf_counter() - started)
+        self._handled.inc()
+
+    async def on_any_event_async(self, event: FileSystemEvent, executor: Executor | None = None):
+        """Event-loop counterpart of on_any_event; blocking work runs on `executor`."""
+        loop = asyncio.get_running_loop()
+        if event.event_type in (EVENT_TYPE_MOVED, EVENT_TYPE_DELETED):
+            await loop.run_in_executor(executor, self._update_index, event)
+        route = self._route(event)
+        if route is None:
+            return
+        handler, path = route
+
+        if event.event_type != EVENT_TYPE_DELETED:
+            if not await loop.run_in_executor(executor, self._should_handle, event, path):
+                self._skip(path)
+                return
+
+        started = time.perf_counter()
+        if event.event_type in self._async_handlers:
+            await handler(event)
         else:
-            if self.index.should_process(path):
-                handler(event)
-            else:
-                logger.debug(f"Skipped duplicate event for: {path}")
\ No newline at end of file
+            await loop.run_in_executor(executor, handler, event)
+        self.index.take_delta(path)
+        self._handle_seconds.observe(time.perf_counter() - started)
+        self._handled.inc()
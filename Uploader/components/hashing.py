@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import os
+from typing import BinaryIO, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_BYTES = 1024 * 1024  # 1 MB
+_EMPTY_CHAIN = bytes(32)
+
+
+class HashState(NamedTuple):
+    """
+    Resumable state of a chained content hash.
+
+    The digest of a file is sha256(chain || tail), where `chain` folds the
+    sha256 of every complete HASH_BLOCK_BYTES block in order and `tail` is
+    the remaining partial block. It depends only on the content, so it is
+    identical whether computed in one pass or extended append by append.
+    """
+    offset: int                     # Bytes folded into `chain`; a multiple of HASH_BLOCK_BYTES
+    chain: bytes
+    head_digest: bytes | None       # sha256 of the first block, to detect rewrites
+    last_block_digest: bytes | None  # sha256 of the block ending at `offset`, to detect truncation
+
+
+def _block_digest(f: BinaryIO, offset: int) -> bytes | None:
+    f.seek(offset)
+    block = f.read(HASH_BLOCK_BYTES)
+    if len(block) < HASH_BLOCK_BYTES:
+        return None
+    return hashlib.sha256(block).digest()
+
+
+def _prefix_intact(f: BinaryIO, size: int, state: HashState) -> bool:
+    """
+    Cheaply checks that the file still looks like an append to the bytes folded into
+    `state`: it must extend past them and keep their first and last block. Blocks in
+    between are not read, so this is a heuristic for append-only files, not proof.
+    """
+    if size <= state.offset:
+        return False
+    if state.offset == 0:
+        return True
+    if _block_digest(f, 0) != state.head_digest:
+        return False
+    return _block_digest(f, state.offset - HASH_BLOCK_BYTES) == state.last_block_digest
+
+
+class ChainedHasher:
+    """
+    Folds content fed in order, in pieces of any size, into the chained hash,
+    starting from `state` (whose offset the first piece must continue from).
+    """
+
+    def __init__(self, state: HashState | None = None):
+        self.offset, self.chain, self.head_digest, self.last_block_digest = (
+            state or HashState(0, _EMPTY_CHAIN, None, None))
+        self._tail = b''
+
+    def update(self, data: bytes):
+        if self._tail:
+            data = self._tail + data
+        start = 0
+        while len(data) - start >= HASH_BLOCK_BYTES:
+            self.last_block_digest = hashlib.sha256(data[start:start + HASH_BLOCK_BYTES]).digest()
+            self.chain = hashlib.sha256(self.chain + self.last_block_digest).digest()
+            if self.offset == 0:
+                self.head_digest = self.last_block_digest
+            self.offset += HASH_BLOCK_BYTES
+            start += HASH_BLOCK_BYTES
+        self._tail = bytes(data[start:])
+
+    def hexdigest(self) -> str:
+        return hashlib.sha256(self.chain + self._tail).hexdigest()
+
+    def state(self) -> HashState:
+        return HashState(self.offset, self.chain, self.head_digest, self.last_block_digest)
+
+
+def chained_hash(filepath: str, previous: HashState | None = None) -> tuple[str, HashState] | None:
+    """
+    Computes the chained content hash of a file, resuming from `previous` when the
+    file has grown past it and its first and last hashed blocks are unchanged.
+    Otherwise the whole file is hashed. A resumed hash assumes the file was only
+    appended to; an in-place edit to a middle block of a growing file goes unseen.
+
+    Returns the hex digest and the state to persist, or None if the file cannot be read.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if previous is not None and not _prefix_intact(f, size, previous):
+                logger.debug(f"Stored hash prefix for {filepath} no longer matches. Rehashing in full.")
+                previous = None
+            hasher = ChainedHasher(previous)
+            f.seek(hasher.offset)
+            while block := f.read(HASH_BLOCK_BYTES):
+                hasher.update(block)
+    except IOError as e:
+        logger.error(f"Error reading file {filepath} for hashing: {e}")
+        return None
+    return hasher.hexdigest(), hasher.state()
@@ -0,0 +1,293 @@
+import csv
+import io
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from typing import BinaryIO, Callable, Iterator
+from components.file_index import FileIndex
+from components.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_BATCH_ROWS = 5000
+
+# Column layouts of the exports written by data_generator, keyed by table name.
+ERP_TABLES = {
+    'sales': ['SaleID', 'CustomerID', 'ProductID', 'SaleDate', 'Quantity',
+              'UnitPrice', 'TotalPrice', 'PaymentMethod', 'ShippingAddress', 'Status'],
+    'purchases': ['PurchaseID', 'SupplierID', 'ProductID', 'PurchaseDate', 'Quantity',
+                  'UnitPrice', 'TotalPrice', 'PaymentStatus', 'DeliveryStatus'],
+    'ledger': ['TransactionID', 'TransactionDate', 'AccountName', 'Description',
+               'Debit', 'Credit', 'Balance', 'ReferenceID'],
+    'inventory': ['ProductID', 'ProductName', 'Category', 'CurrentStock',
+                  'ReorderLevel', 'WarehouseLocation', 'LastStockUpdate'],
+    'customers': ['CustomerID', 'FirstName', 'LastName', 'Email', 'PhoneNumber',
+                  'Address', 'City', 'State', 'ZipCode', 'RegistrationDate'],
+    'suppliers': ['SupplierID', 'SupplierName', 'ContactPerson', 'Email', 'PhoneNumber',
+                  'Address', 'City', 'State', 'ZipCode', 'SupplyCategory', 'ContractStartDate'],
+}
+
+
+def table_for_path(path: str) -> str | None:
+    """
+    Maps a CSV file to its table: `sales.csv`, `sales-0003.csv` and `sales_2024.csv`
+    are all `sales`. Other CSV files use their file stem; non-CSV files return None.
+    """
+    stem, ext = os.path.splitext(os.path.basename(path))
+    if ext.lower() != '.csv':
+        return None
+    for table in ERP_TABLES:
+        if stem == table or stem.startswith((table + '-', table + '_')):
+            return table
+    return stem
+
+
+@dataclass
+class RecordBatch:
+    """A run of consecutive CSV records read from one file."""
+    table: str
+    path: str
+    columns: list[str]
+    rows: list[list[str]]
+    first_row: int      # 1-based data row number of rows[0]
+    start_offset: int   # Byte offset of the first record
+    end_offset: int     # Byte offset just past the last record
+
+    @property
+    def nbytes(self) -> int:
+        return self.end_offset - self.start_offset
+
+
+class _Delivery:
+    """Batches of one file handed to the consumer and not yet acknowledged, in read order."""
+
+    def __init__(self):
+        self.pending: deque[list] = deque()  # [checkpoint, acknowledged]
+        self.read: tuple | None = None        # Checkpoint after the last batch handed over
+
+
+def _parse(lines: list[bytes]) -> list[list[str]]:
+    text = b''.join(lines).decode('utf-8', errors='replace')
+    return [row for row in csv.reader(io.StringIO(text)) if row]
+
+
+class CsvIngestor:
+    """
+    Streams CSV exports to a consumer in batches of at most `batch_rows` records.
+
+    The consumer is called with each batch and a callback it must call with True
+    once the batch has been delivered, or False if it never will be. Only then is
+    the byte offset and row number reached checkpointed in the FileIndex, in read
+    order, so a later modification of an append-only file only reads the new
+    tail and a restart re-reads whatever was not acknowledged. Until then further
+    modifications continue from where reading stopped; a failed batch makes the
+    next one start again from the last checkpoint. Without a consumer every batch
+    is checkpointed as soon as it is read. A record is only consumed once its terminating newline
+    has been written; quoted fields spanning lines are kept together. Ingestion
+    restarts from the top if the file shrank, was replaced (new inode) or its
+    header changed. Memory use is bounded by one batch, whatever the file size.
+    """
+
+    def __init__(self, index: FileIndex,
+                 consumer: Callable[[RecordBatch, Callable[[bool], None]], None] | None = None,
+                 batch_rows: int = _DEFAULT_BATCH_ROWS):
+        self.index = index
+        self.consumer = consumer
+        self.batch_rows = max(batch_rows, 1)
+        self._deliveries: dict[str, _Delivery] = {}
+        self._delivery_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.files_ingested = 0
+        self.rows_ingested = 0
+        self.bytes_ingested = 0
+        self.seconds_ingesting = 0.0
+        # Per-file figures are only logged at debug level; throughput is rate() of these counters.
+        self._rows_metric = REGISTRY.counter('uploader_ingested_rows_total', "CSV records delivered to the sink")
+        self._bytes_metric = REGISTRY.counter('uploader_ingested_bytes_total', "CSV bytes delivered to the sink")
+        self._ingest_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='ingest')
+
+    def stats(self) -> dict:
+        seconds = self.seconds_ingesting
+        return {
+            'files': self.files_ingested,
+            'rows': self.rows_ingested,
+            'bytes': self.bytes_ingested,
+            'rows_per_second': round(self.rows_ingested / seconds) if seconds else 0,
+            'mb_per_second': round(self.bytes_ingested / seconds / 1e6, 1) if seconds else 0.0,
+        }
+
+    def ingest(self, path: str, from_start: bool = False) -> dict | None:
+        """
+        Delivers all complete records past the last checkpoint (or from the top with
+        `from_start`). Returns throughput figures, or None if the path is not a CSV
+        export or cannot be read.
+        """
+        table = table_for_path(path)
+        if table is None:
+            return None
+
+        started = time.perf_counter()
+        rows = 0
+        try:
+            with open(path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                start_offset, row_number, header = self._resume_point(f, path, inode, from_start)
+                offset = start_offset
+                if header is None:
+                    self._drop_delivery(path)
+                    header, offset = self._read_header(f)
+                    if header is None:
+                        return None  # Header not completely written yet
+                    self._check_columns(table, path, header)
+                    self.index.set_ingest_offset(path, offset, row_number, header, inode)
+
+                columns = next(csv.reader([header]))
+                for batch in self._batches(f, table, path, columns, offset, row_number):
+                    rows += len(batch.rows)
+                    offset = batch.end_offset
+                    checkpoint = (offset, batch.first_row + len(batch.rows) - 1, header, inode)
+                    if self.consumer is None:
+                        self.index.set_ingest_offset(path, *checkpoint)
+                    else:
+                        self.consumer(batch, self._track(path, checkpoint))
+        except IOError as e:
+            logger.error(f"Error reading {path} for ingestion: {e}")
+            return None
+
+        elapsed = time.perf_counter() - started
+        nbytes = offset - start_offset
+        with self._stats_lock:
+            self.files_ingested += 1
+            self.rows_ingested += rows
+            self.bytes_ingested += nbytes
+            self.seconds_ingesting += elapsed
+        self._rows_metric.inc(rows)
+        self._bytes_metric.inc(nbytes)
+        self._ingest_seconds.observe(elapsed)
+        result = {
+            'table': table,
+            'rows': rows,
+            'bytes': nbytes,
+            'seconds': elapsed,
+            'rows_per_second': rows / elapsed if elapsed else 0.0,
+            'mb_per_second': nbytes / elapsed / 1e6 if elapsed else 0.0,
+        }
+        logger.debug("Ingested %d %s rows (%d bytes) from %s in %.3fs", rows, table, nbytes, path, elapsed)
+        return result
+
+    def _resume_point(self, f: BinaryIO, path: str, inode: int, from_start: bool) -> tuple[int, int, str | None]:
+        """Returns (byte offset, rows already delivered, header) to continue from."""
+        checkpoint = None if from_start else self._read_position(path)
+        if checkpoint is None:
+            return 0, 0, None
+
+        offset, row_number, header, stored_inode = checkpoint
+        size = os.fstat(f.fileno()).st_size
+        if size < offset or stored_inode != inode:
+            logger.debug("%s was truncated or replaced. Ingesting from the start.", path)
+            return 0, 0, None
+        current_header, _ = self._read_header(f)
+        if current_header != header:
+            logger.debug("Header of %s changed. Ingesting from the start.", path)
+            return 0, 0, None
+        f.seek(offset)
+        return offset, row_number, header
+
+    def _read_position(self, path: str) -> tuple[int, int, str, int | None] | None:
+        with self._delivery_lock:
+            delivery = self._deliveries.get(path)
+            if delivery is not None:
+                return delivery.read
+        return self.index.get_ingest_offset(path)
+
+    def _drop_delivery(self, path: str):
+        """Forgets unacknowledged batches of `path`; their late acknowledgements are ignored."""
+        with self._delivery_lock:
+            self._deliveries.pop(path, None)
+
+    def _track(self, path: str, checkpoint: tuple) -> Callable[[bool], None]:
+        """Registers a batch handed to the consumer; returns the callback that acknowledges it."""
+        entry = [checkpoint, False]
+        with self._delivery_lock:
+            delivery = self._deliveries.get(path)
+            if delivery is None:
+                delivery = self._deliveries[path] = _Delivery()
+            delivery.pending.append(entry)
+            delivery.read = checkpoint
+        return partial(self._acknowledge, path, delivery, entry)
+
+    def _acknowledge(self, path: str, delivery: _Delivery, entry: list, delivered: bool):
+        with self._delivery_lock:
+            if self._deliveries.get(path) is not delivery:
+                return  # Superseded by a restart from the top or an earlier failure
+            if not delivered:
+                del self._deliveries[path]
+                logger.warning(f"Rows of {path} up to row {entry[0][1]} were not delivered; "
+                               f"they are read again from the last checkpoint on its next change")
+                return
+            entry[1] = True
+            checkpoint = None
+            while delivery.pending and delivery.pending[0][1]:
+                checkpoint = delivery.pending.popleft()[0]
+            if not delivery.pending:
+                del self._deliveries[path]
+            if checkpoint is not None:
+                # Under the lock, so checkpoints reach the index in read order
+                self.index.set_ingest_offset(path, *checkpoint)
+
+    def _read_header(self, f: BinaryIO) -> tuple[str | None, int]:
+        f.seek(0)
+        lines = []
+        quotes = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                return None, 0
+            lines.append(line)
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                raw = b''.join(lines)
+                return raw.decode('utf-8', errors='replace').rstrip('\r\n'), len(raw)
+        return None, 0
+
+    def _check_columns(self, table: str, path: str, header: str):
+        expected = ERP_TABLES.get(table)
+        columns = next(csv.reader([header]))
+        if expected is not None and columns != expected:
+            logger.warning(f"{path} does not match the {table} schema: {columns}")
+
+    def _batches(self, f: BinaryIO, table: str, path: str, columns: list[str],
+                 offset: int, row_number: int) -> Iterator[RecordBatch]:
+        lines = []
+        nbytes = 0
+        records = 0
+        in_quotes = False
+        # Position just after the last complete record in `lines`
+        complete_lines, complete_bytes = 0, 0
+
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # The writer has not finished this line yet
+            lines.append(line)
+            nbytes += len(line)
+            if (in_quotes or b'"' in line) and line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if in_quotes:
+                continue
+            records += 1
+            complete_lines, complete_bytes = len(lines), nbytes
+            if records >= self.batch_rows:
+                rows = _parse(lines)
+                yield RecordBatch(table, path, columns, rows, row_number + 1, offset, offset + nbytes)
+                offset += nbytes
+                row_number += len(rows)
+                lines, nbytes, records = [], 0, 0
+                complete_lines, complete_bytes = 0, 0
+
+        if complete_lines:
+            rows = _parse(lines[:complete_lines])
+            yield RecordBatch(table, path, columns, rows, row_number + 1, offset, offset + complete_bytes)
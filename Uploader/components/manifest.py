@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import struct
+import zlib
+from dataclasses import dataclass
+from components.hashing import HASH_BLOCK_BYTES, ChainedHasher, HashState
+
+logger = logging.getLogger(__name__)
+
+# Chunk sizes: no cut before MIN, cuts average about AVG, always a cut by MAX.
+MIN_CHUNK_BYTES = 48 * 1024
+AVG_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 256 * 1024
+
+# A manifest is one packed record per chunk: length (uint32) and digest (16-byte BLAKE2b).
+# Offsets are the running sum of the lengths, so they are not stored.
+_RECORD = struct.Struct('<I16s')
+_DIGEST_BYTES = 16
+# Probability scale of a cut after a line: its length over the bytes between MIN and AVG
+_CUT_SCALE = (1 << 32) // (AVG_CHUNK_BYTES - MIN_CHUNK_BYTES)
+
+
+def _chunk_digest(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=_DIGEST_BYTES).digest()
+
+
+class Chunker:
+    """
+    Splits content fed in order into content-defined chunks, anchored at newlines.
+
+    From MIN_CHUNK_BYTES into a chunk on, every line ending is a candidate cut: the
+    chunk ends after a line whose CRC-32 falls below its length times _CUT_SCALE,
+    so longer lines are likelier cuts and chunks average about AVG_CHUNK_BYTES
+    whatever the line length. The decision depends only on the line itself, so an
+    edit moves the boundaries of the chunks it touches and no others: after an
+    inserted or deleted row the next cuts fall on the same rows as before. For
+    CSV exports every chunk holds whole records. Content without a newline
+    within MAX_CHUNK_BYTES is cut there, i.e. binary files get fixed-size chunks.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self.offset = 0  # File offset of the start of the buffer, i.e. of the open chunk
+
+    def update(self, data: bytes) -> list[tuple[int, bytes]]:
+        """Adds `data`; returns (length, digest) of the chunks it completed."""
+        self._buffer += data
+        return self._cut(final=False)
+
+    def finish(self) -> list[tuple[int, bytes]]:
+        """Returns the last chunk(s), ending at the end of the content."""
+        return self._cut(final=True)
+
+    def _cut(self, final: bool) -> list[tuple[int, bytes]]:
+        buffer = self._buffer
+        view = memoryview(buffer)
+        chunks = []
+        start = 0
+        # Only cut where the decision cannot depend on bytes not read yet
+        while len(buffer) - start >= MAX_CHUNK_BYTES or (final and start < len(buffer)):
+            end = self._find_cut(buffer, view, start)
+            chunks.append((end - start, _chunk_digest(view[start:end])))
+            start = end
+        view.release()
+        self._buffer = buffer[start:]
+        self.offset += start
+        return chunks
+
+    @staticmethod
+    def _find_cut(buffer: bytes, view: memoryview, start: int) -> int:
+        limit = min(start + MAX_CHUNK_BYTES, len(buffer))
+        newline = buffer.find(b'\n', start + MIN_CHUNK_BYTES - 1, limit)
+        if newline < 0:
+            return limit
+        line_start = buffer.rfind(b'\n', start, newline) + 1 or start
+        while newline >= 0:
+            if zlib.crc32(view[line_start:newline + 1]) < (newline + 1 - line_start) * _CUT_SCALE:
+                return newline + 1
+            line_start = newline + 1
+            newline = buffer.find(b'\n', line_start, limit)
+        if limit < start + MAX_CHUNK_BYTES:
+            return limit  # The end of the content
+        # No line qualified: cut after the last complete line
+        return line_start
+
+
+def encode(chunks: list[tuple[int, bytes]]) -> bytes:
+    return b''.join(_RECORD.pack(length, digest) for length, digest in chunks)
+
+
+def decode(manifest: bytes) -> list[tuple[int, bytes]]:
+    return list(_RECORD.iter_unpack(manifest))
+
+
+def build_manifest(filepath: str) -> tuple[str, HashState, bytes] | None:
+    """
+    Reads a file once, returning its chained content hash (the same as
+    hashing.chained_hash), the hash state and its packed chunk manifest, or None
+    if the file cannot be read.
+    """
+    hasher = ChainedHasher()
+    chunker = Chunker()
+    chunks = []
+    try:
+        with open(filepath, 'rb') as f:
+            while block := f.read(HASH_BLOCK_BYTES):
+                hasher.update(block)
+                chunks += chunker.update(block)
+    except IOError as e:
+        logger.error(f"Error reading file {filepath} for its manifest: {e}")
+        return None
+    chunks += chunker.finish()
+    return hasher.hexdigest(), hasher.state(), encode(chunks)
+
+
+@dataclass
+class ManifestDelta:
+    """
+    The chunks of a file's new content, each with the offset of an identical chunk
+    in the previous content (`base_offset`) or None if its bytes are new.
+    """
+    chunks: list[tuple[int, int, bytes, int | None]]  # (offset, length, digest, base_offset)
+    base_size: int
+    digest: str | None = None  # Chained hash of the new content
+
+    def operations(self) -> list[tuple[int, int, int | None]]:
+        """
+        The new content as (offset, length, base_offset) runs: copies of
+        consecutive previous bytes, or new bytes where base_offset is None.
+        """
+        runs = []
+        for offset, length, _, base_offset in self.chunks:
+            if runs:
+                last_offset, last_length, last_base = runs[-1]
+                if last_base is None and base_offset is None:
+                    continues = True
+                else:
+                    continues = None not in (last_base, base_offset) and last_base + last_length == base_offset
+                if continues:
+                    runs[-1] = (last_offset, last_length + length, last_base)
+                    continue
+            runs.append((offset, length, base_offset))
+        return runs
+
+    @property
+    def size(self) -> int:
+        return sum(length for _, length, _, _ in self.chunks)
+
+    @property
+    def changed_ranges(self) -> list[tuple[int, int]]:
+        """[start, end) byte ranges of the new content not found in the previous content, merged."""
+        ranges = []
+        for offset, length, _, base_offset in self.chunks:
+            if base_offset is not None:
+                continue
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], offset + length)
+            else:
+                ranges.append((offset, offset + length))
+        return ranges
+
+    @property
+    def changed_bytes(self) -> int:
+        return sum(end - start for start, end in self.changed_ranges)
+
+
+def diff(previous: bytes, current: bytes, digest: str | None = None) -> ManifestDelta:
+    """
+    Matches the chunks of the `current` manifest against those of `previous` by
+    digest, wherever they were; `digest` is the content hash of the current content.
+    """
+    base = {}
+    offset = 0
+    for length, chunk_digest in decode(previous):
+        base.setdefault(chunk_digest, offset)
+        offset += length
+    base_size = offset
+
+    chunks = []
+    offset = 0
+    for length, chunk_digest in decode(current):
+        chunks.append((offset, length, chunk_digest, base.get(chunk_digest)))
+        offset += length
+    return ManifestDelta(chunks, base_size, digest)
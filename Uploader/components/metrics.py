@@ -0,0 +1,210 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from 50us (stat-only index hits) up to 30s (large uploads).
+_DEFAULT_LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                            0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+TYPE_COUNTER = 'counter'
+TYPE_GAUGE = 'gauge'
+TYPE_HISTOGRAM = 'histogram'
+
+
+class Counter:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int | float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """
+    A value that is either set directly or read from callbacks at collection time.
+    Several component instances (one per watch root) may register a callback on the
+    same gauge; it then reports their sum.
+    """
+
+    __slots__ = ('value', 'fns')
+
+    def __init__(self):
+        self.value = 0
+        self.fns: list[Callable[[], int | float]] = []
+
+    def set(self, value: int | float):
+        self.value = value
+
+    def read(self) -> int | float:
+        return sum(fn() for fn in self.fns) if self.fns else self.value
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing is a bisect and two additions under a lock."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: tuple[float, ...] = _DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile; cheap and good enough for snapshots."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    """
+    Collection of named metric series. Series are created once (typically in a
+    component's __init__) and updated through the returned object, so the hot path
+    never formats names or labels; that only happens when the registry is rendered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help, {label items: series})
+        self._families: dict[str, tuple[str, str, dict[tuple, object]]] = {}
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        return self._series(name, TYPE_COUNTER, help, labels, Counter)
+
+    def gauge(self, name: str, help: str, fn: Callable[[], int | float] | None = None, **labels) -> Gauge:
+        gauge = self._series(name, TYPE_GAUGE, help, labels, Gauge)
+        if fn is not None:
+            with self._lock:
+                gauge.fns.append(fn)
+        return gauge
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = _DEFAULT_LATENCY_BUCKETS,
+                  **labels) -> Histogram:
+        return self._series(name, TYPE_HISTOGRAM, help, labels, lambda: Histogram(buckets))
+
+    def _series(self, name: str, kind: str, help: str, labels: dict, factory: Callable):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family[0]}")
+            series = family[2].get(key)
+            if series is None:
+                series = family[2][key] = factory()
+            return series
+
+    def render(self) -> str:
+        """Renders every series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            families = [(name, kind, help, list(series.items()))
+                        for name, (kind, help, series) in self._families.items()]
+        for name, kind, help, series in families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, metric in series:
+                if kind == TYPE_HISTOGRAM:
+                    with metric._lock:
+                        counts, total, count = list(metric.counts), metric.sum, metric.count
+                    cumulative = 0
+                    for bound, n in zip((*metric.buckets, '+Inf'), counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{_labels(key, le=bound)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(key)} {total}')
+                    lines.append(f'{name}_count{_labels(key)} {count}')
+                else:
+                    value = metric.read() if kind == TYPE_GAUGE else metric.value
+                    lines.append(f'{name}{_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """Compact summary for logs: counters and gauges by value, histograms as count/avg/p50/p99 in ms."""
+        result = {}
+        with self._lock:
+            families = [(name, kind, list(series.items())) for name, (kind, _, series) in self._families.items()]
+        for name, kind, series in families:
+            for key, metric in series:
+                label = name + (_labels(key) if key else '')
+                if kind == TYPE_HISTOGRAM:
+                    result[label] = {
+                        'count': metric.count,
+                        'avg_ms': round(metric.sum * 1000 / metric.count, 3) if metric.count else 0.0,
+                        'p50_ms': round(metric.quantile(0.5) * 1000, 3),
+                        'p99_ms': round(metric.quantile(0.99) * 1000, 3),
+                    }
+                else:
+                    result[label] = metric.read() if kind == TYPE_GAUGE else metric.value
+        return result
+
+
+def _labels(key: tuple, **extra) -> str:
+    items = [*key, *extra.items()]
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+# Process-wide registry used by the Uploader components.
+REGISTRY = Registry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: Registry = None
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """Serves a registry at http://<host>:<port>/metrics for Prometheus to scrape."""
+
+    def __init__(self, registry: Registry = REGISTRY, host: str = '127.0.0.1', port: int = 9108):
+        handler = type('BoundMetricsRequestHandler', (_MetricsRequestHandler,), {'registry': registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer', daemon=True)
+        self.address = self._server.server_address
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.address[0]}:{self.address[1]}/metrics")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,93 @@
+import fnmatch
+import logging
+import os
+import re
+from watchdog.events import (
+    FileSystemEventHandler, FileSystemEvent, FileCreatedEvent, FileDeletedEvent,
+    DirCreatedEvent, DirDeletedEvent, EVENT_TYPE_MOVED
+)
+from components.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(patterns: list[str]) -> re.Pattern | None:
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(os.path.normcase(p))})' for p in patterns))
+
+
+class PathFilter:
+    """
+    Include/exclude globs for one watch root.
+
+    Patterns are matched against the path relative to the root (using '/') and
+    against each of its components, so `*.tmp` excludes temp files at any depth
+    and `.git` or `node_modules` exclude whole subtrees. Include patterns only
+    apply to files and match the relative path or the file name; without any,
+    every file that is not excluded is included.
+    """
+
+    def __init__(self, root: str, include: list[str] | None = None, exclude: list[str] | None = None,
+                 recursive: bool = True):
+        self.root = os.path.normpath(root)
+        self.recursive = recursive
+        self._include = _compile(include or [])
+        self._exclude = _compile(exclude or [])
+
+    def _relative(self, path: str) -> str | None:
+        rel = os.path.relpath(path, self.root)
+        if rel == '.' or rel.startswith('..'):
+            return None
+        return os.path.normcase(rel).replace(os.sep, '/')
+
+    def accepts(self, path: str, is_directory: bool = False) -> bool:
+        rel = self._relative(path)
+        if rel is None:
+            return False
+        parts = rel.split('/')
+        if not self.recursive and (len(parts) > 1 or is_directory):
+            return False
+        if self._exclude is not None:
+            if self._exclude.match(rel) or any(self._exclude.match(part) for part in parts):
+                return False
+        if is_directory or self._include is None:
+            return True
+        return bool(self._include.match(rel) or self._include.match(parts[-1]))
+
+
+class FilteringHandler(FileSystemEventHandler):
+    """
+    Drops events for paths rejected by a PathFilter before they reach the coalescer,
+    so ignored temp and lock files are never debounced, hashed or indexed. A move
+    across the filter boundary becomes a delete or a create of the accepted side.
+    """
+
+    def __init__(self, downstream: FileSystemEventHandler, path_filter: PathFilter):
+        super().__init__()
+        self.downstream = downstream
+        self.path_filter = path_filter
+        self.filtered_events = 0
+        self._filtered_metric = REGISTRY.counter('uploader_events_total', "Events per pipeline stage",
+                                                 stage='filtered')
+
+    def dispatch(self, event: FileSystemEvent):
+        accepts = self.path_filter.accepts
+        if event.event_type == EVENT_TYPE_MOVED:
+            src_ok = accepts(event.src_path, event.is_directory)
+            dest_ok = accepts(event.dest_path, event.is_directory)
+            if src_ok and not dest_ok:
+                event = (DirDeletedEvent if event.is_directory else FileDeletedEvent)(event.src_path)
+            elif dest_ok and not src_ok:
+                event = (DirCreatedEvent if event.is_directory else FileCreatedEvent)(event.dest_path)
+            elif not src_ok:
+                self._drop()
+                return
+        elif not accepts(event.src_path, event.is_directory):
+            self._drop()
+            return
+        self.downstream.dispatch(event)
+
+    def _drop(self):
+        self.filtered_events += 1
+        self._filtered_metric.inc()
@@ -0,0 +1,254 @@
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from watchdog.events import (
+    FileSystemEventHandler, FileSystemEvent, FileModifiedEvent, FileDeletedEvent,
+    EVENT_TYPE_MOVED, EVENT_TYPE_DELETED
+)
+from components.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_WORKERS = 4
+_DEFAULT_QUEUE_SIZE = 256  # Per worker
+
+FULL_POLICY_BLOCK = 'block'
+FULL_POLICY_SPILL = 'spill'
+
+
+class _Fence:
+    """
+    Placeholder queued on a second lane so that an event touching two lanes (a move
+    across lanes, or a directory event touching all of them) runs only after every
+    earlier event on those lanes, and before any later one.
+    """
+
+    __slots__ = ('reached', 'done')
+
+    def __init__(self):
+        self.reached = threading.Event()
+        self.done = threading.Event()
+
+
+class DispatchPipeline(FileSystemEventHandler):
+    """
+    Runs the downstream handler on a bounded pool of worker threads.
+
+    Each worker owns a bounded FIFO lane and every path is pinned to one lane by
+    hash, so events for the same file never run concurrently or out of order.
+    When a lane is full the pipeline either blocks the caller (`block`, i.e.
+    backpressure onto the coalescer) or records the affected paths in a spill
+    set (`spill`). Spilled paths are replayed later as synthetic modified/deleted
+    events based on what is on disk at that point, which is safe because the
+    handler re-checks content through FileIndex anyway.
+    """
+
+    def __init__(self, downstream: FileSystemEventHandler,
+                 workers: int = _DEFAULT_WORKERS,
+                 queue_size: int = _DEFAULT_QUEUE_SIZE,
+                 full_policy: str = FULL_POLICY_BLOCK):
+        super().__init__()
+        if full_policy not in (FULL_POLICY_BLOCK, FULL_POLICY_SPILL):
+            raise ValueError(f"Unknown full_policy: {full_policy}")
+        self.downstream = downstream
+        self.full_policy = full_policy
+        self._lanes = [queue.Queue(maxsize=queue_size) for _ in range(max(workers, 1))]
+        self._threads = [
+            threading.Thread(target=self._work, args=(lane,), name=f'DispatchWorker-{i}', daemon=True)
+            for i, lane in enumerate(self._lanes)
+        ]
+        self._submit_lock = threading.Lock()
+        self._spilled: dict[str, None] = {}  # Insertion-ordered set of paths
+        self._closed = False
+        self._stats_lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.spilled = 0
+        self.blocked = 0
+        self.in_flight = 0
+        self._queue_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='queue')
+        self._dispatch_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='dispatch')
+        self._failed_metric = REGISTRY.counter('uploader_events_total', "Events per pipeline stage", stage='failed')
+        REGISTRY.gauge('uploader_pipeline_queue_depth', "Events queued on the dispatch lanes",
+                       fn=lambda: self.queue_depth)
+        REGISTRY.gauge('uploader_pipeline_in_flight', "Events being handled by dispatch workers",
+                       fn=lambda: self.in_flight)
+        REGISTRY.gauge('uploader_pipeline_spill_pending', "Spilled paths waiting to be replayed",
+                       fn=lambda: len(self._spilled))
+        logger.info(f"DispatchPipeline initialized with {len(self._lanes)} workers "
+                    f"(queue_size={queue_size}, full_policy={full_policy})")
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, drain: bool = True):
+        """
+        Stops accepting events and shuts the workers down. With `drain`, spilled
+        paths and everything already queued are processed first; otherwise queued
+        events are discarded.
+        """
+        with self._submit_lock:
+            self._closed = True
+            if drain:
+                self._refill(block=True)
+            else:
+                dropped = len(self._spilled)
+                self._spilled.clear()
+                for lane in self._lanes:
+                    while True:
+                        try:
+                            item = lane.get_nowait()
+                        except queue.Empty:
+                            break
+                        if isinstance(item, _Fence):
+                            item.reached.set()
+                        else:
+                            for fence in item[1]:
+                                fence.done.set()
+                            dropped += 1
+                if dropped:
+                    logger.warning(f"DispatchPipeline discarded {dropped} queued events on shutdown")
+            for lane in self._lanes:
+                lane.put(None)
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+        logger.info(f"DispatchPipeline stopped: {self.stats()}")
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(lane.qsize() for lane in self._lanes)
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'spilled': self.spilled,
+            'blocked': self.blocked,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'spill_pending': len(self._spilled),
+        }
+
+    # -- Submission -----------------------------------------------------------
+
+    def dispatch(self, event: FileSystemEvent):
+        with self._submit_lock:
+            if self._closed:
+                logger.warning(f"DispatchPipeline is stopped; dropping {event.event_type} event for {event.src_path}")
+                return
+            self.submitted += 1
+            paths = self._paths(event)
+            if self._spilled:
+                self._refill()
+            if self.full_policy == FULL_POLICY_SPILL and not event.is_directory:
+                if any(path in self._spilled for path in paths) or not self._has_room(event):
+                    self._spill(paths)
+                    return
+            self._enqueue(event, block=True)
+
+    def _paths(self, event: FileSystemEvent) -> tuple[str, ...]:
+        if event.event_type == EVENT_TYPE_MOVED:
+            return (event.src_path, event.dest_path)
+        return (event.src_path,)
+
+    def _lane_index(self, path: str) -> int:
+        return zlib.crc32(path.encode('utf-8', 'surrogateescape')) % len(self._lanes)
+
+    def _placement(self, event: FileSystemEvent) -> tuple[int, list[int]]:
+        """Returns the lane that runs the event and the other lanes it must be fenced on."""
+        paths = self._paths(event)
+        home = self._lane_index(paths[-1])
+        if event.is_directory and event.event_type in (EVENT_TYPE_MOVED, EVENT_TYPE_DELETED):
+            # Files below the directory may live on any lane.
+            others = [i for i in range(len(self._lanes)) if i != home]
+        else:
+            others = sorted({self._lane_index(path) for path in paths} - {home})
+        return home, others
+
+    def _has_room(self, event: FileSystemEvent) -> bool:
+        home, others = self._placement(event)
+        return all(not self._lanes[i].full() for i in [home, *others])
+
+    def _enqueue(self, event: FileSystemEvent, block: bool):
+        home, others = self._placement(event)
+        fences = []
+        for i in others:
+            fence = _Fence()
+            self._put(self._lanes[i], fence, block)
+            fences.append(fence)
+        self._put(self._lanes[home], (event, fences, time.perf_counter()), block)
+
+    def _put(self, lane: queue.Queue, item, block: bool):
+        if block and lane.full():
+            self.blocked += 1
+        lane.put(item, block=block)
+
+    def _spill(self, paths: tuple[str, ...]):
+        for path in paths:
+            self._spilled[path] = None
+        self.spilled += 1
+
+    def _refill(self, block: bool = False):
+        """Moves spilled paths back onto their lanes, oldest first; caller holds the submit lock."""
+        while self._spilled:
+            path = next(iter(self._spilled))
+            if os.path.exists(path):
+                event = FileModifiedEvent(path, is_synthetic=True)
+            else:
+                event = FileDeletedEvent(path, is_synthetic=True)
+            if not block and not self._has_room(event):
+                return
+            del self._spilled[path]
+            self._enqueue(event, block=block)
+
+    # -- Workers --------------------------------------------------------------
+
+    def _work(self, lane: queue.Queue):
+        while True:
+            item = lane.get()
+            if item is None:
+                return
+            if isinstance(item, _Fence):
+                item.reached.set()
+                item.done.wait()
+                continue
+
+            event, fences, enqueued = item
+            for fence in fences:
+                fence.reached.wait()
+            with self._stats_lock:
+                self.in_flight += 1
+            started = time.perf_counter()
+            self._queue_seconds.observe(started - enqueued)
+            try:
+                self.downstream.dispatch(event)
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += 1
+                self._failed_metric.inc()
+                logger.error(f"Error handling {event.event_type} event for {event.src_path}: {e}")
+            finally:
+                self._dispatch_seconds.observe(time.perf_counter() - started)
+                for fence in fences:
+                    fence.done.set()
+                with self._stats_lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+
+            # Never wait for the submit lock here: its holder may be blocked on this lane.
+            if self._spilled and self._submit_lock.acquire(blocking=False):
+                try:
+                    if not self._closed:
+                        self._refill()
+                finally:
+                    self._submit_lock.release()
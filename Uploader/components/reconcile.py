@@ -0,0 +1,108 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent, FileDeletedEvent
+from components.file_index import FileIndex
+from components.path_filter import PathFilter
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_SCAN_WORKERS = 8
+
+
+def _scan_directory(path: str, path_filter: PathFilter | None = None) -> tuple[dict[str, tuple], list[str]]:
+    """Lists one directory, returning fingerprints of its accepted files and its subdirectories."""
+    files, subdirs = {}, []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if path_filter is None or path_filter.accepts(entry.path, is_directory=True):
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and (path_filter is None or path_filter.accepts(entry.path)):
+                        st = entry.stat()
+                        files[entry.path] = (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+                except OSError:
+                    continue  # Vanished while scanning; the live observer covers it
+    except OSError as e:
+        logger.warning(f"Could not scan directory {path}: {e}")
+    return files, subdirs
+
+
+def scan_tree(root: str, workers: int = _DEFAULT_SCAN_WORKERS,
+              path_filter: PathFilter | None = None) -> dict[str, tuple]:
+    """
+    Walks `root` with os.scandir, listing subdirectories in parallel, and returns
+    {path: (size, mtime_ns, inode, device)} for every regular file found. With a
+    `path_filter`, excluded subtrees are not entered and excluded files not stat'ed.
+    """
+    found = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ReconcileScan') as pool:
+        running = {pool.submit(_scan_directory, root, path_filter)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                found.update(files)
+                running.update(pool.submit(_scan_directory, subdir, path_filter) for subdir in subdirs)
+    return found
+
+
+def reconcile(root: str, index: FileIndex, dispatcher: FileSystemEventHandler,
+              workers: int = _DEFAULT_SCAN_WORKERS, path_filter: PathFilter | None = None) -> dict:
+    """
+    Finds changes made below `root` while the watcher was not running and feeds them
+    to `dispatcher` as synthetic created/modified/deleted events, so they take the
+    same path as live events. Paths rejected by `path_filter` are neither scanned
+    nor reported.
+
+    The tree walk is diffed against all index rows for `root`, loaded with one query.
+    Files whose stat fingerprint differs are reported as modified; the usual content
+    check in FileIndex.should_process still decides whether they are processed.
+    Files whose upload was cut short are reported as created, so it resumes from
+    its checkpoint.
+    """
+    started = time.perf_counter()
+    on_disk = scan_tree(root, workers, path_filter)
+    scanned = time.perf_counter()
+    for path in index.unfinished_uploads(root):
+        index.invalidate(path)
+    indexed = index.load_fingerprints(root)
+    if path_filter is not None:
+        indexed = {path: fingerprint for path, fingerprint in indexed.items() if path_filter.accepts(path)}
+    loaded = time.perf_counter()
+
+    new, changed = [], []
+    for path, fingerprint in on_disk.items():
+        known = indexed.pop(path, None)
+        if known is None:
+            new.append(path)
+        elif known != fingerprint:
+            changed.append(path)
+    vanished = list(indexed)
+    diffed = time.perf_counter()
+
+    for path in new:
+        dispatcher.dispatch(FileCreatedEvent(path, is_synthetic=True))
+    for path in changed:
+        dispatcher.dispatch(FileModifiedEvent(path, is_synthetic=True))
+    for path in vanished:
+        dispatcher.dispatch(FileDeletedEvent(path, is_synthetic=True))
+    finished = time.perf_counter()
+
+    report = {
+        'files_scanned': len(on_disk),
+        'new': len(new),
+        'changed': len(changed),
+        'vanished': len(vanished),
+        'unchanged': len(on_disk) - len(new) - len(changed),
+        'scan_seconds': round(scanned - started, 3),
+        'index_load_seconds': round(loaded - scanned, 3),
+        'diff_seconds': round(diffed - loaded, 3),
+        'dispatch_seconds': round(finished - diffed, 3),
+        'total_seconds': round(finished - started, 3),
+    }
+    logger.info(f"Startup reconciliation of '{root}': {report}")
+    return report
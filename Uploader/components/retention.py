@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from components.file_index import FileIndex
+from components.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_INTERVAL_SECONDS = 300
+_DEFAULT_MAX_AGE_MINUTES = 1440  # 24 hours
+_DEFAULT_BATCH_SIZE = 500
+
+
+class RetentionSweeper:
+    """
+    Periodically removes FileIndex entries of deleted files that have not been
+    processed within `max_age_minutes`, off the event path and in bounded batches.
+    """
+
+    def __init__(self, index: FileIndex,
+                 interval_seconds: float = _DEFAULT_INTERVAL_SECONDS,
+                 max_age_minutes: int = _DEFAULT_MAX_AGE_MINUTES,
+                 batch_size: int = _DEFAULT_BATCH_SIZE):
+        self.index = index
+        self.interval_seconds = interval_seconds
+        self.max_age_minutes = max_age_minutes
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='RetentionSweeper', daemon=True)
+
+        self.sweeps = 0
+        self.rows_swept = 0
+        self.last_rows_swept = 0
+        self.last_duration_seconds = 0.0
+        self.total_duration_seconds = 0.0
+        self._swept_metric = REGISTRY.counter('uploader_retention_swept_rows_total',
+                                              "FileIndex entries removed by the retention sweep")
+        self._sweep_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='retention_sweep')
+        logger.info(f"RetentionSweeper initialized (interval={interval_seconds}s, "
+                    f"max_age={max_age_minutes}min, batch_size={batch_size})")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        logger.info(f"RetentionSweeper stopped: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            'sweeps': self.sweeps,
+            'rows_swept': self.rows_swept,
+            'last_rows_swept': self.last_rows_swept,
+            'last_duration_seconds': round(self.last_duration_seconds, 4),
+            'total_duration_seconds': round(self.total_duration_seconds, 4),
+        }
+
+    def sweep(self) -> int:
+        """Runs one sweep immediately and returns the number of rows removed."""
+        started = time.perf_counter()
+        removed = self.index.sweep_expired(self.max_age_minutes, self.batch_size)
+        duration = time.perf_counter() - started
+
+        self.sweeps += 1
+        self.rows_swept += removed
+        self.last_rows_swept = removed
+        self.last_duration_seconds = duration
+        self.total_duration_seconds += duration
+        self._swept_metric.inc(removed)
+        self._sweep_seconds.observe(duration)
+        if removed:
+            logger.info(f"Retention sweep removed {removed} entries in {duration:.3f}s")
+        else:
+            logger.debug(f"Retention sweep found nothing to remove ({duration:.3f}s)")
+        return removed
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {e}")
@@ -0,0 +1,68 @@
+import logging
+import os
+from watchdog.observers.api import BaseObserver
+from components.coalescer import EventCoalescer
+from components.config import WatchRoot
+from components.handler import MyHandler, UPLOAD_MODE_ROWS
+from components.path_filter import FilteringHandler, PathFilter
+from components.pipeline import DispatchPipeline, FULL_POLICY_BLOCK
+from components.reconcile import reconcile
+from components.retention import RetentionSweeper
+from components.sinks import Sink
+
+logger = logging.getLogger(__name__)
+
+
+class RootWatcher:
+    """
+    Everything that processes one watch root: path filter, coalescer, dispatch
+    pipeline, MyHandler and the root's own FileIndex shard with its retention
+    sweeper. Roots share the observer and the upload sink but nothing that
+    serializes them, so independent trees never wait on each other's SQLite writer.
+    """
+
+    def __init__(self, root: WatchRoot, sink: Sink | None = None, upload_mode: str = UPLOAD_MODE_ROWS,
+                 pipeline_workers: int = 4, pipeline_queue_size: int = 256,
+                 pipeline_full_policy: str = FULL_POLICY_BLOCK,
+                 quiet_seconds: float = 0.5, max_delay_seconds: float = 5.0,
+                 retention_interval_seconds: float = 300, retention_max_age_minutes: int = 1440):
+        self.root = root
+        os.makedirs(os.path.dirname(root.index_path) or '.', exist_ok=True)
+        self.handler = MyHandler(sink=sink, upload_mode=upload_mode, index_path=root.index_path,
+                                 hash_mode=root.hash_mode)
+        self.index = self.handler.index
+        self.sweeper = RetentionSweeper(self.index, interval_seconds=retention_interval_seconds,
+                                        max_age_minutes=retention_max_age_minutes)
+        self.pipeline = None
+        if pipeline_workers > 0:
+            self.pipeline = DispatchPipeline(self.handler, workers=pipeline_workers,
+                                             queue_size=pipeline_queue_size, full_policy=pipeline_full_policy)
+        self.coalescer = EventCoalescer(self.pipeline or self.handler, quiet_seconds=quiet_seconds,
+                                        max_delay_seconds=max_delay_seconds)
+        self.path_filter = PathFilter(root.path, root.include, root.exclude, root.recursive)
+        self.entry = FilteringHandler(self.coalescer, self.path_filter)
+        self._watch = None
+
+    def start(self, observer: BaseObserver):
+        self.sweeper.start()
+        if self.pipeline is not None:
+            self.pipeline.start()
+        self.coalescer.start()
+        self._watch = observer.schedule(self.entry, path=self.root.path, recursive=self.root.recursive)
+        logger.info(f"Watching '{self.root.path}' as root '{self.root.name}' (index: {self.root.index_path})")
+
+    def reconcile(self, workers: int) -> dict:
+        """Catches up on changes made while the watcher was down; call once the observer runs."""
+        return reconcile(self.root.path, self.index, self.entry, workers=workers, path_filter=self.path_filter)
+
+    def stop(self):
+        """Drains the root's pending events into its index; the observer must already be stopped."""
+        self.coalescer.stop()
+        if self.pipeline is not None:
+            logger.info(f"Draining dispatch pipeline of root '{self.root.name}'...")
+            self.pipeline.stop(drain=True)
+        self.sweeper.stop()
+
+    def close(self):
+        """Closes the index shard; call after the shared sink has flushed."""
+        self.index.close()
@@ -0,0 +1,378 @@
+import logging
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from watchdog.events import (
+    FileSystemEvent, FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent, FileDeletedEvent,
+    FileMovedEvent, DirCreatedEvent, DirDeletedEvent
+)
+from watchdog.observers.api import BaseObserver, EventEmitter, EventQueue, ObservedWatch
+from components.metrics import REGISTRY
+from components.path_filter import PathFilter
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_INTERVAL_SECONDS = 2.0
+_DEFAULT_MAX_INTERVAL_SECONDS = 30.0
+_DEFAULT_SCAN_WORKERS = 8
+# Idle passes stretch the interval by this factor, up to the maximum; a pass with changes resets it.
+_BACKOFF_FACTOR = 1.5
+# Scanning takes at most this share of the time, however large the tree.
+_MAX_SCAN_DUTY = 0.25
+# A directory modified this close to its listing may change again within the same mtime
+# tick (2s on SMB/FAT, 1s on ext3 and HFS+), so it is listed again on the next pass.
+_MTIME_GRANULARITY_NS = 2_000_000_000
+# Fields per file in _Directory.stats
+_SIZE, _MTIME, _INODE = range(3)
+_FIELDS = 3
+
+
+class _Directory:
+    """
+    The snapshot of one directory. Files are stored as a tuple of interned names and
+    one array of (size, mtime_ns, inode) per name, instead of a stat result per path:
+    about 24 bytes plus the name per file, and names repeated across directories
+    (`part-0000.csv`, `export.csv`) are stored once.
+    """
+
+    __slots__ = ('mtime_ns', 'listed_ns', 'names', 'stats', 'subdirs')
+
+    def __init__(self, mtime_ns: int, listed_ns: int, names: tuple[str, ...], stats: array,
+                 subdirs: tuple[str, ...]):
+        self.mtime_ns = mtime_ns
+        self.listed_ns = listed_ns
+        self.names = names
+        self.stats = stats
+        self.subdirs = subdirs
+
+    def record(self, i: int) -> array:
+        return self.stats[i * _FIELDS:(i + 1) * _FIELDS]
+
+    def trusted(self, mtime_ns: int) -> bool:
+        """Whether a directory with this mtime still has the entries listed."""
+        return mtime_ns == self.mtime_ns and mtime_ns < self.listed_ns - _MTIME_GRANULARITY_NS
+
+
+class _Visit:
+    """What one pass found in one directory; applied to the snapshot by the scanning thread."""
+
+    __slots__ = ('path', 'directory', 'listed', 'created', 'modified', 'deleted', 'new_subdirs',
+                 'removed_subdirs')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.directory: _Directory | None = None  # None if the directory is gone
+        self.listed = False
+        self.created: list[tuple[str, array]] = []
+        self.modified: list[str] = []
+        self.deleted: list[tuple[str, array]] = []
+        self.new_subdirs: list[str] = []
+        self.removed_subdirs: list[str] = []
+
+
+class ScanEmitter(EventEmitter):
+    """
+    Emits events for one watch by scanning its tree, for file systems without change
+    notifications (NFS and SMB mounts) and trees too large for inotify's watch limit.
+
+    Every pass walks the tree with os.scandir, directories in parallel on `workers`
+    threads, and diffs it against a compact in-memory snapshot (see _Directory).
+    A directory whose mtime has not changed since it was listed has the same
+    entries, so it is not listed again; only its known files are stat'ed, since
+    writes to a file do not touch its directory. Subtrees rejected by `path_filter`
+    are never entered.
+
+    Passes start `interval_seconds` apart. Each pass without changes stretches the
+    interval, up to `max_interval_seconds`, and the interval is never shorter than
+    four times the last pass took. The first pass runs when the observer starts and
+    only records the snapshot; changes from before it are left to startup
+    reconciliation, which runs once the observer has started.
+
+    A file that disappears and reappears elsewhere with the same inode, size and mtime
+    within one pass is reported as moved. Directory moves are reported as a deleted
+    directory (whose index rows MyHandler drops) and a created one with its files.
+    """
+
+    def __init__(self, event_queue: EventQueue, watch: ObservedWatch, timeout: float = _DEFAULT_INTERVAL_SECONDS,
+                 event_filter: list[type[FileSystemEvent]] | None = None,
+                 max_interval_seconds: float = _DEFAULT_MAX_INTERVAL_SECONDS,
+                 workers: int = _DEFAULT_SCAN_WORKERS, path_filter: PathFilter | None = None):
+        super().__init__(event_queue, watch, timeout=timeout, event_filter=event_filter)
+        self.root = os.path.normpath(watch.path)
+        self.min_interval_seconds = timeout
+        self.max_interval_seconds = max(max_interval_seconds, timeout)
+        self.interval_seconds = timeout
+        self.workers = workers
+        self.path_filter = path_filter
+        self._dirs: dict[str, _Directory] = {}
+        self._pool: ThreadPoolExecutor | None = None
+        self.passes = 0
+        self.last_report: dict = {}
+        self._scan_seconds = REGISTRY.histogram('uploader_stage_seconds', "Time spent per pipeline stage",
+                                                stage='scan')
+        self._listed_metric = REGISTRY.counter('uploader_scan_directories_total',
+                                               "Directories visited by scan passes", result='listed')
+        self._skipped_metric = REGISTRY.counter('uploader_scan_directories_total',
+                                                "Directories visited by scan passes", result='unchanged')
+        REGISTRY.gauge('uploader_scan_tracked_files', "Files in the scan snapshots", fn=self.tracked_files)
+
+    def tracked_files(self) -> int:
+        return sum(len(directory.names) for directory in list(self._dirs.values()))
+
+    def snapshot_bytes(self) -> int:
+        """Approximate memory held by the snapshot: directories, name tuples, stat arrays and names."""
+        total = sys.getsizeof(self._dirs)
+        seen = set()
+        for path, directory in list(self._dirs.items()):
+            total += (sys.getsizeof(path) + sys.getsizeof(directory) + sys.getsizeof(directory.names)
+                      + sys.getsizeof(directory.stats) + sys.getsizeof(directory.subdirs))
+            for name in directory.names:
+                if id(name) not in seen:
+                    seen.add(id(name))
+                    total += sys.getsizeof(name)
+        return total
+
+    # -- Emitter thread --------------------------------------------------------
+
+    def on_thread_start(self):
+        report = self.scan(emit=False)
+        files = report['files']
+        per_file = self.snapshot_bytes() / files if files else 0.0
+        logger.info(f"Baseline scan of '{self.root}': {files} files in {report['directories']} directories "
+                    f"in {report['seconds']}s ({report['seconds_per_100k_files']}s per 100k files), "
+                    f"snapshot {per_file:.0f} bytes per file")
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self.close()
+
+    def queue_events(self, timeout: float):
+        # Like watchdog's polling emitter, the timeout is the wait between passes.
+        if self.stopped_event.wait(self.interval_seconds):
+            return
+        report = self.scan(emit=True)
+        if report['events']:
+            self.interval_seconds = self.min_interval_seconds
+        else:
+            self.interval_seconds = min(self.interval_seconds * _BACKOFF_FACTOR, self.max_interval_seconds)
+        self.interval_seconds = max(self.interval_seconds, report['seconds'] / _MAX_SCAN_DUTY)
+        logger.debug(f"Scan of '{self.root}': {report}, next in {self.interval_seconds:.1f}s")
+
+    # -- Passes ----------------------------------------------------------------
+
+    def scan(self, emit: bool = True) -> dict:
+        """Runs one pass, queueing the changes found unless `emit` is False, and returns its report."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='Scan')
+        started = time.perf_counter()
+        try:
+            os.stat(self.root)
+        except OSError as e:
+            # Keep the snapshot: an unreachable mount must not read as every file deleted.
+            logger.warning(f"Could not scan '{self.root}': {e}")
+            self.last_report = {'files': self.tracked_files(), 'directories': len(self._dirs), 'listed': 0,
+                                'events': 0, 'seconds': 0.0, 'seconds_per_100k_files': 0.0}
+            return self.last_report
+
+        created, modified, deleted = [], [], []
+        dirs_created, dirs_deleted = [], []
+        visited = listed = 0
+        running = {self._pool.submit(self._visit, self.root, self._dirs.get(self.root))}
+        while running and not self.stopped_event.is_set():
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                visit = future.result()
+                visited += 1
+                listed += visit.listed
+                if visit.directory is None:
+                    if visit.path != self.root:
+                        dirs_deleted.append(visit.path)
+                    self._forget(visit.path)
+                    continue
+                self._dirs[visit.path] = visit.directory
+                created += visit.created
+                modified += visit.modified
+                deleted += visit.deleted
+                for path in visit.removed_subdirs:
+                    dirs_deleted.append(path)
+                    self._forget(path)
+                dirs_created += visit.new_subdirs
+                subdirs = (os.path.join(visit.path, name) for name in visit.directory.subdirs)
+                running.update(self._pool.submit(self._visit, path, self._dirs.get(path)) for path in subdirs)
+
+        events = 0
+        if emit and not self.stopped_event.is_set():
+            events = self._emit(created, modified, deleted, dirs_created, dirs_deleted)
+        seconds = time.perf_counter() - started
+        self.passes += 1
+        self._scan_seconds.observe(seconds)
+        self._listed_metric.inc(listed)
+        self._skipped_metric.inc(visited - listed)
+        files = self.tracked_files()
+        self.last_report = {
+            'files': files,
+            'directories': visited,
+            'listed': listed,
+            'events': events,
+            'seconds': round(seconds, 3),
+            'seconds_per_100k_files': round(seconds / files * 100_000, 3) if files else 0.0,
+        }
+        return self.last_report
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _forget(self, path: str):
+        """Drops a directory and everything below it from the snapshot."""
+        directory = self._dirs.pop(path, None)
+        if directory is not None:
+            for name in directory.subdirs:
+                self._forget(os.path.join(path, name))
+
+    def _emit(self, created: list, modified: list, deleted: list, dirs_created: list, dirs_deleted: list) -> int:
+        # Pair up files that vanished and appeared with the same inode, size and mtime.
+        vanished = {tuple(record): path for path, record in deleted}
+        appeared = []
+        events = []
+        for path, record in created:
+            src_path = vanished.pop(tuple(record), None)
+            if src_path is None:
+                appeared.append(path)
+            else:
+                events.append(FileMovedEvent(src_path, path))
+        events += [FileDeletedEvent(path) for path in vanished.values()]
+        events += [DirDeletedEvent(path) for path in dirs_deleted]
+        events += [DirCreatedEvent(path) for path in dirs_created]
+        events += [FileCreatedEvent(path) for path in appeared]
+        events += [FileModifiedEvent(path) for path in modified]
+        for event in events:
+            self.queue_event(event)
+        return len(events)
+
+    # -- Directories (scan threads) --------------------------------------------
+
+    def _visit(self, path: str, known: _Directory | None) -> _Visit:
+        visit = _Visit(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return visit
+        except OSError as e:
+            logger.warning(f"Could not scan directory {path}: {e}")
+            visit.directory = known or _Directory(0, 0, (), array('q'), ())
+            return visit
+
+        if known is not None and known.trusted(mtime_ns) and self._stat_known(path, known, visit):
+            visit.directory = known
+            return visit
+        visit.listed = True
+        listed_ns = time.time_ns()
+        try:
+            names, stats, subdirs = self._list(path)
+        except FileNotFoundError:
+            return visit
+        except OSError as e:
+            logger.warning(f"Could not scan directory {path}: {e}")
+            visit.directory = known or _Directory(0, 0, (), array('q'), ())
+            return visit
+        visit.directory = _Directory(mtime_ns, listed_ns, tuple(names), stats, tuple(subdirs))
+        self._diff(path, known, visit)
+        return visit
+
+    def _stat_known(self, path: str, known: _Directory, visit: _Visit) -> bool:
+        """
+        Stats the files of an unchanged directory in place, recording modified ones.
+        Returns False if one has vanished after all, so the directory is listed again.
+        """
+        stats = known.stats
+        for i, name in enumerate(known.names):
+            try:
+                st = os.stat(os.path.join(path, name))
+            except FileNotFoundError:
+                return False
+            except OSError:
+                continue
+            base = i * _FIELDS
+            if (stats[base + _SIZE] != st.st_size or stats[base + _MTIME] != st.st_mtime_ns
+                    or stats[base + _INODE] != st.st_ino):
+                stats[base:base + _FIELDS] = array('q', (st.st_size, st.st_mtime_ns, st.st_ino))
+                visit.modified.append(os.path.join(path, name))
+        return True
+
+    def _list(self, path: str) -> tuple[list[str], array, list[str]]:
+        names, stats, subdirs = [], array('q'), []
+        path_filter = self.path_filter
+        recursive = self.watch.is_recursive
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and (path_filter is None or path_filter.accepts(entry.path, is_directory=True)):
+                            subdirs.append(sys.intern(entry.name))
+                    elif entry.is_file() and (path_filter is None or path_filter.accepts(entry.path)):
+                        st = entry.stat()
+                        names.append(sys.intern(entry.name))
+                        stats.extend((st.st_size, st.st_mtime_ns, st.st_ino))
+                except OSError:
+                    continue  # Vanished while listing; the next pass settles it
+        return names, stats, subdirs
+
+    @staticmethod
+    def _diff(path: str, known: _Directory | None, visit: _Visit):
+        directory = visit.directory
+        if known is None:
+            visit.created = [(os.path.join(path, name), directory.record(i)) for i, name in enumerate(directory.names)]
+            visit.new_subdirs = [os.path.join(path, name) for name in directory.subdirs]
+            return
+        previous = {name: i for i, name in enumerate(known.names)}
+        for i, name in enumerate(directory.names):
+            record = directory.record(i)
+            j = previous.pop(name, None)
+            if j is None:
+                visit.created.append((os.path.join(path, name), record))
+            elif known.record(j) != record:
+                visit.modified.append(os.path.join(path, name))
+        visit.deleted = [(os.path.join(path, name), known.record(j)) for name, j in previous.items()]
+        subdirs = set(directory.subdirs)
+        known_subdirs = set(known.subdirs)
+        visit.new_subdirs = [os.path.join(path, name) for name in directory.subdirs if name not in known_subdirs]
+        visit.removed_subdirs = [os.path.join(path, name) for name in known.subdirs if name not in subdirs]
+
+    def stats(self) -> dict:
+        return {'passes': self.passes, 'interval_seconds': round(self.interval_seconds, 1), **self.last_report}
+
+
+class ScanObserver(BaseObserver):
+    """
+    Observer whose watches are scanned by ScanEmitter instead of relying on file
+    system notifications. Scheduling a handler that filters paths (FilteringHandler)
+    also prunes the scan with its PathFilter.
+    """
+
+    def __init__(self, interval_seconds: float = _DEFAULT_INTERVAL_SECONDS,
+                 max_interval_seconds: float = _DEFAULT_MAX_INTERVAL_SECONDS, workers: int = _DEFAULT_SCAN_WORKERS):
+        super().__init__(self._create_emitter, timeout=interval_seconds)
+        self.max_interval_seconds = max_interval_seconds
+        self.workers = workers
+        self._path_filters: dict[str, PathFilter | None] = {}
+
+    def schedule(self, event_handler: FileSystemEventHandler, path: str, *, recursive: bool = False,
+                 event_filter: list[type[FileSystemEvent]] | None = None) -> ObservedWatch:
+        with self._lock:
+            self._path_filters[path] = getattr(event_handler, 'path_filter', None)
+            return super().schedule(event_handler, path, recursive=recursive, event_filter=event_filter)
+
+    def _create_emitter(self, event_queue: EventQueue, watch: ObservedWatch, timeout: float,
+                        event_filter: list[type[FileSystemEvent]] | None = None) -> ScanEmitter:
+        return ScanEmitter(event_queue, watch, timeout=timeout, event_filter=event_filter,
+                           max_interval_seconds=self.max_interval_seconds, workers=self.workers,
+                           path_filter=self._path_filters.get(watch.path))
+
+    def stats(self) -> dict:
+        return {emitter.watch.path: emitter.stats() for emitter in list(self.emitters)}
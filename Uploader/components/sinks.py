@@ -0,0 +1,488 @@
+import http.client
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+from components.chunked import ResumableUpload, UploadError
+from components.file_index import FileIndex
+from components.ingest import RecordBatch
+from components.manifest import ManifestDelta
+from components.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CONCURRENCY = 4
+_DEFAULT_MAX_BATCH_ROWS = 10000
+_DEFAULT_MAX_BATCH_BYTES = 4 * 1024 * 1024  # 4 MB of source CSV
+_DEFAULT_MAX_BATCH_DELAY_SECONDS = 1.0
+_DEFAULT_MAX_IN_FLIGHT = 16
+_DEFAULT_MAX_RETRIES = 5
+_DEFAULT_BACKOFF_SECONDS = 0.2
+_DEFAULT_MAX_BACKOFF_SECONDS = 10.0
+_DEFAULT_TIMEOUT_SECONDS = 30.0
+_DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Status codes worth retrying; anything else >= 400 is a permanent failure.
+# 422 is the receiver rejecting a chunk whose digest did not survive the transfer.
+_RETRYABLE_STATUS = {408, 422, 429, 500, 502, 503, 504}
+
+
+class Sink:
+    """
+    Destination for ingested data. Record batches come from the CsvIngestor, file
+    blobs from handlers for files that are not ingested as records. Sinks may
+    buffer; `flush` blocks until everything handed over so far has been delivered.
+    Sinks that can resume blob uploads keep their progress in `checkpoints`. A
+    blob given with the `digest` of content already uploaded may be linked to the
+    stored copy instead of being sent again, and one given with the `delta` of
+    its last change (see manifest.py) may be sent as just its changed chunks.
+    A batch's `on_done` is called with True once the receiver has acknowledged
+    it, or with False once the sink has given up on it.
+    """
+
+    def send_batch(self, batch: RecordBatch, on_done: Callable[[bool], None] | None = None):
+        raise NotImplementedError
+
+    def send_blob(self, path: str, checkpoints: FileIndex | None = None, digest: str | None = None,
+                  delta: ManifestDelta | None = None):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def stats(self) -> dict:
+        return {}
+
+
+class NullSink(Sink):
+    """Discards everything; useful to measure the pipeline without a receiver."""
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.blobs = 0
+        self.links = 0
+        self.patches = 0
+
+    def send_batch(self, batch: RecordBatch, on_done: Callable[[bool], None] | None = None):
+        self.batches += 1
+        self.rows += len(batch.rows)
+        if on_done is not None:
+            on_done(True)
+
+    def send_blob(self, path: str, checkpoints: FileIndex | None = None, digest: str | None = None,
+                  delta: ManifestDelta | None = None):
+        if digest is not None:
+            self.links += 1
+        elif delta is not None:
+            self.patches += 1
+        else:
+            self.blobs += 1
+
+    def stats(self) -> dict:
+        return {'batches': self.batches, 'rows': self.rows, 'blobs': self.blobs, 'links': self.links,
+                'patches': self.patches}
+
+
+class _ConnectionPool:
+    """Keep-alive HTTP connections to one host, reused LIFO so warm sockets stay warm."""
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return cls(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class PendingRequest:
+    __slots__ = ('description', 'method', 'path', 'body', 'headers', 'rows', 'on_done')
+
+    def __init__(self, description: str, method: str, path: str, body: bytes, headers: dict, rows: int = 0,
+                 on_done: list[Callable[[bool], None]] | None = None):
+        self.description = description
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers
+        self.rows = rows
+        self.on_done = on_done or []
+
+    def finish(self, delivered: bool):
+        """Reports the outcome to the callbacks of the batches in this request, once."""
+        callbacks, self.on_done = self.on_done, []
+        for callback in callbacks:
+            callback(delivered)
+
+
+class HttpSink(Sink):
+    """
+    Uploads record batches and files to an HTTP receiver (see receiver.py).
+
+    Record batches of the same table and columns are merged into one request
+    until `max_batch_rows` rows or `max_batch_bytes` source bytes are buffered, or
+    the oldest buffered batch is `max_batch_delay_seconds` old. Files are sent as
+    compressed, resumable chunk sequences (see chunked.py), or linked to an
+    identical upload when their digest is given, or patched when their delta is. Requests are sent by
+    `concurrency` workers over a pool of keep-alive connections; at most
+    `max_in_flight` requests may be queued or in progress, after which callers
+    block. Failed requests are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(self, url: str,
+                 concurrency: int = _DEFAULT_CONCURRENCY,
+                 max_batch_rows: int = _DEFAULT_MAX_BATCH_ROWS,
+                 max_batch_bytes: int = _DEFAULT_MAX_BATCH_BYTES,
+                 max_batch_delay_seconds: float = _DEFAULT_MAX_BATCH_DELAY_SECONDS,
+                 max_in_flight: int = _DEFAULT_MAX_IN_FLIGHT,
+                 max_retries: int = _DEFAULT_MAX_RETRIES,
+                 backoff_seconds: float = _DEFAULT_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = _DEFAULT_MAX_BACKOFF_SECONDS,
+                 timeout_seconds: float = _DEFAULT_TIMEOUT_SECONDS,
+                 chunk_bytes: int = _DEFAULT_CHUNK_BYTES,
+                 encoding: str | None = None):
+        self.url = url
+        self.chunk_bytes = chunk_bytes
+        self.encoding = encoding
+        self.max_batch_rows = max_batch_rows
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_delay_seconds = max_batch_delay_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._pool = _ConnectionPool(url, concurrency, timeout_seconds)
+        self._stats_lock = threading.Lock()
+
+        # (table, columns) -> [batches, rows, source bytes, monotonic time of first batch, on_done callbacks]
+        self._buffers: dict[tuple, list] = {}
+        self._buffer_lock = threading.Lock()
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._requests: queue.Queue = queue.Queue()
+        self._outstanding = 0
+        self._idle = threading.Condition()
+        self._closed = threading.Event()
+        self.concurrency = max(concurrency, 1)
+        self.max_in_flight = max_in_flight
+        self._workers = []
+        self._timer = None
+
+        self.requests_sent = 0
+        self.requests_failed = 0
+        self.retries = 0
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.chunks_sent = 0
+        self.chunk_bytes_raw = 0
+        self.chunk_bytes_compressed = 0
+        self.uploads_completed = 0
+        self.uploads_resumed = 0
+        self.uploads_linked = 0
+        self.uploads_patched = 0
+        self.patch_bytes_saved = 0
+        self._request_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='upload_request')
+        self._job_seconds = REGISTRY.histogram(
+            'uploader_stage_seconds', "Time spent per pipeline stage", stage='upload')
+        self._bytes_metric = REGISTRY.counter('uploader_upload_bytes_total', "Request body bytes sent to the receiver")
+        self._failed_metric = REGISTRY.counter('uploader_upload_failures_total', "Uploads given up after retries")
+        # File uploads are logged at debug level only; these count them by outcome.
+        self._uploads_metric = {
+            outcome: REGISTRY.counter('uploader_file_uploads_total', "File uploads by outcome", outcome=outcome)
+            for outcome in ('completed', 'resumed', 'linked', 'patched')
+        }
+        self._patch_saved_metric = REGISTRY.counter('uploader_patch_bytes_saved_total',
+                                                    "File bytes not sent because a patch reused them")
+        REGISTRY.gauge('uploader_sink_in_flight', "Upload requests queued or in progress",
+                       fn=lambda: self._outstanding)
+        self._start_workers()
+        logger.info(f"{type(self).__name__} initialized for {url} "
+                    f"(concurrency={concurrency}, max_in_flight={max_in_flight})")
+
+    def _start_workers(self):
+        self._workers = [
+            threading.Thread(target=self._work, name=f'HttpSink-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._timer = threading.Thread(target=self._run_timer, name='HttpSinkTimer', daemon=True)
+        self._timer.start()
+
+    def stats(self) -> dict:
+        return {
+            'requests_sent': self.requests_sent,
+            'requests_failed': self.requests_failed,
+            'retries': self.retries,
+            'rows_sent': self.rows_sent,
+            'bytes_sent': self.bytes_sent,
+            'chunks_sent': self.chunks_sent,
+            'compression_ratio': round(self.chunk_bytes_raw / self.chunk_bytes_compressed, 2)
+                                 if self.chunk_bytes_compressed else 0.0,
+            'uploads_completed': self.uploads_completed,
+            'uploads_resumed': self.uploads_resumed,
+            'uploads_linked': self.uploads_linked,
+            'uploads_patched': self.uploads_patched,
+            'patch_bytes_saved': self.patch_bytes_saved,
+            'in_flight': self._outstanding,
+        }
+
+    def record_chunk(self, raw_bytes: int, compressed_bytes: int):
+        with self._stats_lock:
+            self.chunks_sent += 1
+            self.chunk_bytes_raw += raw_bytes
+            self.chunk_bytes_compressed += compressed_bytes
+
+    def record_completed(self):
+        with self._stats_lock:
+            self.uploads_completed += 1
+        self._uploads_metric['completed'].inc()
+
+    def record_resumed(self):
+        with self._stats_lock:
+            self.uploads_resumed += 1
+        self._uploads_metric['resumed'].inc()
+
+    def record_linked(self):
+        with self._stats_lock:
+            self.uploads_linked += 1
+        self._uploads_metric['linked'].inc()
+
+    def record_patched(self, unchanged_bytes: int):
+        with self._stats_lock:
+            self.uploads_patched += 1
+            self.patch_bytes_saved += unchanged_bytes
+        self._uploads_metric['patched'].inc()
+        self._patch_saved_metric.inc(unchanged_bytes)
+
+    # -- Producer side --------------------------------------------------------
+
+    def send_batch(self, batch: RecordBatch, on_done: Callable[[bool], None] | None = None):
+        full = self._buffer_batch(batch, on_done)
+        if full is not None:
+            self._submit_records(*full)
+
+    def _buffer_batch(self, batch: RecordBatch,
+                      on_done: Callable[[bool], None] | None) -> tuple[tuple, list] | None:
+        """Buffers `batch`; returns (key, buffer) once its buffer is full and has been taken out."""
+        key = (batch.table, tuple(batch.columns))
+        with self._buffer_lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = [[], 0, 0, time.monotonic(), []]
+            buffer[0].append(batch)
+            buffer[1] += len(batch.rows)
+            buffer[2] += batch.nbytes
+            if on_done is not None:
+                buffer[4].append(on_done)
+            if buffer[1] < self.max_batch_rows and buffer[2] < self.max_batch_bytes:
+                return None
+            del self._buffers[key]
+        return key, buffer
+
+    def send_blob(self, path: str, checkpoints: FileIndex | None = None, digest: str | None = None,
+                  delta: ManifestDelta | None = None):
+        self._submit(ResumableUpload(self, path, checkpoints, self.chunk_bytes, self.encoding, digest, delta))
+
+    def flush(self):
+        """Sends all buffered batches and waits until every request has completed."""
+        with self._buffer_lock:
+            buffers, self._buffers = self._buffers, {}
+        for key, buffer in buffers.items():
+            self._submit_records(key, buffer)
+        with self._idle:
+            self._idle.wait_for(lambda: self._outstanding == 0)
+
+    def close(self):
+        self.flush()
+        self._closed.set()
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._timer.join()
+        self._pool.close()
+        logger.info(f"HttpSink closed: {self.stats()}")
+
+    def _submit_records(self, key: tuple, buffer: list):
+        self._submit(self._records_request(key, buffer))
+
+    def _records_request(self, key: tuple, buffer: list) -> PendingRequest:
+        table, columns = key
+        batches = buffer[0]
+        payload = {
+            'table': table,
+            'columns': list(columns),
+            'segments': [
+                {
+                    'path': batch.path,
+                    'first_row': batch.first_row,
+                    'start_offset': batch.start_offset,
+                    'end_offset': batch.end_offset,
+                    'rows': batch.rows,
+                }
+                for batch in batches
+            ],
+        }
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        rows = sum(len(batch.rows) for batch in batches)
+        return PendingRequest(
+            f"{rows} {table} rows", 'POST', '/batches', body,
+            {'Content-Type': 'application/json', 'Content-Length': str(len(body))}, rows, buffer[4]
+        )
+
+    def _submit(self, request: PendingRequest | ResumableUpload):
+        self._window.acquire()  # Backpressure once max_in_flight requests are outstanding
+        with self._idle:
+            self._outstanding += 1
+        self._requests.put(request)
+
+    def _run_timer(self):
+        interval = max(self.max_batch_delay_seconds / 4, 0.01)
+        while not self._closed.wait(interval):
+            for key, buffer in self._take_expired():
+                self._submit_records(key, buffer)
+
+    def _take_expired(self) -> list[tuple[tuple, list]]:
+        now = time.monotonic()
+        with self._buffer_lock:
+            expired = [key for key, buffer in self._buffers.items()
+                       if now - buffer[3] >= self.max_batch_delay_seconds]
+            return [(key, self._buffers.pop(key)) for key in expired]
+
+    # -- Workers --------------------------------------------------------------
+
+    def _work(self):
+        while True:
+            job = self._requests.get()
+            if job is None:
+                return
+            started = time.perf_counter()
+            try:
+                if isinstance(job, ResumableUpload):
+                    job.run()
+                else:
+                    _, reply = self.call(job.method, job.path, job.body, job.headers)
+                    with self._stats_lock:
+                        self.rows_sent += job.rows
+                    job.finish(True)
+            except (UploadError, OSError, ValueError) as e:
+                self._record_failed(job, e)
+            except Exception as e:
+                # A bug must cost one job, not the worker: flush() waits on the others draining the queue
+                logger.exception(f"Unexpected error uploading {job.description}")
+                self._record_failed(job, e)
+            finally:
+                self._job_seconds.observe(time.perf_counter() - started)
+                self._window.release()
+                with self._idle:
+                    self._outstanding -= 1
+                    self._idle.notify_all()
+
+    def _record_failed(self, job: PendingRequest | ResumableUpload, error: Exception):
+        with self._stats_lock:
+            self.requests_failed += 1
+        self._failed_metric.inc()
+        logger.error(f"Giving up on uploading {job.description}: {error}")
+        if isinstance(job, PendingRequest):
+            job.finish(False)
+        elif job.checkpoints is not None:
+            job.checkpoints.invalidate(job.path)  # Retried on its next change or at the next startup
+
+    def call(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None,
+             accept: tuple[int, ...] = ()) -> tuple[int, dict]:
+        """
+        Sends one request, retrying transient failures with exponential backoff and
+        full jitter. Returns (status, decoded JSON reply); statuses >= 400 other than
+        those in `accept` raise UploadError.
+        """
+        headers = dict(headers or {})
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+        for attempt in range(self.max_retries + 1):
+            try:
+                status, reply = self._send(method, path, body, headers)
+                self._check_status(method, path, status, reply, accept)
+            except UploadError as e:
+                time.sleep(self._retry_delay(method, path, e, attempt))
+                continue
+            self._record_sent(body)
+            return status, reply
+        raise UploadError(f"{method} {path} failed")  # Not reached; max_retries >= 0
+
+    def _check_status(self, method: str, path: str, status: int, reply: dict, accept: tuple[int, ...]):
+        if status >= 400 and status not in accept:
+            raise UploadError(f"HTTP {status} on {method} {path}: {reply.get('error', '')}",
+                              retryable=status in _RETRYABLE_STATUS)
+
+    def _retry_delay(self, method: str, path: str, error: UploadError, attempt: int) -> float:
+        """Re-raises `error` if it is final, otherwise returns the full-jitter backoff before the next attempt."""
+        if not error.retryable or attempt == self.max_retries:
+            raise error
+        delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+        logger.warning(f"{method} {path} failed ({error}); retrying in {delay:.2f}s")
+        with self._stats_lock:
+            self.retries += 1
+        return delay
+
+    def _record_sent(self, body: bytes | None):
+        nbytes = len(body) if body is not None else 0
+        with self._stats_lock:
+            self.requests_sent += 1
+            self.bytes_sent += nbytes
+        self._bytes_metric.inc(nbytes)
+
+    def _send(self, method: str, path: str, body: bytes | None, headers: dict) -> tuple[int, dict]:
+        """Performs one attempt over a pooled connection."""
+        conn = self._pool.acquire()
+        started = time.perf_counter()
+        try:
+            conn.request(method, self._pool.base_path + path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()  # Drain so the connection can be reused
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise UploadError(str(e)) from e
+        finally:
+            self._request_seconds.observe(time.perf_counter() - started)
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._pool.release(conn)
+        try:
+            reply = json.loads(data) if data else {}
+        except ValueError:
+            reply = {}
+        if not isinstance(reply, dict):
+            reply = {}  # Replies are checked field by field; see ResumableUpload
+        return response.status, reply
@@ -1,29 +1,185 @@
+import argparse
+import asyncio
+import os
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from watchdog.observers import Observer
-from components.handler import MyHandler
+from watchdog.observers.api import BaseObserver
+from components.aio import AsyncRootWatcher
+from components.aio_sink import AsyncHttpSink
+from components.handler import UPLOAD_MODE_ROWS
+from components.pipeline import FULL_POLICY_BLOCK
+from components.config import load_config, default_roots
+from components.root_watcher import RootWatcher
+from components.scan_observer import ScanObserver
+from components.sinks import HttpSink
+from components.metrics import REGISTRY, MetricsServer
 from components.logger_config import setup_logging
 
-if __name__ == "__main__":
-    setup_logging()
-    logger = logging.getLogger(__name__)
+# Watch roots with their globs and index shards; without this file only 'demo' is watched.
+CONFIG_PATH = 'uploader.toml'
+
+# Number of dispatch workers; 0 runs MyHandler inline on the coalescer thread.
+PIPELINE_WORKERS = 4
+PIPELINE_QUEUE_SIZE = 256
+PIPELINE_FULL_POLICY = FULL_POLICY_BLOCK
+
+# Index entries not processed within RETENTION_MAX_AGE_MINUTES are swept in the background.
+RETENTION_INTERVAL_SECONDS = 300
+RETENTION_MAX_AGE_MINUTES = 1440
+
+# Receiver for uploads (e.g. `python receiver.py`); None only indexes and ingests locally.
+UPLOAD_URL = None
+UPLOAD_CONCURRENCY = 4
+# UPLOAD_MODE_ROWS streams CSV exports as record batches; 'files' sends every file as compressed resumable chunks.
+UPLOAD_MODE = UPLOAD_MODE_ROWS
+
+# Catch up on changes made while the watcher was down, using this many scan threads (0 disables).
+RECONCILE_WORKERS = 8
+
+# Runs dispatch and uploads as asyncio tasks instead of worker threads; SQLite and hashing
+# use ASYNC_EXECUTOR_THREADS threads, requests are capped at ASYNC_UPLOAD_CONCURRENCY.
+ASYNC_MODE = False
+ASYNC_CONCURRENCY = 64
+ASYNC_EXECUTOR_THREADS = 8
+ASYNC_UPLOAD_CONCURRENCY = 64
 
-    event_handler = MyHandler()
-    observer = Observer()
-    observer.schedule(event_handler, path='demo', recursive=True)
+# 'native' watches with the platform's notifications (inotify, FSEvents, ...). 'scan' polls
+# the trees with parallel os.scandir passes instead: for NFS/SMB mounts, which send no
+# notifications, and for trees beyond inotify's max_user_watches. Scan passes start
+# SCAN_INTERVAL_SECONDS apart and back off to SCAN_MAX_INTERVAL_SECONDS while nothing changes.
+OBSERVER_NATIVE = 'native'
+OBSERVER_SCAN = 'scan'
+OBSERVER_BACKEND = OBSERVER_NATIVE
+SCAN_INTERVAL_SECONDS = 2.0
+SCAN_MAX_INTERVAL_SECONDS = 30.0
+SCAN_WORKERS = 8
 
-    logger.info("Starting file system observer for directory 'demo'...")
+# Prometheus text endpoint at http://127.0.0.1:METRICS_PORT/metrics (None disables; a taken port only logs a warning).
+METRICS_PORT = 9108
+
+
+def create_observer(backend: str = OBSERVER_BACKEND) -> BaseObserver:
+    if backend == OBSERVER_SCAN:
+        return ScanObserver(interval_seconds=SCAN_INTERVAL_SECONDS, max_interval_seconds=SCAN_MAX_INTERVAL_SECONDS,
+                            workers=SCAN_WORKERS)
+    return Observer()
+
+
+def run(roots: list, logger: logging.Logger, backend: str = OBSERVER_BACKEND):
+    sink = HttpSink(UPLOAD_URL, concurrency=UPLOAD_CONCURRENCY) if UPLOAD_URL else None
+    watchers = [
+        RootWatcher(root, sink=sink, upload_mode=UPLOAD_MODE,
+                    pipeline_workers=PIPELINE_WORKERS, pipeline_queue_size=PIPELINE_QUEUE_SIZE,
+                    pipeline_full_policy=PIPELINE_FULL_POLICY,
+                    retention_interval_seconds=RETENTION_INTERVAL_SECONDS,
+                    retention_max_age_minutes=RETENTION_MAX_AGE_MINUTES)
+        for root in roots
+    ]
+    observer = create_observer(backend)
+    for watcher in watchers:
+        watcher.start(observer)
+
+    logger.info(f"Starting {backend} file system observer for {len(watchers)} roots...")
     observer.start()
 
     try:
+        if RECONCILE_WORKERS > 0:
+            # The observer is already running, so nothing falls between the scan and live events.
+            for watcher in watchers:
+                watcher.reconcile(RECONCILE_WORKERS)
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         logger.info("KeyboardInterrupt received. Stopping observer...")
-        observer.stop()
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
     finally:
+        observer.stop()
         logger.info("Observer joining...")
         observer.join()
-        logger.info("Observer stopped gracefully.")
\ No newline at end of file
+        if isinstance(observer, ScanObserver):
+            logger.info(f"Scan observer stopped: {observer.stats()}")
+        for watcher in watchers:
+            watcher.stop()
+        if sink is not None:
+            logger.info("Flushing uploads...")
+            sink.close()
+        for watcher in watchers:
+            watcher.close()
+
+
+async def run_async(roots: list, logger: logging.Logger, backend: str = OBSERVER_BACKEND):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=ASYNC_EXECUTOR_THREADS, thread_name_prefix='uploader-io')
+    loop.set_default_executor(executor)
+    sink = AsyncHttpSink(UPLOAD_URL, concurrency=ASYNC_UPLOAD_CONCURRENCY) if UPLOAD_URL else None
+    if sink is not None:
+        sink.start()
+    watchers = [
+        AsyncRootWatcher(root, sink=sink, upload_mode=UPLOAD_MODE, concurrency=ASYNC_CONCURRENCY,
+                         executor=executor, retention_interval_seconds=RETENTION_INTERVAL_SECONDS,
+                         retention_max_age_minutes=RETENTION_MAX_AGE_MINUTES)
+        for root in roots
+    ]
+    observer = create_observer(backend)
+    for watcher in watchers:
+        watcher.start(observer)
+
+    logger.info(f"Starting {backend} file system observer for {len(watchers)} roots (asyncio)...")
+    # The scan backend takes its baseline snapshot while starting; keep the loop free meanwhile.
+    await loop.run_in_executor(None, observer.start)
+    try:
+        if RECONCILE_WORKERS > 0:
+            await asyncio.gather(*(watcher.reconcile(RECONCILE_WORKERS) for watcher in watchers))
+        await asyncio.Event().wait()
+    finally:
+        observer.stop()
+        logger.info("Observer joining...")
+        await loop.run_in_executor(None, observer.join)
+        if isinstance(observer, ScanObserver):
+            logger.info(f"Scan observer stopped: {observer.stats()}")
+        for watcher in watchers:
+            await watcher.stop()
+        if sink is not None:
+            logger.info("Flushing uploads...")
+            await sink.aclose()
+        for watcher in watchers:
+            watcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watches directory trees and uploads changed files.")
+    parser.add_argument('--config', default=CONFIG_PATH, help="TOML file declaring the watch roots")
+    parser.add_argument('--observer', choices=[OBSERVER_NATIVE, OBSERVER_SCAN], default=OBSERVER_BACKEND,
+                        help=f"How changes are detected (default: {OBSERVER_BACKEND})")
+    args = parser.parse_args()
+
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    roots = load_config(args.config) if os.path.exists(args.config) else default_roots()
+
+    metrics_server = None
+    if METRICS_PORT is not None:
+        try:
+            metrics_server = MetricsServer(REGISTRY, port=METRICS_PORT)
+            metrics_server.start()
+        except OSError as e:
+            # Metrics are optional; a taken port must not keep files from being uploaded
+            logger.warning(f"Could not serve metrics on port {METRICS_PORT} ({e}); continuing without them")
+    try:
+        if ASYNC_MODE:
+            try:
+                asyncio.run(run_async(roots, logger, args.observer))
+            except KeyboardInterrupt:
+                logger.info("KeyboardInterrupt received. Observer stopped.")
+            except Exception as e:
+                logger.error(f"An unexpected error occurred: {e}")
+        else:
+            run(roots, logger, args.observer)
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.info(f"Metrics: {REGISTRY.snapshot()}")
+        logger.info("Observer stopped gracefully.")
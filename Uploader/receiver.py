@@ -0,0 +1,329 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from components.chunked import EMPTY_CHAIN, ENCODING_IDENTITY, decompress, extend_chain
+from components.hashing import chained_hash
+from components.logger_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiverStore:
+    """
+    Persists received record batches in SQLite and uploaded files below `blob_dir`.
+    Upload sessions are kept in SQLite too, so interrupted uploads can resume
+    across receiver restarts. Every stored file is recorded with its content
+    digest, so identical content can be linked to a new path without re-sending it,
+    and a changed file can be patched from its stored copy.
+    """
+
+    def __init__(self, db_path: str, blob_dir: str):
+        self.blob_dir = blob_dir
+        self.parts_dir = os.path.join(blob_dir, '.uploads')
+        os.makedirs(self.parts_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS received_rows (
+                    table_name TEXT,
+                    source_path TEXT,
+                    row_number INTEGER,
+                    data TEXT
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS uploads (
+                    upload_id TEXT PRIMARY KEY,
+                    source_path TEXT,
+                    byte_offset INTEGER NOT NULL DEFAULT 0,
+                    chain TEXT NOT NULL,
+                    complete INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS stored_blobs (
+                    source_path TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_stored_blobs_digest ON stored_blobs (digest)')
+        self._lock = threading.RLock()
+        self.requests = 0
+        self.rows = 0
+        self.blobs = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.links = 0
+        self.patches = 0
+
+    def store_batches(self, payload: dict) -> int:
+        table = payload['table']
+        columns = payload['columns']
+        records = [
+            (table, segment['path'], segment['first_row'] + i, json.dumps(dict(zip(columns, row))))
+            for segment in payload['segments']
+            for i, row in enumerate(segment['rows'])
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany('INSERT INTO received_rows VALUES (?, ?, ?, ?)', records)
+            self.requests += 1
+            self.rows += len(records)
+        return len(records)
+
+    def blob_path(self, source_path: str) -> str:
+        """
+        Where a source file is stored: its path below the blob directory, keeping the
+        source layout. Raises ValueError for paths that resolve outside of it.
+        """
+        root = os.path.realpath(self.blob_dir)
+        relative = os.path.splitdrive(source_path)[1].lstrip('/\\')
+        target = os.path.realpath(os.path.join(root, relative))
+        if target == root or os.path.commonpath([root, target]) != root:
+            raise ValueError(f"path escapes the blob directory: {source_path!r}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        return target
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.parts_dir, f'{upload_id}.part')
+
+    def create_upload(self, source_path: str) -> str:
+        self.blob_path(source_path)  # Reject paths outside the blob directory before accepting chunks
+        upload_id = uuid.uuid4().hex
+        open(self._part_path(upload_id), 'wb').close()
+        with self._lock, self.conn:
+            self.conn.execute('INSERT INTO uploads (upload_id, source_path, chain) VALUES (?, ?, ?)',
+                              (upload_id, source_path, EMPTY_CHAIN))
+        return upload_id
+
+    def get_upload(self, upload_id: str) -> dict | None:
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT source_path, byte_offset, chain, complete FROM uploads WHERE upload_id = ?',
+                (upload_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'path': row[0], 'offset': row[1], 'chain': row[2], 'complete': bool(row[3])}
+
+    def append_chunk(self, upload_id: str, offset: int, data: bytes, chunk_digest: str) -> tuple[int, dict]:
+        """Writes a verified chunk at `offset`. Returns the HTTP status and reply."""
+        with self._lock:
+            upload = self.get_upload(upload_id)
+            if upload is None:
+                return 404, {'error': 'unknown upload'}
+            if upload['complete'] or offset != upload['offset']:
+                return 409, {'error': 'unexpected offset', 'offset': upload['offset']}
+            if hashlib.sha256(data).hexdigest() != chunk_digest:
+                return 422, {'error': 'chunk digest mismatch'}
+            with open(self._part_path(upload_id), 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+                f.truncate()
+            chain = extend_chain(upload['chain'], chunk_digest)
+            with self.conn:
+                self.conn.execute('UPDATE uploads SET byte_offset = ?, chain = ? WHERE upload_id = ?',
+                                  (offset + len(data), chain, upload_id))
+            self.chunks += 1
+            self.bytes += len(data)
+        return 200, {'offset': offset + len(data), 'chain': chain}
+
+    def complete_upload(self, upload_id: str, size: int, chain: str) -> tuple[int, dict]:
+        """Moves a fully received upload into place once its size and digest chain agree."""
+        with self._lock:
+            upload = self.get_upload(upload_id)
+            if upload is None:
+                return 404, {'error': 'unknown upload'}
+            if upload['complete']:
+                return 200, {'path': upload['path']}
+            if size != upload['offset'] or chain != upload['chain']:
+                return 409, {'error': 'size or digest mismatch', 'offset': upload['offset']}
+            digest = chained_hash(self._part_path(upload_id))[0]
+            os.replace(self._part_path(upload_id), self.blob_path(upload['path']))
+            with self.conn:
+                self.conn.execute('UPDATE uploads SET complete = 1 WHERE upload_id = ?', (upload_id,))
+                self.conn.execute('INSERT OR REPLACE INTO stored_blobs (source_path, digest) VALUES (?, ?)',
+                                  (upload['path'], digest))
+            self.blobs += 1
+        return 200, {'path': upload['path'], 'digest': digest}
+
+    def link_blob(self, digest: str, source_path: str) -> tuple[int, dict]:
+        """Stores a copy of already received content with `digest` under `source_path` (a hard link if possible)."""
+        with self._lock:
+            stored = self.conn.execute(
+                'SELECT source_path FROM stored_blobs WHERE digest = ?', (digest,)
+            ).fetchall()
+            existing = next((self.blob_path(path) for path, in stored if os.path.exists(self.blob_path(path))), None)
+            if existing is None:
+                return 404, {'error': 'unknown content'}
+            target = self.blob_path(source_path)
+            if not os.path.exists(target) or not os.path.samefile(existing, target):
+                linked = os.path.join(self.parts_dir, f'{uuid.uuid4().hex}.link')
+                try:
+                    os.link(existing, linked)
+                except OSError:
+                    shutil.copyfile(existing, linked)
+                os.replace(linked, target)
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO stored_blobs (source_path, digest) VALUES (?, ?)',
+                                  (source_path, digest))
+            self.links += 1
+        return 200, {'path': source_path}
+
+    def apply_patch(self, data: bytes) -> tuple[int, dict]:
+        """
+        Rebuilds a stored file from a patch (see chunked.ResumableUpload): runs of
+        its current bytes and new bytes, in order. The result replaces the file only
+        if it has the digest the patch announces.
+        """
+        line, _, literals = data.partition(b'\n')
+        patch = json.loads(line)
+        source_path, digest = patch['path'], patch['digest']
+        with self._lock:
+            base_path = self.blob_path(source_path)
+            if not os.path.exists(base_path):
+                return 404, {'error': 'no stored copy to patch'}
+            target = os.path.join(self.parts_dir, f'{uuid.uuid4().hex}.patch')
+            position = 0
+            with open(base_path, 'rb') as base, open(target, 'wb') as out:
+                base_size = os.fstat(base.fileno()).st_size
+                for length, base_offset in patch['operations']:
+                    if base_offset is None:
+                        chunk = literals[position:position + length]
+                        position += length
+                    elif base_offset + length <= base_size:
+                        base.seek(base_offset)
+                        chunk = base.read(length)
+                    else:
+                        chunk = b''
+                    if len(chunk) != length:
+                        break
+                    out.write(chunk)
+            result = chained_hash(target)
+            if position != len(literals) or result is None or result[0] != digest:
+                os.remove(target)
+                return 409, {'error': 'patched content does not match its digest'}
+            os.replace(target, base_path)
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO stored_blobs (source_path, digest) VALUES (?, ?)',
+                                  (source_path, digest))
+            self.patches += 1
+            self.bytes += len(literals)
+        return 200, {'path': source_path, 'digest': digest}
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'rows': self.rows, 'blobs': self.blobs,
+                'chunks': self.chunks, 'bytes': self.bytes, 'links': self.links,
+                'patches': self.patches}
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+    store: ReceiverStore = None
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _route(self) -> tuple[list[str], dict]:
+        url = urlsplit(self.path)
+        return url.path.strip('/').split('/'), parse_qs(url.query)
+
+    def do_GET(self):
+        parts, _ = self._route()
+        if parts == ['stats']:
+            self._reply(200, self.store.stats())
+        elif len(parts) == 2 and parts[0] == 'uploads':
+            upload = self.store.get_upload(parts[1])
+            if upload is None:
+                self._reply(404, {'error': 'unknown upload'})
+            else:
+                self._reply(200, upload)
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        parts, _ = self._route()
+        body = self._read_body()
+        try:
+            if parts == ['batches']:
+                self._reply(200, {'rows': self.store.store_batches(json.loads(body))})
+            elif parts == ['uploads']:
+                upload_id = self.store.create_upload(json.loads(body)['path'])
+                self._reply(201, {'upload_id': upload_id, 'offset': 0})
+            elif len(parts) == 3 and parts[0] == 'uploads' and parts[2] == 'complete':
+                payload = json.loads(body)
+                self._reply(*self.store.complete_upload(parts[1], payload['size'], payload['chain']))
+            elif len(parts) == 3 and parts[0] == 'blobs' and parts[2] == 'links':
+                self._reply(*self.store.link_blob(parts[1], json.loads(body)['path']))
+            elif parts == ['patches']:
+                data = decompress(body, self.headers.get('Content-Encoding', ENCODING_IDENTITY))
+                self._reply(*self.store.apply_patch(data))
+            else:
+                self._reply(404, {'error': 'not found'})
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': f'malformed request: {e}'})
+
+    def do_PUT(self):
+        parts, query = self._route()
+        body = self._read_body()
+        if len(parts) != 2 or parts[0] != 'uploads':
+            self._reply(404, {'error': 'not found'})
+            return
+        try:
+            offset = int(query['offset'][0])
+            data = decompress(body, self.headers.get('Content-Encoding', ENCODING_IDENTITY))
+        except (KeyError, ValueError, OSError) as e:
+            self._reply(400, {'error': f'malformed chunk: {e}'})
+            return
+        self._reply(*self.store.append_chunk(parts[1], offset, data, self.headers.get('X-Chunk-Digest', '')))
+
+
+class _ReceiverServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The asyncio sink opens dozens of connections at once
+
+
+def serve(host: str, port: int, db_path: str, blob_dir: str) -> ThreadingHTTPServer:
+    """Creates a receiver server; call serve_forever() on it (tests can run it in a thread)."""
+    handler = type('BoundReceiverHandler', (ReceiverHandler,), {'store': ReceiverStore(db_path, blob_dir)})
+    return _ReceiverServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the upload endpoint.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default='received.db', help="SQLite file receiving record batches")
+    parser.add_argument('--blob-dir', default='received', help="Directory receiving uploaded files")
+    args = parser.parse_args()
+
+    setup_logging()
+    server = serve(args.host, args.port, args.db, args.blob_dir)
+    logger.info(f"Receiver listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt received. Stopping receiver...")
+    finally:
+        server.server_close()
+        logger.info(f"Receiver stopped: {server.RequestHandlerClass.store.stats()}")
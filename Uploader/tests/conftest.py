@@ -0,0 +1,14 @@
+import threading
+import pytest
+import receiver
+
+
+@pytest.fixture
+def receiver_server(tmp_path):
+    """A receiver on an ephemeral port, serving from a thread; yields (url, store)."""
+    server = receiver.serve('127.0.0.1', 0, str(tmp_path / 'received.db'), str(tmp_path / 'received'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', server.RequestHandlerClass.store
+    server.shutdown()
+    server.server_close()
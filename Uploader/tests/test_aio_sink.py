@@ -0,0 +1,30 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from components.aio_sink import AsyncHttpSink
+
+
+def test_blocked_admission_does_not_starve_uploads(tmp_path, receiver_server):
+    # More pending uploads than executor threads plus in-flight slots: every executor
+    # thread ends up blocked in admission while the admitted uploads still finish.
+    url, _ = receiver_server
+    paths = []
+    for i in range(20):
+        path = tmp_path / f'export-{i:02d}.csv'
+        path.write_bytes(b'id,value\n' + b''.join(b'%d,%d\n' % (i, j) for j in range(100)))
+        paths.append(str(path))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=2)
+        loop.set_default_executor(executor)
+        sink = AsyncHttpSink(url, concurrency=2, max_in_flight=4)
+        sink.start()
+        sends = [loop.run_in_executor(None, sink.send_blob, path) for path in paths]
+        await asyncio.wait_for(asyncio.gather(*sends), timeout=30)
+        await asyncio.wait_for(sink.aclose(), timeout=30)
+        executor.shutdown()
+        return sink.stats()
+
+    stats = asyncio.run(run())
+    assert stats['uploads_completed'] == len(paths)
+    assert stats['requests_failed'] == 0
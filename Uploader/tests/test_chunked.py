@@ -0,0 +1,30 @@
+from components.chunked import ResumableUpload
+from components.sinks import HttpSink
+
+
+def test_lost_chunk_reply_resynchronizes(tmp_path, receiver_server):
+    url, store = receiver_server
+    sink = HttpSink(url, concurrency=1)
+    path = str(tmp_path / 'data.bin')
+    content = bytes(range(256)) * 4
+    with open(path, 'wb') as f:
+        f.write(content)
+    try:
+        steps = ResumableUpload(sink, path, None, chunk_bytes=100).steps()
+        request = next(steps)
+        puts = 0
+        while True:
+            if request[0] == 'PUT':
+                puts += 1
+                if puts == 2:
+                    sink.call(*request)  # Stored by the receiver, but the reply is lost
+            try:
+                request = steps.send(sink.call(*request))
+            except StopIteration:
+                break
+
+        with open(store.blob_path(path), 'rb') as f:
+            assert f.read() == content
+        assert sink.stats()['uploads_completed'] == 1
+    finally:
+        sink.close()
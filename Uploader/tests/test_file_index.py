@@ -0,0 +1,61 @@
+import os
+
+from components.file_index import FileIndex
+from components.hashing import HASH_BLOCK_BYTES
+
+
+def test_sweep_expired_drops_offsets_and_checkpoints(tmp_path):
+    index = FileIndex(str(tmp_path / 'index.db'))
+    stale, idle, fresh = (str(tmp_path / name) for name in ('stale.csv', 'idle.csv', 'fresh.csv'))
+    try:
+        for path in (stale, idle, fresh):
+            with open(path, 'w') as f:
+                f.write('id\n1\n')
+            assert index.should_process(path)
+            index.set_ingest_offset(path, 5, 1, 'id', 1)
+            index.set_upload_checkpoint(path, 'upload', 5, 5, 'a' * 64, 'b' * 64, 1)
+        index.flush()
+        with index.conn:
+            index.conn.executemany("UPDATE file_events SET last_processed_timestamp = datetime('now', '-2 days') "
+                                   "WHERE path = ?", [(stale,), (idle,)])
+        os.remove(stale)
+
+        assert index.sweep_expired(max_age_minutes=60) == 1
+        assert index.get_ingest_offset(stale) is None
+        assert index.get_upload_checkpoint(stale) is None
+        assert index.get_ingest_offset(fresh) is not None
+        assert index.get_upload_checkpoint(fresh) is not None
+        # An old but unchanged file keeps its progress and is not swept again
+        assert index.get_ingest_offset(idle) is not None
+        assert index.get_upload_checkpoint(idle) is not None
+        assert index.sweep_expired(max_age_minutes=60) == 0
+        assert not index.should_process(idle)
+        # The swept path is new to the index again once it reappears
+        with open(stale, 'w') as f:
+            f.write('id\n1\n')
+        assert index.should_process(stale)
+    finally:
+        index.close()
+
+
+def test_same_size_middle_edit_is_detected(tmp_path):
+    index = FileIndex(str(tmp_path / 'index.db'))
+    path = str(tmp_path / 'big.csv')
+    data = bytearray(b'x' * (3 * HASH_BLOCK_BYTES + 100))
+    try:
+        with open(path, 'wb') as f:
+            f.write(data)
+        assert index.should_process(path)
+
+        data[HASH_BLOCK_BYTES + 10] = ord('y')
+        with open(path, 'r+b') as f:
+            f.write(data)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert index.should_process(path)
+
+        with open(path, 'ab') as f:
+            f.write(b'more')
+        assert index.should_process(path)
+    finally:
+        index.close()
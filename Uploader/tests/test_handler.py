@@ -0,0 +1,30 @@
+import os
+from watchdog.events import FileCreatedEvent, FileMovedEvent
+from components.handler import MyHandler, UPLOAD_MODE_FILES
+from components.sinks import HttpSink
+
+
+def test_rename_reaches_receiver_without_resending(tmp_path, receiver_server):
+    url, store = receiver_server
+    sink = HttpSink(url, concurrency=1)
+    handler = MyHandler(sink=sink, upload_mode=UPLOAD_MODE_FILES, index_path=str(tmp_path / 'index.db'))
+    watched = tmp_path / 'watched'
+    watched.mkdir()
+    src, dest = str(watched / 'x.csv'), str(watched / 'z.csv')
+    with open(src, 'wb') as f:
+        f.write(b'id,value\n1,2\n3,4\n')
+    try:
+        handler.on_any_event(FileCreatedEvent(src))
+        sink.flush()
+        os.rename(src, dest)
+        handler.on_any_event(FileMovedEvent(src, dest))
+        sink.flush()
+
+        with open(store.blob_path(dest), 'rb') as f:
+            assert f.read() == b'id,value\n1,2\n3,4\n'
+        stats = sink.stats()
+        assert stats['uploads_completed'] == 1
+        assert stats['uploads_linked'] == 1
+    finally:
+        sink.close()
+        handler.index.close()
@@ -0,0 +1,51 @@
+import socket
+from components.file_index import FileIndex
+from components.ingest import CsvIngestor
+from components.sinks import HttpSink
+
+
+def _write_sales(path, rows):
+    with open(path, 'w') as f:
+        f.write('id,value\n')
+        for i in range(rows):
+            f.write(f'{i},{i * 2}\n')
+
+
+def test_offset_waits_for_acknowledgement(tmp_path):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        dead_url = f'http://127.0.0.1:{s.getsockname()[1]}'
+    index = FileIndex(str(tmp_path / 'index.db'))
+    sink = HttpSink(dead_url, concurrency=1, max_retries=0, max_batch_rows=1)
+    path = str(tmp_path / 'sales.csv')
+    _write_sales(path, 3)
+    try:
+        CsvIngestor(index, consumer=sink.send_batch, batch_rows=1).ingest(path)
+        sink.flush()
+        assert sink.stats()['requests_failed'] == 3
+        assert index.get_ingest_offset(path)[1] == 0
+
+        delivered = []
+        CsvIngestor(index, consumer=lambda batch, on_done: (delivered.extend(batch.rows), on_done(True))).ingest(path)
+        assert delivered == [['0', '0'], ['1', '2'], ['2', '4']]
+        assert index.get_ingest_offset(path)[1] == 3
+    finally:
+        sink.close()
+        index.close()
+
+
+def test_offset_follows_acknowledged_batches(tmp_path, receiver_server):
+    url, _ = receiver_server
+    index = FileIndex(str(tmp_path / 'index.db'))
+    sink = HttpSink(url, concurrency=2, max_batch_rows=1)
+    path = str(tmp_path / 'sales.csv')
+    _write_sales(path, 4)
+    try:
+        ingestor = CsvIngestor(index, consumer=sink.send_batch, batch_rows=1)
+        ingestor.ingest(path)
+        sink.flush()
+        assert index.get_ingest_offset(path)[1] == 4
+        assert sink.stats()['rows_sent'] == 4
+    finally:
+        sink.close()
+        index.close()
@@ -0,0 +1,29 @@
+import http.client
+import json
+import os
+from urllib.parse import urlsplit
+import pytest
+from receiver import ReceiverStore
+
+
+def test_blob_path_keeps_dotted_names(tmp_path):
+    store = ReceiverStore(str(tmp_path / 'received.db'), str(tmp_path / 'received'))
+    target = store.blob_path('/exports/report..v2.csv')
+    assert target == os.path.join(os.path.realpath(tmp_path / 'received'), 'exports', 'report..v2.csv')
+
+
+@pytest.mark.parametrize('source_path', ['../outside.csv', '/exports/../../outside.csv', '/'])
+def test_blob_path_rejects_escapes(tmp_path, source_path):
+    store = ReceiverStore(str(tmp_path / 'received.db'), str(tmp_path / 'received'))
+    with pytest.raises(ValueError):
+        store.blob_path(source_path)
+
+
+def test_upload_outside_blob_dir_is_rejected(tmp_path, receiver_server):
+    url, _ = receiver_server
+    conn = http.client.HTTPConnection(urlsplit(url).netloc)
+    conn.request('POST', '/uploads', body=json.dumps({'path': '../../outside.csv'}))
+    response = conn.getresponse()
+    assert response.status == 400
+    assert not (tmp_path / 'outside.csv').exists()
+    conn.close()
@@ -0,0 +1,75 @@
+import socket
+from watchdog.events import FileCreatedEvent, FileSystemEventHandler
+from components.chunked import ResumableUpload
+from components.handler import MyHandler, UPLOAD_MODE_FILES
+from components.reconcile import reconcile
+from components.sinks import HttpSink
+
+
+class _Recorder(FileSystemEventHandler):
+    def __init__(self):
+        self.events = []
+
+    def dispatch(self, event):
+        self.events.append((event.event_type, event.src_path))
+
+
+def _dead_url() -> str:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{s.getsockname()[1]}'
+
+
+def test_interrupted_upload_is_resumed_at_startup(tmp_path, receiver_server):
+    url, store = receiver_server
+    watched = tmp_path / 'watched'
+    watched.mkdir()
+    path = str(watched / 'data.bin')
+    content = b'chunk' * 100
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    # The first run dies after its first chunk was acknowledged and checkpointed
+    sink = HttpSink(url, concurrency=1, chunk_bytes=100)
+    handler = MyHandler(sink=sink, upload_mode=UPLOAD_MODE_FILES, index_path=str(tmp_path / 'index.db'))
+    try:
+        assert handler.index.should_process(path)
+        steps = ResumableUpload(sink, path, handler.index, chunk_bytes=100).steps()
+        request = next(steps)
+        while request[0] != 'PUT' or handler.index.get_upload_checkpoint(path) is None:
+            request = steps.send(sink.call(*request))
+        steps.close()
+
+        recorder = _Recorder()
+        reconcile(str(watched), handler.index, recorder)
+        assert recorder.events == [('created', path)]
+
+        handler.on_any_event(FileCreatedEvent(path))
+        sink.flush()
+        with open(store.blob_path(path), 'rb') as f:
+            assert f.read() == content
+        assert sink.stats()['uploads_resumed'] == 1
+    finally:
+        sink.close()
+        handler.index.close()
+
+
+def test_failed_upload_is_retried(tmp_path):
+    watched = tmp_path / 'watched'
+    watched.mkdir()
+    path = str(watched / 'data.bin')
+    with open(path, 'wb') as f:
+        f.write(b'payload')
+    sink = HttpSink(_dead_url(), concurrency=1, max_retries=0)
+    handler = MyHandler(sink=sink, upload_mode=UPLOAD_MODE_FILES, index_path=str(tmp_path / 'index.db'))
+    try:
+        handler.on_any_event(FileCreatedEvent(path))
+        sink.flush()
+        assert sink.stats()['requests_failed'] == 1
+
+        recorder = _Recorder()
+        reconcile(str(watched), handler.index, recorder)
+        assert recorder.events == [('created', path)]
+    finally:
+        sink.close()
+        handler.index.close()
@@ -0,0 +1,53 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from components.sinks import HttpSink
+
+
+class _MalformedReceiver(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    replies = [b'{"unexpected": 1}', b'[1, 2]', b'{"upload_id": 7}']
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = self.replies[self.server.requests % len(self.replies)]
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def malformed_receiver():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _MalformedReceiver)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_malformed_replies_fail_uploads_not_workers(tmp_path, malformed_receiver):
+    # One worker: if a bad reply killed it, nothing would drain the queue and flush() would hang.
+    sink = HttpSink(malformed_receiver, concurrency=1, max_retries=0)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f'blob-{i}.bin'
+        path.write_bytes(b'payload %d' % i)
+        paths.append(str(path))
+    for path in paths:
+        sink.send_blob(path)
+
+    flushed = threading.Thread(target=sink.flush, daemon=True)
+    flushed.start()
+    flushed.join(timeout=10)
+    assert not flushed.is_alive()
+    stats = sink.stats()
+    assert stats['requests_failed'] == len(paths)
+    assert stats['uploads_completed'] == 0
+    sink.close()
@@ -0,0 +1,226 @@
+# data_generator/batch.py
+import logging
+import os
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+
+# Import utility function for Faker
+from utils import get_faker_instance
+# Import the output writers
+from writers import FORMAT_CSV, render_ints, open_writer, output_path, merge_outputs, report_output
+# Import configuration settings
+from config import BATCH_ROWS, TEXT_POOL_SIZE, SHARD_ROWS, MERGE_SHARDS, REFERENCE_DATE
+
+# Seconds in a day, for random timestamps
+SECONDS_PER_DAY = 86400
+
+# Dates are drawn relative to this day rather than the clock, so every shard agrees on it
+TODAY = np.datetime64(REFERENCE_DATE or date.today(), 'D')
+
+
+def make_rng(seed, stream, shard_index=0):
+    """
+    Returns the NumPy random generator for one shard of a table (`stream`). The
+    seed is derived from the global seed, the table and the shard index only, so
+    tables generated with the same seed draw independent values and a shard draws
+    the same values whichever process generates it. A seed of None is random.
+    """
+    key = (zlib.crc32(stream.encode()), shard_index)
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def row_blocks(num_rows, batch_rows=BATCH_ROWS, first_row=1):
+    """
+    Splits num_rows rows starting at row number `first_row` into consecutive blocks.
+    Yields (first_row, count) pairs; row numbers are 1-based like the row IDs.
+    """
+    end = first_row + num_rows
+    for block_first_row in range(first_row, end, batch_rows):
+        yield block_first_row, min(batch_rows, end - block_first_row)
+
+
+def format_ids(prefix, numbers, width):
+    """Formats an array of integers as zero-padded IDs with the given prefix."""
+    def render(values):
+        # Zero-pad without a Python loop: format n + 10**width and drop its leading '1'
+        padded = (np.minimum(values, 10 ** width - 1) + 10 ** width).astype(f'U{width + 1}')
+        padded = padded.view('U1').reshape(-1, width + 1)[:, 1:].copy().view(f'U{width}').ravel()
+        # Numbers wider than the padding are written in full
+        return prefix + np.where(values < 10 ** width, padded, values.astype(str)).astype(object)
+    return render_ints(numbers, render)
+
+
+def choices(rng, values, count):
+    """Draws `count` values uniformly from a list of categories."""
+    return np.array(values, dtype=object)[rng.integers(0, len(values), count)]
+
+
+def prices(rng, low, high, count):
+    """
+    Draws prices uniformly between low and high as whole cents.
+    Returns the int64 cents; the writers turn them into 2-decimal amounts (see MONEY).
+    """
+    return rng.integers(round(low * 100), round(high * 100) + 1, count)
+
+
+def random_dates(rng, start_days_ago, end_days_ago, count):
+    """
+    Draws dates uniformly between `start_days_ago` and `end_days_ago` days before today
+    (the same range Faker's date_between('-2y', 'today') covers), as datetime64[D].
+    """
+    offsets = rng.integers(end_days_ago, start_days_ago + 1, count)
+    return TODAY - offsets
+
+
+def random_datetimes(rng, start_days_ago, count):
+    """Draws timestamps uniformly within the `start_days_ago` days up to today, as datetime64[s]."""
+    end = TODAY.astype('datetime64[s]') + SECONDS_PER_DAY - 1
+    offsets = rng.integers(0, start_days_ago * SECONDS_PER_DAY + 1, count)
+    return end - offsets
+
+
+def days_ago(years):
+    """Number of days Faker's '-<years>y' reaches back from today."""
+    return round(365.24 * years)
+
+
+class TextPools:
+    """
+    Precomputed Faker values, one pool per provider, drawn by random index.
+    Building a pool costs TEXT_POOL_SIZE Faker calls once; every later row is a
+    NumPy gather instead of a Faker call. The pools share the process's Faker
+    (see get_faker_instance), which is reseeded from `seed` and the pool name
+    before each pool is built, so a pool's values do not depend on build order.
+    """
+
+    def __init__(self, seed=None, size=TEXT_POOL_SIZE):
+        self.seed = seed
+        self.size = size
+        self._pools = {}
+
+    @property
+    def fake(self):
+        return get_faker_instance()
+
+    def pool(self, name, make=None):
+        """Returns the pool for a Faker provider name (or a custom `make` callable)."""
+        if name not in self._pools:
+            fake = get_faker_instance(None if self.seed is None else f'{self.seed}-{name}')
+            make = make or getattr(fake, name)
+            logging.info(f"Building a pool of {self.size} '{name}' values.")
+            self._pools[name] = np.array([str(make()) for _ in range(self.size)], dtype=object)
+        return self._pools[name]
+
+    def draw(self, rng, name, count, make=None):
+        """Draws `count` values from the pool for `name`."""
+        pool = self.pool(name, make)
+        return pool[rng.integers(0, len(pool), count)]
+
+
+# Text pools of this process, by (table, seed, size)
+_TEXT_POOLS = {}
+
+
+def text_pools(table, seed, size):
+    """
+    Returns this process's TextPools for a table. They are seeded from the global
+    seed and the table, so every process builds identical pools.
+    """
+    key = (table, seed, size)
+    if key not in _TEXT_POOLS:
+        _TEXT_POOLS[key] = TextPools(None if seed is None else f'{seed}-{table}', size)
+    return _TEXT_POOLS[key]
+
+
+def shard_ranges(num_rows, shard_rows=SHARD_ROWS):
+    """
+    Splits rows 1..num_rows into shards of `shard_rows` rows.
+    Yields (shard_index, first_row, count); the boundaries never depend on the worker count.
+    """
+    for shard_index, first_row in enumerate(range(1, num_rows + 1, shard_rows)):
+        yield shard_index, first_row, min(shard_rows, num_rows - first_row + 1)
+
+
+def part_filename(filename, shard_index):
+    """Part file of one shard, e.g. data/sales.part00003.csv.gz."""
+    directory, name = os.path.split(filename)
+    stem, _, ext = name.partition('.')
+    return os.path.join(directory, f'{stem}.part{shard_index:05d}.{ext}')
+
+
+def generate_table(table, table_schema, make_block, num_rows, filename, seed, keys, executor=None, pool_size=0,
+                   output_format=FORMAT_CSV):
+    """
+    Generates a table shard by shard and merges the shards into `filename`, with
+    its extension replaced by the output format's. Returns the figures logged by
+    report_output().
+
+    `make_block(rng, pools, keys, first_row, count)` returns one block of columns
+    typed as in `table_schema` (see writers.schema); it must be a module-level
+    function so shards can run in other processes. `keys` (a KeySpaces) formats
+    the table's IDs and draws its foreign keys. Each shard is a part file written
+    by `executor` (a process pool) or in this process if None. `pool_size` > 0
+    gives make_block Faker value pools.
+    """
+    started = time.perf_counter()
+    path = output_path(filename, output_format)
+    # Part files that will be merged carry no header of their own
+    jobs = [
+        (table, table_schema, make_block, part_filename(path, shard_index), shard_index, first_row, count,
+         seed, keys, pool_size, output_format, shard_index == 0 or not MERGE_SHARDS)
+        for shard_index, first_row, count in shard_ranges(num_rows)
+    ]
+    run_jobs(executor, write_shard, jobs)
+    outputs = finish_parts(output_format, path, [job[3] for job in jobs])
+    return report_output(path, num_rows, started, outputs)
+
+
+def run_jobs(executor, fn, jobs):
+    """
+    Calls fn(*job) for every job, on `executor` (a process pool) or in this
+    process if None. Returns the results in job order.
+    """
+    if executor is None:
+        return [fn(*job) for job in jobs]
+    # Wait for every job; result() re-raises a failure in the worker
+    return [future.result() for future in [executor.submit(fn, *job) for job in jobs]]
+
+
+def finish_parts(output_format, path, parts):
+    """
+    Merges the part files of a table into `path`, unless MERGE_SHARDS is off.
+    Returns the paths of the table's output.
+    """
+    if MERGE_SHARDS or len(parts) == 1:
+        merge_outputs(output_format, path, parts)
+        return [path]
+    logging.info(f"Kept {len(parts)} part files for {path}.")
+    return parts
+
+
+def write_blocks(output_format, path, table_schema, blocks, header=True):
+    """Writes every block to `path` in the given output format."""
+    writer = open_writer(output_format, path, table_schema, header)
+    try:
+        for block in blocks:
+            writer.write(block)
+    finally:
+        writer.close()
+
+
+def write_shard(table, table_schema, make_block, part_file, shard_index, first_row, count, seed, keys, pool_size,
+                output_format, header):
+    """Generates rows first_row .. first_row + count - 1 of a table into a part file."""
+    rng = make_rng(seed, table, shard_index)
+    pools = text_pools(table, seed, pool_size) if pool_size else None
+    write_blocks(output_format, part_file, table_schema, (
+        make_block(rng, pools, keys, block_first_row, block_count)
+        for block_first_row, block_count in row_blocks(count, first_row=first_row)
+    ), header)
+
+
+# Log that the batch engine is loaded
+logging.info("Batch generation engine loaded.")
@@ -15,6 +15,74 @@ OUTPUT_DIR = 'data'
 # Number of rows to generate for each CSV file
 NUM_ROWS_TO_GENERATE = 10000
 
+# Sizes every table from one knob (TPC style); None gives every table NUM_ROWS_TO_GENERATE rows
+SCALE_FACTOR = None
+
+# Rows of each table at scale factor 1
+SCALE_FACTOR_ROWS = {
+    'customers': 2000,
+    'inventory': 1000,
+    'suppliers': 500,
+    'sales': 10000,
+    'purchases': 10000,
+    'ledger': 10000,
+}
+
+# How foreign keys pick the rows they reference: 'uniform', or 'zipf' for a few very popular rows
+FOREIGN_KEY_DISTRIBUTION = 'uniform'
+
+# Skew of the 'zipf' distribution; larger values concentrate references on fewer rows
+ZIPF_EXPONENT = 1.1
+
+# Rows generated (as NumPy columns) and written per block; bounds memory for large tables
+BATCH_ROWS = 100000
+
+# Number of precomputed Faker values per text field (names, addresses, emails, ...)
+TEXT_POOL_SIZE = 10000
+
+# Seed for NumPy and Faker; None gives different data on every run
+RANDOM_SEED = None
+
+# Processes generating tables and shards in parallel; 1 generates everything in this process
+GENERATOR_WORKERS = 1
+
+# Rows per shard; large tables are split into shards that workers generate independently
+SHARD_ROWS = 1000000
+
+# Merge the shards of a table into one CSV; False keeps them as standalone part files
+MERGE_SHARDS = True
+
+# Output format: 'csv', 'csv.gz', 'csv.zst' (needs zstandard), 'parquet' (needs pyarrow) or 'npy'
+OUTPUT_FORMAT = 'csv'
+
+# Day that generated dates are relative to ('YYYY-MM-DD'); None means today
+REFERENCE_DATE = None
+
+# --- Live feed mode (feed.py) ---
+# Directory the feed writes into, e.g. a root watched by the Uploader
+FEED_DIR = 'feed'
+# 'append' appends rows to rotating files; 'files' drops complete files
+FEED_MODE = 'append'
+# Rows per second per table ('append'), or files per second per table ('files')
+FEED_RATE = 1000.0
+# 'constant', or 'burst': FEED_BURST_RATE for FEED_BURST_SECONDS at the start of every FEED_BURST_PERIOD_SECONDS
+FEED_PROFILE = 'constant'
+FEED_BURST_RATE = 10000.0
+FEED_BURST_SECONDS = 1.0
+FEED_BURST_PERIOD_SECONDS = 10.0
+# Rows per file before the feed rotates to a new file ('append') or rows in each dropped file ('files')
+FEED_ROWS_PER_FILE = 100000
+# 'direct' writes each emission at once, 'chunked' in FEED_CHUNK_BYTES pieces that may end mid-row,
+# 'rename' writes each file under a hidden temporary name and renames it into place ('files' only)
+FEED_WRITE = 'direct'
+FEED_CHUNK_BYTES = 4096
+# Pacing tick; every tick emits whatever the rate has accumulated since the last one
+FEED_TICK_SECONDS = 0.01
+# Every emission is logged here as a JSON line with its wall-clock time; keep it outside FEED_DIR
+FEED_LOG_FILE = 'feed_log.jsonl'
+# Seconds between pacing reports
+FEED_REPORT_SECONDS = 5.0
+
 # Output filenames (just the base names)
 SALES_BASENAME = 'sales.csv'
 INVENTORY_BASENAME = 'inventory.csv'
@@ -0,0 +1,363 @@
+# data_generator/feed.py
+import argparse
+import collections
+import importlib
+import itertools
+import json
+import math
+import logging
+import os
+import time
+
+import numpy as np
+
+# Import configuration settings to ensure logging is set up early
+from config import (
+    RANDOM_SEED, TEXT_POOL_SIZE, INITIAL_LEDGER_BALANCE,
+    FEED_DIR, FEED_MODE, FEED_RATE, FEED_PROFILE, FEED_BURST_RATE, FEED_BURST_SECONDS, FEED_BURST_PERIOD_SECONDS,
+    FEED_ROWS_PER_FILE, FEED_WRITE, FEED_CHUNK_BYTES, FEED_TICK_SECONDS, FEED_LOG_FILE, FEED_REPORT_SECONDS
+)
+# Import the batch generation engine
+from batch import make_rng, text_pools
+# Import the key spaces of all tables
+from keys import key_spaces
+# Import the CSV rendering of the output writers
+from writers import csv_header, csv_lines
+# Import the table list of the one-shot generator
+from main import GENERATORS, TABLES
+
+FEED_MODE_APPEND = 'append'
+FEED_MODE_FILES = 'files'
+FEED_PROFILE_CONSTANT = 'constant'
+FEED_PROFILE_BURST = 'burst'
+FEED_WRITE_DIRECT = 'direct'
+FEED_WRITE_CHUNKED = 'chunked'
+FEED_WRITE_RENAME = 'rename'
+
+# Sleep until this close to a deadline, then yield the CPU until it passes; time.sleep alone overshoots
+_SPIN_SECONDS = 0.002
+# Rows generated per block; small enough (a few ms) to render in the slack between ticks
+_REFILL_ROWS = 1000
+
+
+def rate_profile(profile, rate, burst_rate=FEED_BURST_RATE, burst_seconds=FEED_BURST_SECONDS,
+                 period_seconds=FEED_BURST_PERIOD_SECONDS):
+    """Returns the target rate as a function of the seconds since the feed started."""
+    if profile == FEED_PROFILE_CONSTANT:
+        return lambda elapsed: rate
+    if profile == FEED_PROFILE_BURST:
+        return lambda elapsed: burst_rate if elapsed % period_seconds < burst_seconds else rate
+    raise ValueError(f"Unknown feed profile: {profile}")
+
+
+def sleep_until(deadline):
+    """Waits until perf_counter() reaches `deadline`, typically to within a few microseconds."""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > _SPIN_SECONDS:
+            time.sleep(remaining - _SPIN_SECONDS)
+        else:
+            time.sleep(0)
+
+
+def _table_blocks(table, seed, keys):
+    """Endless typed blocks of _REFILL_ROWS rows of a table, with row numbers continuing from 1."""
+    module_name = next(module_name for name, module_name, _, _ in GENERATORS if name == table)
+    module = importlib.import_module(module_name)
+    rng = make_rng(seed, f'feed-{table}')
+    first_row = 1
+    if table == 'ledger':
+        # The ledger's amounts come from their own stream and its balance carries on from block to block
+        balance_cents = round(INITIAL_LEDGER_BALANCE * 100)
+        for block_index in itertools.count():
+            for amounts in module.ledger_amounts(seed, block_index, first_row, _REFILL_ROWS):
+                block, balance_cents = module.generate_ledger_block(rng, keys, *amounts, balance_cents)
+                yield block
+            first_row += _REFILL_ROWS
+    else:
+        make_block = getattr(module, f'generate_{table}_block')
+        pools = text_pools(table, seed, TEXT_POOL_SIZE)
+        while True:
+            yield make_block(rng, pools, keys, first_row, _REFILL_ROWS)
+            first_row += _REFILL_ROWS
+
+
+class RowSource:
+    """
+    Rendered CSV rows of one table. Blocks are generated and rendered ahead of
+    the feed in the slack between ticks (see prefetch), so that emitting rows
+    usually costs only a join.
+    """
+
+    def __init__(self, table, seed, keys):
+        module_name = next(module_name for name, module_name, _, _ in GENERATORS if name == table)
+        self.table = table
+        self.schema = importlib.import_module(module_name).SCHEMA
+        self.header = (csv_header(self.schema) + '\r\n').encode('utf-8')
+        self.next_row = 1
+        self._blocks = _table_blocks(table, seed, keys)
+        self._lines = collections.deque()
+        # Seconds the last block took to render, to judge whether another fits before a deadline
+        self._render_seconds = 0.0
+        # Render the first block now, so that building text pools does not stall the first ticks
+        self._render()
+
+    def _render(self):
+        started = time.perf_counter()
+        self._lines.extend(csv_lines(self.schema, next(self._blocks)))
+        self._render_seconds = time.perf_counter() - started
+
+    def prefetch(self, deadline, rows):
+        """Renders blocks until `rows` rows are buffered or the next block would end after `deadline`."""
+        while len(self._lines) < rows and time.perf_counter() + self._render_seconds < deadline:
+            self._render()
+
+    def take(self, count):
+        """Returns (first row number, CSV bytes) of the next `count` rows."""
+        while len(self._lines) < count:
+            self._render()
+        lines = [self._lines.popleft() for _ in range(count)]
+        first_row = self.next_row
+        self.next_row += count
+        return first_row, ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+
+def _write(f, payload, write_mode, chunk_bytes):
+    """Writes payload and flushes; in chunked mode as separate writes that may end mid-row."""
+    if write_mode == FEED_WRITE_CHUNKED:
+        for start in range(0, len(payload), chunk_bytes):
+            f.write(payload[start:start + chunk_bytes])
+            f.flush()
+    else:
+        f.write(payload)
+        f.flush()
+
+
+class AppendFeed:
+    """
+    Appends rows to `<table>-<sequence>.csv` in the feed directory, rotating to
+    a new file every `rows_per_file` rows. The rate counts rows.
+    """
+
+    def __init__(self, source, directory, rows_per_file, write_mode, chunk_bytes, log):
+        if write_mode == FEED_WRITE_RENAME:
+            raise ValueError("Write-then-rename needs whole files; use the 'files' feed mode")
+        self.source = source
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.write_mode = write_mode
+        self.chunk_bytes = chunk_bytes
+        self.log = log
+        self.sequence = 0
+        self.path = None
+        self._file = None
+        self._rows_in_file = 0
+
+    def emit(self, count):
+        """Appends `count` rows, rotating files as they fill up."""
+        while count > 0:
+            if self._file is None or self._rows_in_file == self.rows_per_file:
+                self._rotate()
+            rows = min(count, self.rows_per_file - self._rows_in_file)
+            first_row, payload = self.source.take(rows)
+            start_offset = self._file.tell()
+            _write(self._file, payload, self.write_mode, self.chunk_bytes)
+            self.log.record(self.source.table, self.path, first_row, rows, start_offset, start_offset + len(payload))
+            self._rows_in_file += rows
+            count -= rows
+
+    def prefetch(self, deadline, units):
+        """Renders up to `units` rows ahead while time remains before `deadline`."""
+        self.source.prefetch(deadline, units)
+
+    def _rotate(self):
+        self.close()
+        self.sequence += 1
+        self.path = os.path.join(self.directory, f'{self.source.table}-{self.sequence:05d}.csv')
+        self._file = open(self.path, 'wb')
+        _write(self._file, self.source.header, self.write_mode, self.chunk_bytes)
+        self._rows_in_file = 0
+        logging.info(f"Feed rotated to {self.path}.")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FilesFeed:
+    """
+    Drops complete files of `rows_per_file` rows into the feed directory. The
+    rate counts files. With write-then-rename each file is written under a
+    hidden temporary name and only appears under its final name once complete.
+    """
+
+    def __init__(self, source, directory, rows_per_file, write_mode, chunk_bytes, log):
+        self.source = source
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.write_mode = write_mode
+        self.chunk_bytes = chunk_bytes
+        self.log = log
+        self.sequence = 0
+
+    def emit(self, count):
+        """Writes `count` new files."""
+        for _ in range(count):
+            self.sequence += 1
+            name = f'{self.source.table}-{self.sequence:05d}.csv'
+            path = os.path.join(self.directory, name)
+            first_row, payload = self.source.take(self.rows_per_file)
+            payload = self.source.header + payload
+            write_path = os.path.join(self.directory, f'.{name}.tmp') if self.write_mode == FEED_WRITE_RENAME else path
+            with open(write_path, 'wb') as f:
+                _write(f, payload, self.write_mode, self.chunk_bytes)
+            if write_path != path:
+                os.replace(write_path, path)
+            self.log.record(self.source.table, path, first_row, self.rows_per_file, 0, len(payload))
+
+    def prefetch(self, deadline, units):
+        """Renders the rows of up to `units` files ahead while time remains before `deadline`."""
+        self.source.prefetch(deadline, max(1, math.ceil(units)) * self.rows_per_file)
+
+    def close(self):
+        pass
+
+
+class EmissionLog:
+    """
+    Appends one JSON line per emitted write: the wall-clock time it completed,
+    the file, the rows (first row number and count) and their byte range. The
+    Uploader's record batches carry the same path, row numbers and offsets, so
+    its delivery times can be joined against these for end-to-end latency.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self.rows = 0
+        self.bytes = 0
+        self.writes = 0
+
+    def record(self, table, path, first_row, rows, start_offset, end_offset):
+        self.rows += rows
+        self.bytes += end_offset - start_offset
+        self.writes += 1
+        if self._file is not None:
+            self._file.write(json.dumps({
+                'ts': time.time(), 'table': table, 'path': os.path.abspath(path), 'first_row': first_row,
+                'rows': rows, 'start_offset': start_offset, 'end_offset': end_offset,
+            }) + '\n')
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def run_feed(feeds, rate, tick_seconds=FEED_TICK_SECONDS, duration=None, log=None, unit='rows',
+             report_seconds=FEED_REPORT_SECONDS, peak_rate=None):
+    """
+    Emits at `rate(elapsed)` units (rows or files) per second per feed until
+    `duration` seconds have passed (forever if None).
+
+    Ticks follow an absolute schedule, start + k * tick_seconds, so lateness in
+    one tick does not shift the ones after it. Each tick adds rate * tick_seconds
+    to the units due and emits the whole units not yet emitted, so the long-run
+    rate is exact at any rate, including fractions of a unit per tick. The
+    slack before the next tick is spent rendering up to a second of rows at
+    `peak_rate` (the initial rate if None) ahead, so generating rows rarely
+    delays a tick. Every `report_seconds` the achieved rate and the tick
+    lateness (how long after its deadline a tick started) are logged.
+    """
+    peak_rate = rate(0) if peak_rate is None else peak_rate
+    start = time.perf_counter()
+    due = 0.0
+    emitted = 0
+    tick = 0
+    window_start, window_emitted, lateness = start, 0, []
+    while duration is None or tick * tick_seconds < duration:
+        deadline = start + tick * tick_seconds
+        sleep_until(deadline)
+        lateness.append(time.perf_counter() - deadline)
+
+        due += rate(tick * tick_seconds) * tick_seconds
+        count = int(due) - emitted
+        if count > 0:
+            for feed in feeds:
+                feed.emit(count)
+            emitted += count
+        tick += 1
+        for feed in feeds:
+            feed.prefetch(start + tick * tick_seconds - _SPIN_SECONDS, peak_rate)
+
+        now = time.perf_counter()
+        if now - window_start >= report_seconds:
+            late = np.array(lateness) * 1000
+            logging.info(f"Feed emitted {(emitted - window_emitted) / (now - window_start):,.1f} "
+                         f"{unit}/s per table; tick lateness p50 {np.percentile(late, 50):.3f} ms, "
+                         f"p99 {np.percentile(late, 99):.3f} ms, max {late.max():.3f} ms.")
+            if log is not None:
+                log.flush()
+            window_start, window_emitted, lateness = now, emitted, []
+    return emitted
+
+
+def parse_args(argv=None):
+    """Parses the command line; every option defaults to its value in config.py."""
+    parser = argparse.ArgumentParser(description="Feeds generated rows into a directory at a controlled rate.")
+    parser.add_argument('--dir', default=FEED_DIR, help=f"Directory to write into (default: {FEED_DIR})")
+    parser.add_argument('--tables', nargs='+', choices=TABLES, default=['sales'],
+                        help="Tables to feed, each at the full rate (default: sales)")
+    parser.add_argument('--mode', choices=[FEED_MODE_APPEND, FEED_MODE_FILES], default=FEED_MODE,
+                        help="Append rows to rotating files, or drop complete files")
+    parser.add_argument('--rate', type=float, default=FEED_RATE,
+                        help="Rows/s per table (append) or files/s per table (files)")
+    parser.add_argument('--profile', choices=[FEED_PROFILE_CONSTANT, FEED_PROFILE_BURST], default=FEED_PROFILE)
+    parser.add_argument('--burst-rate', type=float, default=FEED_BURST_RATE)
+    parser.add_argument('--burst-seconds', type=float, default=FEED_BURST_SECONDS)
+    parser.add_argument('--burst-period', type=float, default=FEED_BURST_PERIOD_SECONDS)
+    parser.add_argument('--rows-per-file', type=int, default=FEED_ROWS_PER_FILE)
+    parser.add_argument('--write', choices=[FEED_WRITE_DIRECT, FEED_WRITE_CHUNKED, FEED_WRITE_RENAME],
+                        default=FEED_WRITE, help="How each emission is written")
+    parser.add_argument('--chunk-bytes', type=int, default=FEED_CHUNK_BYTES)
+    parser.add_argument('--tick', type=float, default=FEED_TICK_SECONDS, help="Pacing tick in seconds")
+    parser.add_argument('--duration', type=float, default=None, help="Seconds to run (default: until Ctrl+C)")
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED)
+    parser.add_argument('--log', default=FEED_LOG_FILE, help="JSON lines emission log ('' disables)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.makedirs(args.dir, exist_ok=True)
+
+    keys = key_spaces()
+    log = EmissionLog(args.log)
+    feed_class = AppendFeed if args.mode == FEED_MODE_APPEND else FilesFeed
+    feeds = [
+        feed_class(RowSource(table, args.seed, keys), args.dir, args.rows_per_file, args.write, args.chunk_bytes, log)
+        for table in args.tables
+    ]
+    rate = rate_profile(args.profile, args.rate, args.burst_rate, args.burst_seconds, args.burst_period)
+    peak_rate = max(args.rate, args.burst_rate) if args.profile == FEED_PROFILE_BURST else args.rate
+    unit = 'rows' if args.mode == FEED_MODE_APPEND else 'files'
+    logging.info(f"Feeding {', '.join(args.tables)} into {args.dir} ({args.mode}, {args.profile} "
+                 f"{args.rate} {unit}/s, {args.write} writes).")
+
+    started = time.perf_counter()
+    try:
+        run_feed(feeds, rate, args.tick, args.duration, log, unit, peak_rate=peak_rate)
+    except KeyboardInterrupt:
+        logging.info("KeyboardInterrupt received. Stopping feed...")
+    finally:
+        for feed in feeds:
+            feed.close()
+        log.close()
+        seconds = time.perf_counter() - started
+        logging.info(f"Feed stopped: {log.rows} rows in {log.writes} writes ({log.bytes} bytes) "
+                     f"over {seconds:.1f}s ({log.rows / max(seconds, 1e-9):,.0f} rows/s).")
@@ -1,57 +1,63 @@
 # data_generator/generators/customers_generator.py
-import csv
 import logging
 
-# Import utility function for Faker
-from utils import get_faker_instance
+# Import the batch generation engine
+from batch import random_dates, days_ago, generate_table
+# Import the schema helpers of the output writers
+from writers import schema, ID, DATE
+# Import the key spaces of all tables
+from keys import key_spaces
 # Import configuration settings
-from config import CUSTOMERS_FILE, NUM_ROWS_TO_GENERATE
+from config import CUSTOMERS_FILE, OUTPUT_FORMAT, RANDOM_SEED, TEXT_POOL_SIZE
 
-def generate_customers_data():
+# Define the headers for the CSV file
+FIELDNAMES = [
+    'CustomerID', 'FirstName', 'LastName', 'Email', 'PhoneNumber',
+    'Address', 'City', 'State', 'ZipCode', 'RegistrationDate'
+]
+
+# Field types for typed output formats; the other fields are text
+SCHEMA = schema(FIELDNAMES, CustomerID=ID, RegistrationDate=DATE)
+
+def generate_customers_block(rng, pools, keys, first_row, count):
     """
-    Generates synthetic customer data and saves it to a CSV file.
+    Generates `count` customer rows starting at row number `first_row`, one NumPy
+    column per field. Text fields are drawn from the Faker value pools.
+    """
+    return {
+        'CustomerID': keys.sequential_ids('customers', first_row, count), # Unique customer ID
+        'FirstName': pools.draw(rng, 'first_name', count),
+        'LastName': pools.draw(rng, 'last_name', count),
+        'Email': pools.draw(rng, 'email', count),
+        'PhoneNumber': pools.draw(rng, 'phone_number', count),
+        'Address': pools.draw(rng, 'street_address', count),
+        'City': pools.draw(rng, 'city', count),
+        'State': pools.draw(rng, 'state', count),
+        'ZipCode': pools.draw(rng, 'postcode', count),
+        # Registered within the last 5 years
+        'RegistrationDate': random_dates(rng, days_ago(5), 0, count)
+    }
+
+def generate_customers_data(num_rows=None, filename=CUSTOMERS_FILE, seed=RANDOM_SEED, executor=None, keys=None,
+                            output_format=OUTPUT_FORMAT):
+    """
+    Generates synthetic customer data and saves it to a CSV file
+    (or the given output format).
     Each row includes CustomerID, FirstName, LastName, Email, PhoneNumber,
     Address, City, State, ZipCode, and RegistrationDate.
+    Rows are generated in blocks of BATCH_ROWS, in shards of SHARD_ROWS that
+    run on `executor` (a process pool) when one is given.
     """
-    # Get a Faker instance
-    fake = get_faker_instance()
-    # Define the output filename
-    filename = CUSTOMERS_FILE
-    # Define the number of rows to generate
-    num_rows = NUM_ROWS_TO_GENERATE
-
+    # Size the table from the key spaces unless a row count is given
+    keys = keys or key_spaces()
+    num_rows = keys.rows['customers'] if num_rows is None else num_rows
     logging.info(f"Starting generation of {num_rows} rows for {filename}.")
 
     try:
-        # Open the CSV file in write mode
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Define the headers for the CSV file
-            fieldnames = [
-                'CustomerID', 'FirstName', 'LastName', 'Email', 'PhoneNumber',
-                'Address', 'City', 'State', 'ZipCode', 'RegistrationDate'
-            ]
-            # Create a DictWriter object
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            # Write the header row to the CSV file
-            writer.writeheader()
-            logging.info(f"CSV header written for {filename}.")
-
-            # Loop to generate each row of data
-            for i in range(1, num_rows + 1):
-                # Write the generated row to the CSV file
-                writer.writerow({
-                    'CustomerID': f'CUST{i:04d}', # Unique customer ID
-                    'FirstName': fake.first_name(),
-                    'LastName': fake.last_name(),
-                    'Email': fake.email(),
-                    'PhoneNumber': fake.phone_number(),
-                    'Address': fake.street_address(),
-                    'City': fake.city(),
-                    'State': fake.state(),
-                    'ZipCode': fake.postcode(),
-                    'RegistrationDate': fake.date_between(start_date='-5y', end_date='today').strftime('%Y-%m-%d')
-                })
-            logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        stats = generate_table('customers', SCHEMA, generate_customers_block, num_rows, filename, seed, keys,
+                               executor, pool_size=min(TEXT_POOL_SIZE, num_rows), output_format=output_format)
+        logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        return stats
     except IOError as e:
         # Log any I/O errors during file writing
         logging.error(f"Error writing to {filename}: {e}")
@@ -60,4 +66,4 @@ def generate_customers_data():
         logging.error(f"An unexpected error occurred during customer data generation: {e}")
 
 # Log that the customers generator is loaded
-logging.info("Customers generator module loaded.")
\ No newline at end of file
+logging.info("Customers generator module loaded.")
@@ -1,55 +1,65 @@
 # data_generator/generators/inventory_generator.py
-import csv
-import random
 import logging
 
-# Import utility function for Faker
-from utils import get_faker_instance
+# Import the batch generation engine
+from batch import choices, random_datetimes, days_ago, generate_table
+# Import the schema helpers of the output writers
+from writers import schema, ID, INT, DATETIME
+# Import the key spaces of all tables
+from keys import key_spaces
 # Import configuration settings
-from config import INVENTORY_FILE, NUM_ROWS_TO_GENERATE
+from config import INVENTORY_FILE, OUTPUT_FORMAT, RANDOM_SEED, TEXT_POOL_SIZE
 
-def generate_inventory_data():
+# Define the headers for the CSV file
+FIELDNAMES = [
+    'ProductID', 'ProductName', 'Category', 'CurrentStock',
+    'ReorderLevel', 'WarehouseLocation', 'LastStockUpdate'
+]
+
+# Field types for typed output formats; the other fields are text
+SCHEMA = schema(FIELDNAMES, ProductID=ID, CurrentStock=INT, ReorderLevel=INT, LastStockUpdate=DATETIME)
+
+def generate_inventory_block(rng, pools, keys, first_row, count):
     """
-    Generates synthetic inventory data and saves it to a CSV file.
+    Generates `count` inventory rows starting at row number `first_row`, one NumPy
+    column per field.
+    """
+    fake = pools.fake
+    # Object arrays concatenate strings element-wise without a Python loop
+    product_word = pools.draw(rng, 'word_capitalized', count, lambda: fake.word().capitalize())
+    product_kind = choices(rng, ['Shirt', 'Pants', 'Shoes', 'Hat', 'Accessory', 'Gadget', 'Book'], count)
+    warehouse_word = pools.draw(rng, 'word_upper', count, lambda: fake.word().upper())
+    return {
+        'ProductID': keys.sequential_ids('inventory', first_row, count), # Unique product ID
+        'ProductName': product_word + ' ' + product_kind,
+        'Category': choices(rng, ['Electronics', 'Apparel', 'Home Goods', 'Books', 'Food', 'Sporting Goods'], count),
+        'CurrentStock': rng.integers(0, 501, count), # Random stock level
+        'ReorderLevel': rng.integers(10, 51, count), # Random reorder level
+        'WarehouseLocation': warehouse_word + '-' + rng.integers(1, 11, count).astype(str).astype(object),
+        # Last update within the past year
+        'LastStockUpdate': random_datetimes(rng, days_ago(1), count)
+    }
+
+def generate_inventory_data(num_rows=None, filename=INVENTORY_FILE, seed=RANDOM_SEED, executor=None, keys=None,
+                            output_format=OUTPUT_FORMAT):
+    """
+    Generates synthetic inventory data and saves it to a CSV file
+    (or the given output format).
     Each row includes ProductID, ProductName, Category, CurrentStock,
     ReorderLevel, WarehouseLocation, and LastStockUpdate.
+    Rows are generated in blocks of BATCH_ROWS, in shards of SHARD_ROWS that
+    run on `executor` (a process pool) when one is given.
     """
-    # Get a Faker instance
-    fake = get_faker_instance()
-    # Define the output filename
-    filename = INVENTORY_FILE
-    # Define the number of rows to generate
-    num_rows = NUM_ROWS_TO_GENERATE
-
+    # Size the table from the key spaces unless a row count is given
+    keys = keys or key_spaces()
+    num_rows = keys.rows['inventory'] if num_rows is None else num_rows
     logging.info(f"Starting generation of {num_rows} rows for {filename}.")
 
     try:
-        # Open the CSV file in write mode
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Define the headers for the CSV file
-            fieldnames = [
-                'ProductID', 'ProductName', 'Category', 'CurrentStock',
-                'ReorderLevel', 'WarehouseLocation', 'LastStockUpdate'
-            ]
-            # Create a DictWriter object
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            # Write the header row to the CSV file
-            writer.writeheader()
-            logging.info(f"CSV header written for {filename}.")
-
-            # Loop to generate each row of data
-            for i in range(1, num_rows + 1):
-                # Write the generated row to the CSV file
-                writer.writerow({
-                    'ProductID': f'PROD{i:04d}', # Unique product ID
-                    'ProductName': fake.word().capitalize() + ' ' + random.choice(['Shirt', 'Pants', 'Shoes', 'Hat', 'Accessory', 'Gadget', 'Book']),
-                    'Category': random.choice(['Electronics', 'Apparel', 'Home Goods', 'Books', 'Food', 'Sporting Goods']),
-                    'CurrentStock': random.randint(0, 500), # Random stock level
-                    'ReorderLevel': random.randint(10, 50), # Random reorder level
-                    'WarehouseLocation': fake.word().upper() + '-' + str(random.randint(1, 10)),
-                    'LastStockUpdate': fake.date_time_between(start_date='-1y', end_date='now').strftime('%Y-%m-%d %H:%M:%S')
-                })
-            logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        stats = generate_table('inventory', SCHEMA, generate_inventory_block, num_rows, filename, seed, keys,
+                               executor, pool_size=min(TEXT_POOL_SIZE, num_rows), output_format=output_format)
+        logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        return stats
     except IOError as e:
         # Log any I/O errors during file writing
         logging.error(f"Error writing to {filename}: {e}")
@@ -58,4 +68,4 @@ def generate_inventory_data():
         logging.error(f"An unexpected error occurred during inventory data generation: {e}")
 
 # Log that the inventory generator is loaded
-logging.info("Inventory generator module loaded.")
\ No newline at end of file
+logging.info("Inventory generator module loaded.")
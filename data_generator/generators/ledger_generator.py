@@ -1,78 +1,134 @@
 # data_generator/generators/ledger_generator.py
-import csv
-import random
 import logging
+import time
+from itertools import accumulate
 
-# Import utility function for Faker
-from utils import get_faker_instance
+import numpy as np
+
+# Import the batch generation engine
+from batch import (
+    make_rng, row_blocks, choices, prices, random_dates,
+    days_ago, write_blocks, shard_ranges, part_filename, run_jobs, finish_parts
+)
+# Import the schema helpers of the output writers
+from writers import schema, output_path, report_output, ID, MONEY, DATE
+# Import the key spaces of all tables
+from keys import key_spaces
 # Import configuration settings
-from config import LEDGER_FILE, NUM_ROWS_TO_GENERATE, INITIAL_LEDGER_BALANCE
+from config import LEDGER_FILE, OUTPUT_FORMAT, INITIAL_LEDGER_BALANCE, RANDOM_SEED, MERGE_SHARDS
+
+# Define the headers for the CSV file
+FIELDNAMES = [
+    'TransactionID', 'TransactionDate', 'AccountName', 'Description',
+    'Debit', 'Credit', 'Balance', 'ReferenceID'
+]
+
+# Field types for typed output formats; the other fields are text
+SCHEMA = schema(
+    FIELDNAMES,
+    TransactionID=ID, TransactionDate=DATE, Debit=MONEY, Credit=MONEY,
+    Balance=MONEY, ReferenceID=ID
+)
+
+TRANSACTION_TYPES = np.array(['Sale', 'Purchase', 'Expense', 'Payment Received', 'Payment Made'], dtype=object)
+# Sale and Payment Received credit the ledger; the other types debit it
+CREDIT_TYPES = np.array([True, False, False, True, False])
+ACCOUNT_NAMES = ['Sales Revenue', 'Accounts Receivable', 'Cash', 'Bank', 'Cost of Goods Sold', 'Accounts Payable', 'Expenses']
+DESCRIPTIONS = np.array([f'{kind} transaction' for kind in TRANSACTION_TYPES], dtype=object)
+
+def ledger_amounts(seed, shard_index, first_row, count):
+    """
+    Yields (first_row, count, kind, credit_cents, debit_cents) for each block of a
+    ledger shard. The transaction types and amounts have their own random stream,
+    so the balance pass can draw them without generating the other columns.
+    """
+    rng = make_rng(seed, 'ledger-amounts', shard_index)
+    for block_first_row, block_count in row_blocks(count, first_row=first_row):
+        # Randomly choose a transaction type per row
+        kind = rng.integers(0, len(TRANSACTION_TYPES), block_count)
+        is_credit = CREDIT_TYPES[kind]
+        # Amounts in whole cents: credits between 50 and 5000, debits between 20 and 2000
+        credit_cents = np.where(is_credit, prices(rng, 50.0, 5000.0, block_count), 0)
+        debit_cents = np.where(is_credit, 0, prices(rng, 20.0, 2000.0, block_count))
+        yield block_first_row, block_count, kind, credit_cents, debit_cents
+
+def shard_net_cents(seed, shard_index, first_row, count):
+    """Net change of the balance over one shard (credits minus debits), in cents."""
+    return sum(
+        int(credit_cents.sum() - debit_cents.sum())
+        for _, _, _, credit_cents, debit_cents in ledger_amounts(seed, shard_index, first_row, count)
+    )
+
+def generate_ledger_block(rng, keys, first_row, count, kind, credit_cents, debit_cents, opening_cents):
+    """
+    Generates `count` ledger rows starting at row number `first_row`, one NumPy
+    column per field, around the types and amounts drawn by ledger_amounts().
+    `opening_cents` is the balance before the first row.
+    Returns the block and the closing balance in cents.
+    """
+    # The running balance is a cumulative sum; integer cents keep it exact
+    balance_cents = opening_cents + np.cumsum(credit_cents - debit_cents)
+
+    # Sales and purchases reference a sale or purchase ID; other types have none
+    reference = np.full(count, '', dtype=object)
+    for table, type_index in (('sales', 0), ('purchases', 1)):
+        rows = kind == type_index
+        reference[rows] = keys.foreign_ids(rng, table, int(rows.sum()))
 
-def generate_ledger_data():
+    block = {
+        'TransactionID': keys.sequential_ids('ledger', first_row, count), # Unique transaction ID
+        # Transaction date within the last 3 years
+        'TransactionDate': random_dates(rng, days_ago(3), 0, count),
+        'AccountName': choices(rng, ACCOUNT_NAMES, count),
+        'Description': DESCRIPTIONS[kind],
+        'Debit': debit_cents,
+        'Credit': credit_cents,
+        'Balance': balance_cents,
+        'ReferenceID': reference
+    }
+    return block, int(balance_cents[-1])
+
+def generate_ledger_data(num_rows=None, filename=LEDGER_FILE, seed=RANDOM_SEED, executor=None, keys=None,
+                         output_format=OUTPUT_FORMAT):
     """
-    Generates synthetic ledger transaction data and saves it to a CSV file.
+    Generates synthetic ledger transaction data and saves it to a CSV file
+    (or the given output format).
     Each row includes TransactionID, TransactionDate, AccountName, Description,
     Debit, Credit, Balance, and ReferenceID.
+    The running balance is built in two passes over shards of SHARD_ROWS: the
+    first sums each shard's debits and credits, the second writes every shard
+    starting from the balance carried in by the shards before it. Both passes
+    run on `executor` (a process pool) when one is given.
     """
-    # Get a Faker instance
-    fake = get_faker_instance()
-    # Define the output filename
-    filename = LEDGER_FILE
-    # Define the number of rows to generate
-    num_rows = NUM_ROWS_TO_GENERATE
-
+    # Size the table from the key spaces unless a row count is given
+    keys = keys or key_spaces()
+    num_rows = keys.rows['ledger'] if num_rows is None else num_rows
     logging.info(f"Starting generation of {num_rows} rows for {filename}.")
 
     try:
-        # Open the CSV file in write mode
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Define the headers for the CSV file
-            fieldnames = [
-                'TransactionID', 'TransactionDate', 'AccountName', 'Description',
-                'Debit', 'Credit', 'Balance', 'ReferenceID'
-            ]
-            # Create a DictWriter object
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            # Write the header row to the CSV file
-            writer.writeheader()
-            logging.info(f"CSV header written for {filename}.")
-
-            # Initialize current balance
-            current_balance = INITIAL_LEDGER_BALANCE
-            logging.info(f"Initial ledger balance set to {current_balance}.")
-
-            # Loop to generate each row of data
-            for i in range(1, num_rows + 1):
-                # Generate a random transaction date
-                transaction_date = fake.date_between(start_date='-3y', end_date='today')
-                # Randomly choose a transaction type
-                transaction_type = random.choice(['Sale', 'Purchase', 'Expense', 'Payment Received', 'Payment Made'])
-                debit = 0.0
-                credit = 0.0
-                reference_id = ''
-
-                # Assign debit/credit based on transaction type
-                if transaction_type in ['Sale', 'Payment Received']:
-                    credit = round(random.uniform(50.0, 5000.0), 2)
-                    current_balance += credit
-                    reference_id = f'SALE{random.randint(1, 5000):05d}' if transaction_type == 'Sale' else ''
-                else:
-                    debit = round(random.uniform(20.0, 2000.0), 2)
-                    current_balance -= debit
-                    reference_id = f'PURC{random.randint(1, 5000):05d}' if transaction_type == 'Purchase' else ''
-
-                # Write the generated row to the CSV file
-                writer.writerow({
-                    'TransactionID': f'TRN{i:06d}', # Unique transaction ID
-                    'TransactionDate': transaction_date.strftime('%Y-%m-%d'),
-                    'AccountName': random.choice(['Sales Revenue', 'Accounts Receivable', 'Cash', 'Bank', 'Cost of Goods Sold', 'Accounts Payable', 'Expenses']),
-                    'Description': f'{transaction_type} transaction',
-                    'Debit': debit,
-                    'Credit': credit,
-                    'Balance': round(current_balance, 2),
-                    'ReferenceID': reference_id
-                })
-            logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        started = time.perf_counter()
+        path = output_path(filename, output_format)
+        if seed is None:
+            # Both passes must draw the same amounts, so fix a random seed up front
+            seed = np.random.SeedSequence().entropy
+        shards = list(shard_ranges(num_rows))
+        # Pass 1: net change per shard, from the amounts alone
+        nets = run_jobs(executor, shard_net_cents, [(seed, *shard) for shard in shards])
+        # Initialize current balance; each shard opens where the previous one closed
+        initial_cents = round(INITIAL_LEDGER_BALANCE * 100)
+        logging.info(f"Initial ledger balance set to {INITIAL_LEDGER_BALANCE}.")
+        openings = accumulate(nets[:-1], initial=initial_cents)
+
+        # Pass 2: write every shard from its opening balance; parts to be merged carry no header
+        jobs = [
+            (part_filename(path, shard_index), seed, keys, shard_index, first_row, count, opening_cents,
+             output_format, shard_index == 0 or not MERGE_SHARDS)
+            for (shard_index, first_row, count), opening_cents in zip(shards, openings)
+        ]
+        run_jobs(executor, write_ledger_shard, jobs)
+        stats = report_output(path, num_rows, started, finish_parts(output_format, path, [job[0] for job in jobs]))
+        logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        return stats
     except IOError as e:
         # Log any I/O errors during file writing
         logging.error(f"Error writing to {filename}: {e}")
@@ -80,5 +136,18 @@ def generate_ledger_data():
         # Catch any other unexpected errors
         logging.error(f"An unexpected error occurred during ledger data generation: {e}")
 
+def write_ledger_shard(part_file, seed, keys, shard_index, first_row, count, opening_cents, output_format, header):
+    """Writes one ledger shard to a part file, carrying the running balance across its blocks."""
+    # Random generator for the columns other than the amounts
+    rng = make_rng(seed, 'ledger', shard_index)
+
+    def blocks():
+        balance_cents = opening_cents
+        for amounts in ledger_amounts(seed, shard_index, first_row, count):
+            block, balance_cents = generate_ledger_block(rng, keys, *amounts, balance_cents)
+            yield block
+
+    write_blocks(output_format, part_file, SCHEMA, blocks(), header)
+
 # Log that the ledger generator is loaded
-logging.info("Ledger generator module loaded.")
\ No newline at end of file
+logging.info("Ledger generator module loaded.")
@@ -1,67 +1,75 @@
 # data_generator/generators/purchases_generator.py
-import csv
-import random
 import logging
 
-# Import utility function for Faker
-from utils import get_faker_instance
+# Import the batch generation engine
+from batch import (
+    choices, prices, random_dates,
+    days_ago, generate_table
+)
+# Import the schema helpers of the output writers
+from writers import schema, ID, INT, MONEY, DATE
+# Import the key spaces of all tables
+from keys import key_spaces
 # Import configuration settings
-from config import PURCHASES_FILE, NUM_ROWS_TO_GENERATE
+from config import PURCHASES_FILE, OUTPUT_FORMAT, RANDOM_SEED
 
-def generate_purchases_data():
+# Define the headers for the CSV file
+FIELDNAMES = [
+    'PurchaseID', 'SupplierID', 'ProductID', 'PurchaseDate',
+    'Quantity', 'UnitPrice', 'TotalPrice', 'PaymentStatus',
+    'DeliveryStatus'
+]
+
+# Field types for typed output formats; the other fields are text
+SCHEMA = schema(
+    FIELDNAMES,
+    PurchaseID=ID, SupplierID=ID, ProductID=ID, PurchaseDate=DATE,
+    Quantity=INT, UnitPrice=MONEY, TotalPrice=MONEY
+)
+
+def generate_purchases_block(rng, pools, keys, first_row, count):
+    """
+    Generates `count` purchase rows starting at row number `first_row`, one NumPy
+    column per field.
+    """
+    # Generate a random quantity between 5 and 50
+    quantity = rng.integers(5, 51, count)
+    # Generate a random unit price in whole cents
+    unit_cents = prices(rng, 5.0, 500.0, count)
+    return {
+        'PurchaseID': keys.sequential_ids('purchases', first_row, count), # Unique purchase ID
+        'SupplierID': keys.foreign_ids(rng, 'suppliers', count), # Existing supplier ID
+        'ProductID': keys.foreign_ids(rng, 'inventory', count), # Existing product ID
+        # Purchase date within the last 2 years
+        'PurchaseDate': random_dates(rng, days_ago(2), 0, count),
+        'Quantity': quantity,
+        'UnitPrice': unit_cents,
+        # Total price, exact in cents
+        'TotalPrice': quantity * unit_cents,
+        'PaymentStatus': choices(rng, ['Paid', 'Pending', 'Overdue'], count),
+        'DeliveryStatus': choices(rng, ['Delivered', 'Pending', 'Shipped', 'Cancelled'], count)
+    }
+
+def generate_purchases_data(num_rows=None, filename=PURCHASES_FILE, seed=RANDOM_SEED, executor=None, keys=None,
+                            output_format=OUTPUT_FORMAT):
     """
-    Generates synthetic purchase order data and saves it to a CSV file.
+    Generates synthetic purchase order data and saves it to a CSV file
+    (or the given output format).
     Each row includes PurchaseID, SupplierID, ProductID, PurchaseDate,
     Quantity, UnitPrice, TotalPrice, PaymentStatus, and DeliveryStatus.
+    Rows are generated in blocks of BATCH_ROWS, in shards of SHARD_ROWS that
+    run on `executor` (a process pool) when one is given.
     """
-    # Get a Faker instance
-    fake = get_faker_instance()
-    # Define the output filename
-    filename = PURCHASES_FILE
-    # Define the number of rows to generate
-    num_rows = NUM_ROWS_TO_GENERATE
-
+    # Size the table from the key spaces unless a row count is given
+    keys = keys or key_spaces()
+    num_rows = keys.rows['purchases'] if num_rows is None else num_rows
     logging.info(f"Starting generation of {num_rows} rows for {filename}.")
 
     try:
-        # Open the CSV file in write mode
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Define the headers for the CSV file
-            fieldnames = [
-                'PurchaseID', 'SupplierID', 'ProductID', 'PurchaseDate',
-                'Quantity', 'UnitPrice', 'TotalPrice', 'PaymentStatus',
-                'DeliveryStatus'
-            ]
-            # Create a DictWriter object
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            # Write the header row to the CSV file
-            writer.writeheader()
-            logging.info(f"CSV header written for {filename}.")
-
-            # Loop to generate each row of data
-            for i in range(1, num_rows + 1):
-                # Generate a random purchase date
-                purchase_date = fake.date_between(start_date='-2y', end_date='today')
-                # Generate a random quantity
-                quantity = random.randint(5, 50)
-                # Generate a random unit price
-                unit_price = round(random.uniform(5.0, 500.0), 2)
-                # Calculate total price
-                total_price = round(quantity * unit_price, 2)
-
-                # Write the generated row to the CSV file
-                writer.writerow({
-                    'PurchaseID': f'PURC{i:05d}', # Unique purchase ID
-                    'SupplierID': f'SUPP{random.randint(1, 500):04d}', # Random supplier ID
-                    'ProductID': f'PROD{random.randint(1, 1000):04d}', # Random product ID
-                    'PurchaseDate': purchase_date.strftime('%Y-%m-%d'),
-                    'Quantity': quantity,
-                    'UnitPrice': unit_price,
-                    'TotalPrice': total_price,
-                    'PaymentStatus': random.choice(['Paid', 'Pending', 'Overdue']),
-                    'DeliveryStatus': random.choice(['Delivered', 'Pending', 'Shipped', 'Cancelled'])
-                })
-            logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        stats = generate_table('purchases', SCHEMA, generate_purchases_block, num_rows, filename, seed, keys,
+                               executor, output_format=output_format)
+        logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        return stats
     except IOError as e:
         # Log any I/O errors during file writing
         logging.error(f"Error writing to {filename}: {e}")
@@ -70,4 +78,4 @@ def generate_purchases_data():
         logging.error(f"An unexpected error occurred during purchases data generation: {e}")
 
 # Log that the purchases generator is loaded
-logging.info("Purchases generator module loaded.")
\ No newline at end of file
+logging.info("Purchases generator module loaded.")
@@ -1,68 +1,80 @@
 # data_generator/generators/sales_generator.py
-import csv
-import random
 import logging
 
-# Import utility function for Faker
-from utils import get_faker_instance
+# Import the batch generation engine
+from batch import (
+    choices, prices,
+    random_dates, days_ago, generate_table
+)
+# Import the schema helpers of the output writers
+from writers import schema, ID, INT, MONEY, DATE
+# Import the key spaces of all tables
+from keys import key_spaces
 # Import configuration settings
-from config import SALES_FILE, NUM_ROWS_TO_GENERATE
+from config import SALES_FILE, OUTPUT_FORMAT, RANDOM_SEED, TEXT_POOL_SIZE
 
-def generate_sales_data():
+# Define the headers for the CSV file
+FIELDNAMES = [
+    'SaleID', 'CustomerID', 'ProductID', 'SaleDate', 'Quantity',
+    'UnitPrice', 'TotalPrice', 'PaymentMethod', 'ShippingAddress',
+    'Status'
+]
+
+# Field types for typed output formats; the other fields are text
+SCHEMA = schema(
+    FIELDNAMES,
+    SaleID=ID, CustomerID=ID, ProductID=ID, SaleDate=DATE,
+    Quantity=INT, UnitPrice=MONEY, TotalPrice=MONEY
+)
+
+def _shipping_address(fake):
+    # Faker addresses span several lines; the CSV keeps them on one
+    return lambda: fake.address().replace('\n', ', ')
+
+def generate_sales_block(rng, pools, keys, first_row, count):
     """
-    Generates synthetic sales data and saves it to a CSV file.
+    Generates `count` sales rows starting at row number `first_row`, one NumPy
+    column per field.
+    """
+    # Generate a random quantity between 1 and 10
+    quantity = rng.integers(1, 11, count)
+    # Generate a random unit price in whole cents
+    unit_cents = prices(rng, 10.0, 1000.0, count)
+    return {
+        'SaleID': keys.sequential_ids('sales', first_row, count),
+        'CustomerID': keys.foreign_ids(rng, 'customers', count), # Existing customer ID
+        'ProductID': keys.foreign_ids(rng, 'inventory', count), # Existing product ID
+        # Sale date within the last 2 years
+        'SaleDate': random_dates(rng, days_ago(2), 0, count),
+        'Quantity': quantity,
+        'UnitPrice': unit_cents,
+        # Total price, exact in cents
+        'TotalPrice': quantity * unit_cents,
+        'PaymentMethod': choices(rng, ['Credit Card', 'Cash', 'Online Transfer', 'UPI'], count),
+        'ShippingAddress': pools.draw(rng, 'shipping_address', count, _shipping_address(pools.fake)),
+        'Status': choices(rng, ['Completed', 'Pending', 'Shipped', 'Cancelled'], count)
+    }
+
+def generate_sales_data(num_rows=None, filename=SALES_FILE, seed=RANDOM_SEED, executor=None, keys=None,
+                        output_format=OUTPUT_FORMAT):
+    """
+    Generates synthetic sales data and saves it to a CSV file
+    (or the given output format).
     Each row includes SaleID, CustomerID, ProductID, SaleDate, Quantity,
     UnitPrice, TotalPrice, PaymentMethod, ShippingAddress, and Status.
+    Rows are generated in blocks of BATCH_ROWS, in shards of SHARD_ROWS that
+    run on `executor` (a process pool) when one is given.
     """
-    # Get a Faker instance
-    fake = get_faker_instance()
-    # Define the output filename
-    filename = SALES_FILE
-    # Define the number of rows to generate
-    num_rows = NUM_ROWS_TO_GENERATE
-
+    # Size the table from the key spaces unless a row count is given
+    keys = keys or key_spaces()
+    num_rows = keys.rows['sales'] if num_rows is None else num_rows
     logging.info(f"Starting generation of {num_rows} rows for {filename}.")
 
     try:
-        # Open the CSV file in write mode
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Define the headers for the CSV file
-            fieldnames = [
-                'SaleID', 'CustomerID', 'ProductID', 'SaleDate', 'Quantity',
-                'UnitPrice', 'TotalPrice', 'PaymentMethod', 'ShippingAddress',
-                'Status'
-            ]
-            # Create a DictWriter object
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            # Write the header row to the CSV file
-            writer.writeheader()
-            logging.info(f"CSV header written for {filename}.")
-
-            # Loop to generate each row of data
-            for i in range(1, num_rows + 1):
-                # Generate a random sale date within the last 2 years
-                sale_date = fake.date_between(start_date='-2y', end_date='today')
-                # Generate a random quantity between 1 and 10
-                quantity = random.randint(1, 10)
-                # Generate a random unit price, rounded to 2 decimal places
-                unit_price = round(random.uniform(10.0, 1000.0), 2)
-                # Calculate total price
-                total_price = round(quantity * unit_price, 2)
-
-                # Write the generated row to the CSV file
-                writer.writerow({
-                    'SaleID': f'SALE{i:05d}',
-                    'CustomerID': f'CUST{random.randint(1, 2000):04d}', # Random customer ID
-                    'ProductID': f'PROD{random.randint(1, 1000):04d}', # Random product ID
-                    'SaleDate': sale_date.strftime('%Y-%m-%d'),
-                    'Quantity': quantity,
-                    'UnitPrice': unit_price,
-                    'TotalPrice': total_price,
-                    'PaymentMethod': random.choice(['Credit Card', 'Cash', 'Online Transfer', 'UPI']),
-                    'ShippingAddress': fake.address().replace('\n', ', '),
-                    'Status': random.choice(['Completed', 'Pending', 'Shipped', 'Cancelled'])
-                })
-            logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        stats = generate_table('sales', SCHEMA, generate_sales_block, num_rows, filename, seed, keys,
+                               executor, pool_size=min(TEXT_POOL_SIZE, num_rows), output_format=output_format)
+        logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        return stats
     except IOError as e:
         # Log any I/O errors during file writing
         logging.error(f"Error writing to {filename}: {e}")
@@ -71,4 +83,4 @@ def generate_sales_data():
         logging.error(f"An unexpected error occurred during sales data generation: {e}")
 
 # Log that the sales generator is loaded
-logging.info("Sales generator module loaded.")
\ No newline at end of file
+logging.info("Sales generator module loaded.")
@@ -1,60 +1,65 @@
 # data_generator/generators/suppliers_generator.py
-import csv
-import random
 import logging
 
-# Import utility function for Faker
-from utils import get_faker_instance
+# Import the batch generation engine
+from batch import choices, random_dates, days_ago, generate_table
+# Import the schema helpers of the output writers
+from writers import schema, ID, DATE
+# Import the key spaces of all tables
+from keys import key_spaces
 # Import configuration settings
-from config import SUPPLIERS_FILE, NUM_ROWS_TO_GENERATE
+from config import SUPPLIERS_FILE, OUTPUT_FORMAT, RANDOM_SEED, TEXT_POOL_SIZE
 
-def generate_suppliers_data():
+# Define the headers for the CSV file
+FIELDNAMES = [
+    'SupplierID', 'SupplierName', 'ContactPerson', 'Email',
+    'PhoneNumber', 'Address', 'City', 'State', 'ZipCode',
+    'SupplyCategory', 'ContractStartDate'
+]
+
+# Field types for typed output formats; the other fields are text
+SCHEMA = schema(FIELDNAMES, SupplierID=ID, ContractStartDate=DATE)
+
+def generate_suppliers_block(rng, pools, keys, first_row, count):
     """
-    Generates synthetic supplier data and saves it to a CSV file.
+    Generates `count` supplier rows starting at row number `first_row`, one NumPy
+    column per field. Text fields are drawn from the Faker value pools.
+    """
+    return {
+        'SupplierID': keys.sequential_ids('suppliers', first_row, count), # Unique supplier ID
+        'SupplierName': pools.draw(rng, 'company', count),
+        'ContactPerson': pools.draw(rng, 'name', count),
+        'Email': pools.draw(rng, 'email', count),
+        'PhoneNumber': pools.draw(rng, 'phone_number', count),
+        'Address': pools.draw(rng, 'street_address', count),
+        'City': pools.draw(rng, 'city', count),
+        'State': pools.draw(rng, 'state', count),
+        'ZipCode': pools.draw(rng, 'postcode', count),
+        'SupplyCategory': choices(rng, ['Raw Materials', 'Finished Goods', 'Services', 'Packaging'], count),
+        # Contract started between 10 years and 1 year ago
+        'ContractStartDate': random_dates(rng, days_ago(10), days_ago(1), count)
+    }
+
+def generate_suppliers_data(num_rows=None, filename=SUPPLIERS_FILE, seed=RANDOM_SEED, executor=None, keys=None,
+                            output_format=OUTPUT_FORMAT):
+    """
+    Generates synthetic supplier data and saves it to a CSV file
+    (or the given output format).
     Each row includes SupplierID, SupplierName, ContactPerson, Email,
     PhoneNumber, Address, City, State, ZipCode, SupplyCategory, and ContractStartDate.
+    Rows are generated in blocks of BATCH_ROWS, in shards of SHARD_ROWS that
+    run on `executor` (a process pool) when one is given.
     """
-    # Get a Faker instance
-    fake = get_faker_instance()
-    # Define the output filename
-    filename = SUPPLIERS_FILE
-    # Define the number of rows to generate
-    num_rows = NUM_ROWS_TO_GENERATE
-
+    # Size the table from the key spaces unless a row count is given
+    keys = keys or key_spaces()
+    num_rows = keys.rows['suppliers'] if num_rows is None else num_rows
     logging.info(f"Starting generation of {num_rows} rows for {filename}.")
 
     try:
-        # Open the CSV file in write mode
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Define the headers for the CSV file
-            fieldnames = [
-                'SupplierID', 'SupplierName', 'ContactPerson', 'Email',
-                'PhoneNumber', 'Address', 'City', 'State', 'ZipCode',
-                'SupplyCategory', 'ContractStartDate'
-            ]
-            # Create a DictWriter object
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            # Write the header row to the CSV file
-            writer.writeheader()
-            logging.info(f"CSV header written for {filename}.")
-
-            # Loop to generate each row of data
-            for i in range(1, num_rows + 1):
-                # Write the generated row to the CSV file
-                writer.writerow({
-                    'SupplierID': f'SUPP{i:04d}', # Unique supplier ID
-                    'SupplierName': fake.company(),
-                    'ContactPerson': fake.name(),
-                    'Email': fake.email(),
-                    'PhoneNumber': fake.phone_number(),
-                    'Address': fake.street_address(),
-                    'City': fake.city(),
-                    'State': fake.state(),
-                    'ZipCode': fake.postcode(),
-                    'SupplyCategory': random.choice(['Raw Materials', 'Finished Goods', 'Services', 'Packaging']),
-                    'ContractStartDate': fake.date_between(start_date='-10y', end_date='-1y').strftime('%Y-%m-%d')
-                })
-            logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        stats = generate_table('suppliers', SCHEMA, generate_suppliers_block, num_rows, filename, seed, keys,
+                               executor, pool_size=min(TEXT_POOL_SIZE, num_rows), output_format=output_format)
+        logging.info(f"Successfully generated {num_rows} rows for {filename}.")
+        return stats
     except IOError as e:
         # Log any I/O errors during file writing
         logging.error(f"Error writing to {filename}: {e}")
@@ -63,4 +68,4 @@ def generate_suppliers_data():
         logging.error(f"An unexpected error occurred during supplier data generation: {e}")
 
 # Log that the suppliers generator is loaded
-logging.info("Suppliers generator module loaded.")
\ No newline at end of file
+logging.info("Suppliers generator module loaded.")
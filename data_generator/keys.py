@@ -0,0 +1,110 @@
+# data_generator/keys.py
+import logging
+from math import gcd
+
+import numpy as np
+
+# Import the batch generation engine
+from batch import format_ids
+# Import configuration settings
+from config import (
+    NUM_ROWS_TO_GENERATE, SCALE_FACTOR, SCALE_FACTOR_ROWS, FOREIGN_KEY_DISTRIBUTION, ZIPF_EXPONENT
+)
+
+# ID prefix and minimum digits of each table's key, e.g. CUST0001
+ID_FORMATS = {
+    'customers': ('CUST', 4),
+    'inventory': ('PROD', 4),
+    'suppliers': ('SUPP', 4),
+    'sales': ('SALE', 5),
+    'purchases': ('PURC', 5),
+    'ledger': ('TRN', 6),
+}
+
+DISTRIBUTION_UNIFORM = 'uniform'
+DISTRIBUTION_ZIPF = 'zipf'
+
+
+def table_rows(scale_factor=SCALE_FACTOR, num_rows=NUM_ROWS_TO_GENERATE):
+    """
+    Returns the row count of every table. With a scale factor each table gets
+    SCALE_FACTOR_ROWS[table] * scale_factor rows; without one every table gets num_rows.
+    """
+    if scale_factor is None:
+        return {table: num_rows for table in ID_FORMATS}
+    return {table: max(1, round(rows * scale_factor)) for table, rows in SCALE_FACTOR_ROWS.items()}
+
+
+class KeySpaces:
+    """
+    The key space of every table: its row count, and with it the IDs that exist.
+    Foreign keys are drawn as row numbers within the referenced table's row count
+    and formatted like that table's own IDs, so every reference resolves. Nothing
+    but the counts is held, so memory does not grow with the scale factor.
+    """
+
+    def __init__(self, rows, distribution=DISTRIBUTION_UNIFORM, zipf_exponent=ZIPF_EXPONENT):
+        if distribution not in (DISTRIBUTION_UNIFORM, DISTRIBUTION_ZIPF):
+            raise ValueError(f"Unknown foreign key distribution: {distribution}")
+        self.rows = dict(rows)
+        self.distribution = distribution
+        self.zipf_exponent = zipf_exponent
+
+    def width(self, table):
+        """Digits of the table's IDs: the minimum for the table, or more if it has more rows."""
+        return max(ID_FORMATS[table][1], len(str(self.rows[table])))
+
+    def ids(self, table, numbers):
+        """Formats row numbers as the table's IDs."""
+        return format_ids(ID_FORMATS[table][0], numbers, self.width(table))
+
+    def sequential_ids(self, table, first_row, count):
+        """The table's own IDs for rows first_row .. first_row + count - 1."""
+        return self.ids(table, np.arange(first_row, first_row + count))
+
+    def foreign_ids(self, rng, table, count):
+        """Draws `count` IDs of existing rows of `table`."""
+        return self.ids(table, self.draw(rng, table, count))
+
+    def draw(self, rng, table, count):
+        """Draws `count` row numbers of `table` (1-based) from the configured distribution."""
+        size = self.rows[table]
+        if self.distribution == DISTRIBUTION_UNIFORM:
+            return rng.integers(1, size + 1, count)
+        return _scatter(zipf_ranks(rng, size, self.zipf_exponent, count), size)
+
+
+def zipf_ranks(rng, size, exponent, count):
+    """
+    Draws ranks 1..size with probability roughly proportional to rank ** -exponent,
+    by inverting the CDF of the continuous power law on [1, size + 1). This needs
+    no table of weights, so it works the same for any key space.
+    """
+    u = rng.random(count)
+    if exponent == 1.0:
+        x = (size + 1.0) ** u
+    else:
+        a = 1.0 - exponent
+        x = (1.0 + u * ((size + 1.0) ** a - 1.0)) ** (1.0 / a)
+    return np.minimum(x.astype(np.int64), size)
+
+
+def _scatter(ranks, size):
+    """
+    Maps ranks 1..size onto row numbers 1..size one-to-one, so the most popular
+    keys are spread over the table instead of being its first rows. Multiplying by
+    a step coprime with size modulo size is a permutation.
+    """
+    step = int(size * 0.6180339887) | 1
+    while gcd(step, size) != 1:
+        step += 1
+    return ranks * step % size + 1
+
+
+def key_spaces(scale_factor=SCALE_FACTOR, num_rows=NUM_ROWS_TO_GENERATE):
+    """Returns the KeySpaces for a run, from the configured foreign key distribution."""
+    return KeySpaces(table_rows(scale_factor, num_rows), FOREIGN_KEY_DISTRIBUTION, ZIPF_EXPONENT)
+
+
+# Log that the key spaces are loaded
+logging.info("Key space module loaded.")
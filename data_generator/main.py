@@ -1,62 +1,128 @@
 # main.py
+import argparse
+import importlib
 import logging
 import os
-
-# Import generator functions from their respective modules
-from generators.sales_generator import generate_sales_data
-from generators.inventory_generator import generate_inventory_data
-from generators.ledger_generator import generate_ledger_data
-from generators.customers_generator import generate_customers_data
-from generators.purchases_generator import generate_purchases_data
-from generators.suppliers_generator import generate_suppliers_data
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Import configuration settings to ensure logging is set up early
 from config import (
+    GENERATOR_WORKERS,
+    RANDOM_SEED,
+    SCALE_FACTOR,
     NUM_ROWS_TO_GENERATE,
-    SALES_FILE,
-    INVENTORY_FILE,
-    LEDGER_FILE,
-    CUSTOMERS_FILE,
-    PURCHASES_FILE,
-    SUPPLIERS_FILE,
+    OUTPUT_FORMAT,
+    SALES_BASENAME,
+    INVENTORY_BASENAME,
+    LEDGER_BASENAME,
+    CUSTOMERS_BASENAME,
+    PURCHASES_BASENAME,
+    SUPPLIERS_BASENAME,
     OUTPUT_DIR
 )
+# Import the key spaces that size every table
+from keys import key_spaces
+# Import the output formats
+from writers import FORMATS
+
+# Every table with its generator (module and function) and output file, in generation order.
+# Generator modules are imported only for the tables being generated.
+GENERATORS = [
+    ('sales', 'generators.sales_generator', 'generate_sales_data', SALES_BASENAME),
+    ('inventory', 'generators.inventory_generator', 'generate_inventory_data', INVENTORY_BASENAME),
+    ('ledger', 'generators.ledger_generator', 'generate_ledger_data', LEDGER_BASENAME),
+    ('customers', 'generators.customers_generator', 'generate_customers_data', CUSTOMERS_BASENAME),
+    ('purchases', 'generators.purchases_generator', 'generate_purchases_data', PURCHASES_BASENAME),
+    ('suppliers', 'generators.suppliers_generator', 'generate_suppliers_data', SUPPLIERS_BASENAME),
+]
+TABLES = [table for table, _, _, _ in GENERATORS]
+
+def load_generator(module_name, function_name):
+    """Imports a generator module and returns its generate_*_data function."""
+    return getattr(importlib.import_module(module_name), function_name)
 
-def run_all_generators():
+def run_all_generators(workers=GENERATOR_WORKERS, keys=None, tables=None, seed=RANDOM_SEED, output_dir=OUTPUT_DIR,
+                       output_format=OUTPUT_FORMAT):
     """
     Executes all data generation functions to create the required CSV files.
     Logs the start and completion of each generation process.
+    Every table is sized by `keys` (from SCALE_FACTOR or NUM_ROWS_TO_GENERATE if
+    None), which also keeps the foreign keys within the referenced tables.
+    `tables` limits the run to some tables; the others are not even imported.
+    Tables are written in `output_format` (see writers.FORMATS); the bytes
+    written and rows per second are logged per table and for the whole run.
+    With more than one worker, the shards of all tables are generated in a pool
+    of that many processes; the output is the same for any number of workers.
     """
     logging.info("Starting ERP data generation process.")
+    keys = keys or key_spaces()
+    logging.info(f"Table sizes: {keys.rows} (foreign keys: {keys.distribution}).")
+    selected = [
+        (table, load_generator(module_name, function_name), os.path.join(output_dir, basename))
+        for table, module_name, function_name, basename in GENERATORS
+        if tables is None or table in tables
+    ]
 
-    # Call each data generation function
-    logging.info(f"Generating sales data into {SALES_FILE}...")
-    generate_sales_data()
-
-    logging.info(f"Generating inventory data into {INVENTORY_FILE}...")
-    generate_inventory_data()
-
-    logging.info(f"Generating ledger data into {LEDGER_FILE}...")
-    generate_ledger_data()
+    started = time.perf_counter()
+    results = []
+    if workers <= 1:
+        # Call each data generation function
+        for table, generate, filename in selected:
+            logging.info(f"Generating {table} data into {filename}...")
+            results.append(generate(filename=filename, seed=seed, keys=keys, output_format=output_format))
+    else:
+        logging.info(f"Generating {len(selected)} tables with {workers} worker processes...")
+        # One thread per table waits for its shards and merges them, so all tables share the pool
+        with ProcessPoolExecutor(max_workers=workers) as executor, ThreadPoolExecutor(len(selected)) as threads:
+            futures = [
+                threads.submit(generate, filename=filename, seed=seed, executor=executor, keys=keys,
+                               output_format=output_format)
+                for _, generate, filename in selected
+            ]
+            results = [future.result() for future in futures]
 
-    logging.info(f"Generating customers data into {CUSTOMERS_FILE}...")
-    generate_customers_data()
+    # Generators log their own failures and return None
+    stats = [result for result in results if result is not None]
+    total_rows = sum(result['rows'] for result in stats)
+    total_bytes = sum(result['bytes'] for result in stats)
+    seconds = max(time.perf_counter() - started, 1e-9)
+    logging.info(f"All {output_format} files generated with {total_rows} rows in total: {total_bytes} bytes "
+                 f"in {seconds:.2f}s ({total_rows / seconds:,.0f} rows/s).")
+    logging.info("ERP data generation process completed.")
 
-    logging.info(f"Generating purchases data into {PURCHASES_FILE}...")
-    generate_purchases_data()
+def parse_args(argv=None):
+    """Parses the command line; every option defaults to its value in config.py."""
+    parser = argparse.ArgumentParser(description="Generates synthetic ERP data as CSV files.")
+    parser.add_argument('--tables', nargs='+', choices=TABLES, default=None,
+                        help="Tables to generate (default: all)")
+    parser.add_argument('--rows', type=int, default=None,
+                        help=f"Rows per table (default: {NUM_ROWS_TO_GENERATE}, or sized by --scale-factor)")
+    parser.add_argument('--scale-factor', type=float, default=SCALE_FACTOR,
+                        help="Sizes every table from SCALE_FACTOR_ROWS; ignored with --rows")
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED,
+                        help="Seed for reproducible output (default: random)")
+    parser.add_argument('--out', default=OUTPUT_DIR, help=f"Output directory (default: {OUTPUT_DIR})")
+    parser.add_argument('--format', choices=FORMATS, default=OUTPUT_FORMAT,
+                        help=f"Output format (default: {OUTPUT_FORMAT})")
+    parser.add_argument('--workers', type=int, default=GENERATOR_WORKERS,
+                        help=f"Worker processes (default: {GENERATOR_WORKERS})")
+    return parser.parse_args(argv)
 
-    logging.info(f"Generating suppliers data into {SUPPLIERS_FILE}...")
-    generate_suppliers_data()
+if __name__ == "__main__":
+    args = parse_args()
 
-    logging.info(f"All CSV files generated successfully with at least {NUM_ROWS_TO_GENERATE} rows each.")
-    logging.info("ERP data generation process completed.")
+    # Ensure the output directory exists
+    if not os.path.exists(args.out):
+        os.makedirs(args.out)
+        logging.info(f"Created output directory: {args.out}")
 
-if __name__ == "__main__":
-    # Ensure the output directory exists if needed (though files are written to current dir)
-    # If you want them in a 'data' subfolder, uncomment and modify:
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        logging.info(f"Created output directory: {OUTPUT_DIR}")
+    # An explicit row count sizes every table and overrides the scale factor
+    if args.rows is not None:
+        keys = key_spaces(scale_factor=None, num_rows=args.rows)
+    else:
+        keys = key_spaces(scale_factor=args.scale_factor)
 
     # Run the main generation process
-    run_all_generators()
\ No newline at end of file
+    run_all_generators(workers=args.workers, keys=keys, tables=args.tables, seed=args.seed, output_dir=args.out,
+                       output_format=args.format)
@@ -1,15 +1,26 @@
 # data_generator/utils.py
-from faker import Faker
 import logging
 
+# The Faker instance of this process, created on first use
+_FAKER = None
+
 # Initialize Faker with a specific locale for realistic data
-def get_faker_instance():
+def get_faker_instance(seed=None):
     """
-    Initializes and returns a Faker instance with the 'en_IN' locale.
-    Using 'en_IN' generates Indian-specific names, addresses, and phone numbers.
+    Returns this process's Faker instance with the 'en_IN' locale, creating it
+    on first use. Using 'en_IN' generates Indian-specific names, addresses, and
+    phone numbers. Loading the locale's providers is slow, so the instance is
+    shared; a seed reseeds it, making the values it generates next reproducible.
     """
-    logging.info("Initializing Faker instance with 'en_IN' locale.")
-    return Faker('en_IN')
+    global _FAKER
+    if _FAKER is None:
+        # Imported here so that runs without Faker fields never load it
+        from faker import Faker
+        logging.info("Initializing Faker instance with 'en_IN' locale.")
+        _FAKER = Faker('en_IN')
+    if seed is not None:
+        _FAKER.seed_instance(seed)
+    return _FAKER
 
 # Log utility functions loaded
-logging.info("Utility functions loaded successfully.")
\ No newline at end of file
+logging.info("Utility functions loaded successfully.")
@@ -0,0 +1,474 @@
+# data_generator/writers.py
+import gzip
+import logging
+import os
+import shutil
+import struct
+import time
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # Optional; gzip is always available
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional; the npy layout needs only NumPy
+    pa = None
+    pq = None
+
+# Output formats, selectable per run
+FORMAT_CSV = 'csv'
+FORMAT_CSV_GZIP = 'csv.gz'
+FORMAT_CSV_ZSTD = 'csv.zst'
+FORMAT_PARQUET = 'parquet'
+FORMAT_NPY = 'npy'
+FORMATS = [FORMAT_CSV, FORMAT_CSV_GZIP, FORMAT_CSV_ZSTD, FORMAT_PARQUET, FORMAT_NPY]
+
+# Field types of a schema. Blocks hold IDs and text as str object arrays, integers
+# and amounts (in cents) as int64 arrays, dates as datetime64[D] and timestamps as
+# datetime64[s]; each writer turns them into its own representation.
+ID = 'id'              # Text that never needs CSV quoting
+TEXT = 'text'
+INT = 'int'
+MONEY = 'money'        # Whole cents, written with 2 decimals
+DATE = 'date'
+DATETIME = 'datetime'
+
+_GZIP_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+# Every .npy header is padded to this size, so it can be written once the row count is known
+_NPY_HEADER_BYTES = 128
+
+# NumPy dtype of each field type in the npy layout; text is stored as UTF-8 bytes plus offsets
+_NPY_DTYPES = {
+    INT: np.dtype('<i8'),
+    MONEY: np.dtype('<f8'),
+    DATE: np.dtype('<M8[D]'),
+    DATETIME: np.dtype('<M8[s]'),
+}
+
+
+def schema(fieldnames, **types):
+    """
+    Builds a table schema, a list of (field name, field type), from its CSV
+    fieldnames; fields not named in `types` are TEXT.
+    """
+    unknown = set(types) - set(fieldnames)
+    if unknown:
+        raise ValueError(f"Types given for unknown fields: {sorted(unknown)}")
+    return [(name, types.get(name, TEXT)) for name in fieldnames]
+
+
+def output_path(filename, output_format):
+    """Replaces the .csv extension of a configured filename with the format's, e.g. data/sales.parquet."""
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    base, _ = os.path.splitext(filename)
+    return f'{base}.{output_format}'
+
+
+# --- Text rendering --------------------------------------------------------------
+
+def render_ints(values, render):
+    """
+    Applies a vectorized `render` (int array -> text array) to `values`. When the
+    values span a small range, only that range is rendered and the text is
+    gathered by index, which is far cheaper than formatting every row.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return np.array([], dtype=object)
+    low, high = int(values.min()), int(values.max())
+    if high - low < values.size // 4:
+        return render(np.arange(low, high + 1))[values - low]
+    return render(values)
+
+
+def _int_text(values):
+    return values.astype(str).astype(object)
+
+
+# repr() of k / 100 without the integer part, e.g. '.0', '.05', '.5', '.55'
+_CENT_SUFFIXES = np.array([repr(k / 100)[1:] for k in range(100)], dtype=object)
+
+
+def format_cents(cents):
+    """
+    Formats integer cents as the 2-decimal amounts the per-row generator wrote,
+    e.g. 123450 -> '1234.5' and 0 -> '0.0' (the same text as str(cents / 100)).
+    """
+    cents = np.asarray(cents, dtype=np.int64)
+    magnitude = np.abs(cents)
+    text = render_ints(magnitude // 100, _int_text) + _CENT_SUFFIXES[magnitude % 100]
+    negative = cents < 0
+    if negative.any():
+        text[negative] = '-' + text[negative]
+    return text
+
+
+def csv_field(value):
+    """Quotes a text value the way csv.writer does (QUOTE_MINIMAL) so it can be joined into a row directly."""
+    value = str(value)
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _quote_text(column):
+    """
+    Applies csv_field to a text column. Columns drawn from value pools repeat a
+    few thousand values, so each distinct value is checked and quoted only once.
+    """
+    quoted = {
+        value: csv_field(value) for value in dict.fromkeys(column)
+        if ',' in value or '"' in value or '\n' in value or '\r' in value
+    }
+    if not quoted:
+        return column
+    return [quoted.get(value, value) for value in column]
+
+
+def _date_text(days):
+    return np.datetime_as_string(days.astype('datetime64[D]'), unit='D').astype(object)
+
+
+def _datetime_text(stamps):
+    text = np.datetime_as_string(stamps, unit='s')
+    # Replace the ISO 'T' separator in place
+    text.view('U1').reshape(len(text), -1)[:, 10] = ' '
+    return text.astype(object)
+
+
+def render_text(column, field_type):
+    """Renders a block column as CSV field text."""
+    if field_type == ID:
+        return np.asarray(column, dtype=object)
+    if field_type == TEXT:
+        return _quote_text(column)
+    if field_type == INT:
+        return render_ints(column, _int_text)
+    if field_type == MONEY:
+        return format_cents(column)
+    if field_type == DATE:
+        # Only a few thousand distinct days, so render each once
+        return render_ints(column.astype(np.int64), _date_text)
+    if field_type == DATETIME:
+        return _datetime_text(column) if len(column) else np.array([], dtype=object)
+    raise ValueError(f"Unknown field type: {field_type}")
+
+
+def _as_list(column):
+    # Lists iterate faster than object arrays in the join of csv_lines
+    return column.tolist() if isinstance(column, np.ndarray) else column
+
+
+def csv_header(table_schema):
+    """The CSV header line of a schema, without its terminator."""
+    return ','.join(csv_field(name) for name, _ in table_schema)
+
+
+def csv_lines(table_schema, block):
+    """Renders a block as a list of CSV lines, without terminators."""
+    columns = [_as_list(render_text(block[name], field_type)) for name, field_type in table_schema]
+    return list(map(','.join, zip(*columns)))
+
+
+# --- Writers ---------------------------------------------------------------------
+
+class CsvWriter:
+    """
+    Writes blocks as CSV rows, optionally through a gzip or zstd stream. Each
+    block is rendered and joined into one string and compressed as it is
+    written, so memory holds one block at a time. Part files of one table
+    concatenate into a valid file (gzip members and zstd frames chain), so only
+    the first part should be given the header.
+    """
+
+    def __init__(self, path, table_schema, header=True, compression=None):
+        self.path = path
+        self.schema = table_schema
+        self._raw = open(path, 'wb')
+        if compression is None:
+            self._out = self._raw
+        elif compression == 'gzip':
+            # Empty name and zero mtime keep the output byte-identical across runs
+            self._out = gzip.GzipFile(filename='', mode='wb', compresslevel=_GZIP_LEVEL, fileobj=self._raw, mtime=0)
+        elif compression == 'zstd':
+            if zstandard is None:
+                self._raw.close()
+                raise ValueError("zstd output requested but the zstandard package is not installed")
+            self._out = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).stream_writer(self._raw, closefd=False)
+        else:
+            self._raw.close()
+            raise ValueError(f"Unknown CSV compression: {compression}")
+        if header:
+            self._out.write((csv_header(table_schema) + '\r\n').encode('utf-8'))
+            logging.info(f"CSV header written for {path}.")
+
+    def write(self, block):
+        # Same row terminator as csv.writer
+        self._out.write(('\r\n'.join(csv_lines(self.schema, block)) + '\r\n').encode('utf-8'))
+
+    def close(self):
+        if self._out is not self._raw:
+            self._out.close()
+        self._raw.close()
+
+    @staticmethod
+    def merge(path, parts):
+        """Concatenates part files into `path` in order; the bytes are copied as they are."""
+        with open(path, 'wb') as merged:
+            for part in parts:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, merged, 1024 * 1024)
+                os.remove(part)
+
+
+def _arrow_type(field_type):
+    return {
+        ID: pa.string(),
+        TEXT: pa.string(),
+        INT: pa.int64(),
+        MONEY: pa.decimal128(18, 2),
+        DATE: pa.date32(),
+        DATETIME: pa.timestamp('s'),
+    }[field_type]
+
+
+def _arrow_cents(cents):
+    """Wraps int64 cents as decimal128(18, 2) without a per-row conversion: the unscaled value is the cents."""
+    cents = np.asarray(cents, dtype='<i8')
+    # Little-endian 128-bit integers: the cents, then their sign extension
+    words = np.empty((len(cents), 2), dtype='<i8')
+    words[:, 0] = cents
+    words[:, 1] = cents >> 63
+    return pa.Array.from_buffers(pa.decimal128(18, 2), len(cents), [None, pa.py_buffer(words)])
+
+
+class ParquetWriter:
+    """Writes blocks as row groups of a Parquet file with a typed Arrow schema. Requires pyarrow."""
+
+    def __init__(self, path, table_schema, header=True):
+        if pa is None:
+            raise ValueError("Parquet output requested but the pyarrow package is not installed")
+        self.path = path
+        self.schema = table_schema
+        self.arrow_schema = pa.schema([(name, _arrow_type(field_type)) for name, field_type in table_schema])
+        self._writer = pq.ParquetWriter(path, self.arrow_schema)
+
+    def write(self, block):
+        arrays = [
+            _arrow_cents(block[name]) if field_type == MONEY else pa.array(block[name], _arrow_type(field_type))
+            for name, field_type in self.schema
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.arrow_schema))
+
+    def close(self):
+        self._writer.close()
+
+    @staticmethod
+    def merge(path, parts):
+        """Copies the row groups of the part files into one Parquet file, in order."""
+        with pq.ParquetWriter(path, pq.read_schema(parts[0])) as writer:
+            for part in parts:
+                part_file = pq.ParquetFile(part)
+                for index in range(part_file.num_row_groups):
+                    writer.write_table(part_file.read_row_group(index))
+                part_file.close()
+                os.remove(part)
+
+
+class _NpyStream:
+    """A one-dimensional .npy file written block by block; the header is filled in on close."""
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * _NPY_HEADER_BYTES)
+
+    def append(self, values):
+        data = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(data.tobytes())
+        self.length += len(data)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(_npy_header(self.dtype, self.length))
+        self._file.close()
+
+
+def _npy_header(dtype, length):
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (length,)})
+    # Magic, version 1.0 and the header length take 10 bytes; the header ends with a newline
+    header = header.ljust(_NPY_HEADER_BYTES - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def _npy_read_header(f):
+    """Returns (dtype, length) of an .npy file and leaves `f` at its data."""
+    np.lib.format.read_magic(f)
+    shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    return dtype, shape[0]
+
+
+class NpyWriter:
+    """
+    Writes blocks as a directory with one .npy file per column, loadable with
+    np.load (see load_npy_table). Amounts are float64, dates datetime64[D] and
+    timestamps datetime64[s]. A text column is stored like an Arrow string
+    column: <field>.npy holds the UTF-8 bytes of all values and
+    <field>.offsets.npy the rows + 1 offsets delimiting them.
+    """
+
+    def __init__(self, path, table_schema, header=True):
+        self.path = path
+        self.schema = table_schema
+        os.makedirs(path, exist_ok=True)
+        self._streams = {}
+        self._text_bytes = {}
+        for name, field_type in table_schema:
+            if field_type in (ID, TEXT):
+                self._streams[name] = _NpyStream(os.path.join(path, f'{name}.npy'), np.uint8)
+                offsets = _NpyStream(os.path.join(path, f'{name}.offsets.npy'), np.int64)
+                offsets.append([0])
+                self._streams[f'{name}.offsets'] = offsets
+                self._text_bytes[name] = 0
+            else:
+                self._streams[name] = _NpyStream(os.path.join(path, f'{name}.npy'), _NPY_DTYPES[field_type])
+
+    def write(self, block):
+        for name, field_type in self.schema:
+            column = block[name]
+            if field_type in (ID, TEXT):
+                encoded = [value.encode('utf-8') for value in column]
+                lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+                self._streams[name].append(np.frombuffer(b''.join(encoded), dtype=np.uint8))
+                self._streams[f'{name}.offsets'].append(self._text_bytes[name] + np.cumsum(lengths))
+                self._text_bytes[name] += int(lengths.sum())
+            elif field_type == MONEY:
+                self._streams[name].append(np.asarray(column, dtype=np.int64) / 100)
+            else:
+                self._streams[name].append(column)
+
+    def close(self):
+        for stream in self._streams.values():
+            stream.close()
+
+    @staticmethod
+    def merge(path, parts):
+        """
+        Concatenates the column files of the part directories into `path`. Data
+        is copied as it is; text offsets are shifted by the bytes of earlier parts.
+        """
+        os.makedirs(path, exist_ok=True)
+        for column_file in sorted(os.listdir(parts[0])):
+            if column_file.endswith('.offsets.npy'):
+                continue
+            offsets_file = column_file[:-len('.npy')] + '.offsets.npy'
+            is_text = os.path.exists(os.path.join(parts[0], offsets_file))
+            merged = None
+            merged_offsets = None
+            for part in parts:
+                with open(os.path.join(part, column_file), 'rb') as f:
+                    dtype, _ = _npy_read_header(f)
+                    if merged is None:
+                        merged = _NpyStream(os.path.join(path, column_file), dtype)
+                    base = merged.length
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        merged.append(np.frombuffer(chunk, dtype=dtype))
+                if is_text:
+                    offsets = np.load(os.path.join(part, offsets_file), mmap_mode='r')
+                    if merged_offsets is None:
+                        merged_offsets = _NpyStream(os.path.join(path, offsets_file), np.int64)
+                        merged_offsets.append([0])
+                    merged_offsets.append(offsets[1:] + base)
+            merged.close()
+            if merged_offsets is not None:
+                merged_offsets.close()
+        for part in parts:
+            shutil.rmtree(part)
+
+
+def load_npy_table(path):
+    """Loads a table written by NpyWriter as a dict of column arrays; text columns are decoded to str."""
+    columns = {}
+    for column_file in sorted(os.listdir(path)):
+        if column_file.endswith('.offsets.npy'):
+            continue
+        name = column_file[:-len('.npy')]
+        values = np.load(os.path.join(path, column_file))
+        offsets_path = os.path.join(path, f'{name}.offsets.npy')
+        if os.path.exists(offsets_path):
+            data = values.tobytes()
+            offsets = np.load(offsets_path).tolist()
+            values = np.array([data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])],
+                              dtype=object)
+        columns[name] = values
+    return columns
+
+
+def open_writer(output_format, path, table_schema, header=True):
+    """Opens the writer for an output format at `path`."""
+    if output_format == FORMAT_CSV:
+        return CsvWriter(path, table_schema, header)
+    if output_format == FORMAT_CSV_GZIP:
+        return CsvWriter(path, table_schema, header, compression='gzip')
+    if output_format == FORMAT_CSV_ZSTD:
+        return CsvWriter(path, table_schema, header, compression='zstd')
+    if output_format == FORMAT_PARQUET:
+        return ParquetWriter(path, table_schema, header)
+    if output_format == FORMAT_NPY:
+        return NpyWriter(path, table_schema, header)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+def merge_outputs(output_format, path, parts):
+    """Merges the part outputs of one table into `path`, in order, removing the parts."""
+    # Replace the output of an earlier run; a directory would not be overwritten
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    if len(parts) == 1:
+        os.replace(parts[0], path)
+        return
+    if output_format == FORMAT_PARQUET:
+        ParquetWriter.merge(path, parts)
+    elif output_format == FORMAT_NPY:
+        NpyWriter.merge(path, parts)
+    else:
+        CsvWriter.merge(path, parts)
+    logging.info(f"Merged {len(parts)} shards into {path}.")
+
+
+def output_bytes(path):
+    """Size of an output file, or of all files below an output directory."""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(directory, name))
+            for directory, _, names in os.walk(path) for name in names
+        )
+    return os.path.getsize(path)
+
+
+def report_output(path, rows, started, outputs=None):
+    """
+    Logs the bytes written and the rows per second for one table since the
+    perf_counter() value `started`; `outputs` lists its files if they are not
+    just `path`. Returns the figures as a dict.
+    """
+    seconds = max(time.perf_counter() - started, 1e-9)
+    written = sum(output_bytes(output) for output in outputs or [path])
+    stats = {'path': path, 'rows': rows, 'bytes': written, 'seconds': seconds}
+    logging.info(f"Wrote {rows} rows to {path}: {stats['bytes']} bytes in {seconds:.2f}s "
+                 f"({rows / seconds:,.0f} rows/s).")
+    return stats
+
+
+# Log that the writers are loaded
+logging.info("Output writers module loaded.")